@@ -0,0 +1,118 @@
+"""Measure clarifying-question index compile time and lookup throughput.
+
+Builds a query corpus from the knowledge base itself: symptom phrases
+embedded in free text ("had a sore knee since yesterday"), a share of them
+with a typo injected, plus queries that match nothing. Reports compile time,
+lookups per second and latency percentiles.
+
+    python -m benchmarks.clarifying --queries 20000 --typo-rate 0.2
+
+Use --knowledge-base to benchmark another file and --fail-p99-us to exit
+non-zero when p99 lookup latency exceeds a budget.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from src.core.clarifying import DEFAULT_KNOWLEDGE_BASE, ClarifyingQuestionIndex, expand_knowledge_base
+
+PREFIXES = ["", "I have ", "my ", "really bad ", "since yesterday ", "for two days I've had "]
+SUFFIXES = ["", " since this morning", " and it is getting worse", " after running", " on and off"]
+MISSES = ["nothing specific", "just checking in", "feeling strange today", "what should I do"]
+
+
+def _typo(phrase: str, rng: random.Random) -> str:
+    """Swap two adjacent letters in the longest word"""
+    words = phrase.split()
+    longest = max(range(len(words)), key=lambda i: len(words[i]))
+    word = words[longest]
+    if len(word) > 4:
+        i = rng.randrange(1, len(word) - 2)
+        words[longest] = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return " ".join(words)
+
+
+def build_queries(entries: List[Dict], count: int, typo_rate: float, miss_rate: float, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    phrases = [phrase for entry in entries for phrase in [entry["symptom"], *entry.get("synonyms", [])]]
+    queries = []
+    for _ in range(count):
+        if rng.random() < miss_rate:
+            queries.append(rng.choice(MISSES))
+            continue
+        phrase = rng.choice(phrases)
+        if rng.random() < typo_rate:
+            phrase = _typo(phrase, rng)
+        queries.append(rng.choice(PREFIXES) + phrase + rng.choice(SUFFIXES))
+    return queries
+
+
+def run_benchmark(args) -> Dict:
+    with open(args.knowledge_base) as knowledge_base:
+        entries = expand_knowledge_base(json.load(knowledge_base))
+
+    started = time.perf_counter()
+    index = ClarifyingQuestionIndex(entries)
+    compile_seconds = time.perf_counter() - started
+
+    queries = build_queries(entries, args.queries, args.typo_rate, args.miss_rate, args.seed)
+    latencies = np.empty(len(queries))
+    answered = 0
+    started = time.perf_counter()
+    for i, query in enumerate(queries):
+        lookup_started = time.perf_counter()
+        answered += bool(index.questions(query))
+        latencies[i] = time.perf_counter() - lookup_started
+    elapsed = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(latencies * 1e6, [50, 95, 99]) if len(queries) else (0.0, 0.0, 0.0)
+    return {
+        "entries": len(index.entries),
+        "phrases": index.phrase_count,
+        "compile_ms": compile_seconds * 1000,
+        "queries": len(queries),
+        "answered": answered,
+        "lookups_per_second": len(queries) / elapsed if elapsed else 0.0,
+        "p50_us": float(p50),
+        "p95_us": float(p95),
+        "p99_us": float(p99),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark clarifying-question lookups")
+    parser.add_argument("--knowledge-base", default=DEFAULT_KNOWLEDGE_BASE, help="knowledge base JSON file")
+    parser.add_argument("--queries", type=int, default=20000, help="number of lookups")
+    parser.add_argument("--typo-rate", type=float, default=0.2, help="fraction of queries with a misspelling")
+    parser.add_argument("--miss-rate", type=float, default=0.1, help="fraction of queries matching nothing")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the query corpus")
+    parser.add_argument("--json", dest="json_path", help="write results to this JSON file")
+    parser.add_argument("--fail-p99-us", type=float, default=None,
+                        help="exit with status 1 if p99 lookup latency exceeds this budget")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    result = run_benchmark(args)
+    print(f"{result['entries']} symptoms, {result['phrases']} phrases compiled in {result['compile_ms']:.1f} ms")
+    print(f"{result['queries']} lookups ({result['answered']} answered): {result['lookups_per_second']:.0f}/s, "
+          f"p50 {result['p50_us']:.1f} us, p95 {result['p95_us']:.1f} us, p99 {result['p99_us']:.1f} us")
+
+    if args.json_path:
+        with open(args.json_path, "w") as output:
+            json.dump(result, output, indent=2)
+
+    if args.fail_p99_us is not None and result["p99_us"] > args.fail_p99_us:
+        print(f"p99 budget exceeded: {result['p99_us']:.1f} us > {args.fail_p99_us:.1f} us", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Local stand-in for the Google Fit API used by the benchmarks.
+
+FakeFitService mimics the blocking googleapiclient request objects that
+GoogleFitClient runs on its thread pool, for both the dataset.aggregate and
+the raw dataSources.datasets.get endpoints. The Gemini stand-in is
+src.utils.fake_gemini.FakeGeminiServer.
+"""
+import time
+
+from src.api.google_fit import GoogleFitClient
+
+DAY_MILLIS = 86400000
+
+
+class _FakeFitRequest:
+    def __init__(self, service, body):
+        self.service = service
+        self.body = body
+
+    def execute(self, http=None):
+        # Runs on GoogleFitClient's worker threads, like the real blocking call
+        time.sleep(self.service.latency)
+        start = int(self.body["startTimeMillis"]) // DAY_MILLIS
+        end = (int(self.body["endTimeMillis"]) - 1) // DAY_MILLIS
+        buckets = []
+        for day in range(start, end + 1):
+            points = []
+            for aggregate in self.body["aggregateBy"]:
+                data_type = aggregate["dataTypeName"]
+                if data_type == "com.google.heart_rate.bpm":
+                    points.append({"dataTypeName": "com.google.heart_rate.summary",
+                                   "value": [{"fpVal": 70.0}, {"fpVal": 110.0}, {"fpVal": 55.0}]})
+                else:
+                    points.append({"dataTypeName": data_type, "value": [{"intVal": 5000 + day % 1000}]})
+            buckets.append({"startTimeMillis": str(day * DAY_MILLIS), "dataset": [{"point": points}]})
+        return {"bucket": buckets}
+
+
+class _FakeDatasetRequest:
+    def __init__(self, service, source, dataset_id, limit, page_token):
+        self.service = service
+        self.source = source
+        self.dataset_id = dataset_id
+        self.limit = limit or 1000
+        self.page_token = page_token
+
+    @staticmethod
+    def _point(start, value, end=None, field="fpVal"):
+        return {
+            "startTimeNanos": str(start * 1_000_000_000),
+            "endTimeNanos": str((end or start) * 1_000_000_000),
+            "value": [{field: value}],
+        }
+
+    def _points(self, start, end):
+        if "heart_rate" in self.source:
+            first = -(-start // 300) * 300
+            return [self._point(t, 60.0 + t // 300 % 40) for t in range(first, end, 300)]
+        if "step_count" in self.source:
+            first = -(-start // 3600) * 3600
+            return [self._point(t, 400 + t // 3600 % 24 * 20, t + 3600, "intVal") for t in range(first, end, 3600)]
+        # One night per day: light sleep from 23:00, deep sleep from 03:00 until 07:00
+        points = []
+        for night in range(start // 86400 * 86400 - 3600, end, 86400):
+            if start <= night < end:
+                points.append(self._point(night, 4, night + 4 * 3600, "intVal"))
+            if start <= night + 4 * 3600 < end:
+                points.append(self._point(night + 4 * 3600, 5, night + 8 * 3600, "intVal"))
+        return points
+
+    def execute(self, http=None):
+        time.sleep(self.service.latency)
+        start, end = (int(bound) // 1_000_000_000 for bound in self.dataset_id.split("-"))
+        points = self._points(start, end)
+        offset = int(self.page_token or 0)
+        response = {"point": points[offset:offset + self.limit]}
+        if offset + self.limit < len(points):
+            response["nextPageToken"] = str(offset + self.limit)
+        return response
+
+
+class FakeFitService:
+    """Stand-in for the googleapiclient fitness service's aggregate and raw dataset endpoints
+
+    ``calls`` counts every request to either endpoint.
+    """
+
+    def __init__(self, latency: float = 0.15):
+        self.latency = latency
+        self.calls = 0
+
+    def users(self):
+        return self
+
+    def dataset(self):
+        return self
+
+    def dataSources(self):
+        return self
+
+    def datasets(self):
+        return self
+
+    def aggregate(self, userId, body):
+        self.calls += 1
+        return _FakeFitRequest(self, body)
+
+    def get(self, userId, dataSourceId, datasetId, limit=None, pageToken=None):
+        self.calls += 1
+        return _FakeDatasetRequest(self, dataSourceId, datasetId, limit, pageToken)
+
+
+class BenchGoogleFitClient(GoogleFitClient):
+    """GoogleFitClient wired to FakeFitService instead of OAuth and discovery"""
+
+    def __init__(self, service: FakeFitService, **kwargs):
+        self._fake_service = service
+        super().__init__(**kwargs)
+
+    def load_credentials(self):
+        self.service = self._fake_service
+
+    def _thread_http(self):
+        return None
@@ -0,0 +1,262 @@
+"""Load-test the API against local Gemini and Google Fit stand-ins.
+
+Starts FakeGeminiServer, serves src.app with uvicorn on a loopback port with
+its clients pointed at the fakes, and drives each scenario at rising
+concurrency. Reports latency percentiles, throughput and how many upstream
+calls the requests cost.
+
+    python -m benchmarks.run --scenario analyze --scenario health \\
+        --concurrency 1,8,32,128 --requests 400 --latency 0.2 --jitter 0.05
+
+Use --unique to defeat response caches, --json to save results and
+--fail-p95-ms to exit non-zero when any scenario exceeds a p95 budget.
+
+The load generator shares a process and event loop with the server, so
+absolute throughput is a lower bound; compare runs made on the same machine.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import aiohttp
+import numpy as np
+import uvicorn
+
+from benchmarks.fake_upstreams import BenchGoogleFitClient, FakeFitService
+from src.utils.fake_gemini import FakeGeminiServer
+
+# A mix of inputs the local triage rules settle and ones that need Gemini
+SYMPTOM_POOL = [
+    ["severe headache", "fever"],
+    ["fever", "cough"],
+    ["stomach pain", "diarrhea"],
+    ["back pain"],
+    ["dizziness", "headache"],
+    ["rash", "itchy eyes"],
+    ["chest pain"],
+    ["runny nose", "sneezing"],
+]
+
+
+def _analyze_request(index: int, unique: bool):
+    symptoms = list(SYMPTOM_POOL[index % len(SYMPTOM_POOL)])
+    if unique:
+        symptoms.append(f"note {index}")
+    return "POST", "/api/analyze_symptoms", {"symptoms": symptoms, "context": {"age": 30 + index % 40}}
+
+
+def _stream_request(index: int, unique: bool):
+    _, _, body = _analyze_request(index, unique)
+    return "POST", "/api/analyze_symptoms/stream", body
+
+
+def _followup_request(index: int, unique: bool):
+    turn = index if unique else index % 4
+    history = [
+        {"user": "I have a headache", "assistant": "How long have you had it?"},
+        {"user": f"About {turn + 1} days", "assistant": "Is the pain constant?"},
+    ]
+    return "POST", "/api/generate_followup", {"conversation_history": history}
+
+
+def _health_request(index: int, unique: bool):
+    return "GET", f"/api/health_data/{7 + (index % 7 if unique else 0)}", None
+
+
+SCENARIOS = {
+    "analyze": _analyze_request,
+    "stream": _stream_request,
+    "followup": _followup_request,
+    "health": _health_request,
+}
+
+
+def _bind_loopback() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Accepted connections inherit TCP_NODELAY; without it h11 responses written
+    # in several segments stall on delayed ACKs and add ~40 ms to every request.
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+async def _start_app(gemini: FakeGeminiServer, fit_service: FakeFitService, store_path: str):
+    """Serve src.app on a loopback port with fresh clients pointed at the fakes"""
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    os.environ["GEMINI_API_BASE"] = gemini.api_base
+
+    from src.app import app
+    from src.api.clients import ClientProvider, get_gemini_provider, get_google_fit_provider
+    from src.api.fit_store import FitDayStore
+    from src.api.gemini import GeminiClient
+
+    async def build_gemini():
+        client = GeminiClient()
+        await client.start()
+        return client
+
+    async def close_gemini(client):
+        await client.close()
+
+    async def build_fit():
+        return BenchGoogleFitClient(fit_service, store=FitDayStore(store_path))
+
+    async def close_fit(client):
+        client.close()
+
+    providers = [
+        ClientProvider("gemini", build_gemini, close_gemini),
+        ClientProvider("google_fit", build_fit, close_fit),
+    ]
+    for provider in providers:
+        await provider.get()
+    app.dependency_overrides[get_gemini_provider] = lambda: providers[0]
+    app.dependency_overrides[get_google_fit_provider] = lambda: providers[1]
+
+    sock = _bind_loopback()
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="off"))
+    serving = asyncio.ensure_future(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    async def stop():
+        server.should_exit = True
+        await serving
+        for provider in providers:
+            await provider.close()
+        app.dependency_overrides.clear()
+
+    return f"http://127.0.0.1:{sock.getsockname()[1]}", stop
+
+
+async def _drive(session: aiohttp.ClientSession, base_url: str, make_request, concurrency: int, total: int, unique: bool, offset: int):
+    """Issue ``total`` requests from ``concurrency`` workers and record per-request latency"""
+    counter = itertools.count()
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while True:
+            index = next(counter)
+            if index >= total:
+                return
+            method, path, body = make_request(offset + index, unique)
+            started = time.perf_counter()
+            try:
+                async with session.request(method, base_url + path, json=body) as response:
+                    payload = await response.read()
+                    if response.status >= 400 or b"event: error" in payload:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run_benchmarks(args) -> List[Dict]:
+    gemini = FakeGeminiServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+    await gemini.start()
+    results = []
+    try:
+        for scenario in args.scenario:
+            with tempfile.TemporaryDirectory() as tmp:
+                fit_service = FakeFitService(latency=args.fit_latency)
+                base_url, stop = await _start_app(gemini, fit_service, os.path.join(tmp, "fit.db"))
+                connector = aiohttp.TCPConnector(limit=0)
+                try:
+                    async with aiohttp.ClientSession(connector=connector) as session:
+                        offset = 0
+                        for concurrency in args.concurrency:
+                            gemini_before = sum(gemini.calls.values())
+                            fit_before = fit_service.calls
+                            latencies, errors, elapsed = await _drive(
+                                session, base_url, SCENARIOS[scenario], concurrency, args.requests, args.unique, offset
+                            )
+                            offset += args.requests
+                            p50, p95, p99 = (np.percentile(latencies, [50, 95, 99]) * 1000).tolist()
+                            results.append({
+                                "scenario": scenario,
+                                "concurrency": concurrency,
+                                "requests": len(latencies),
+                                "errors": errors,
+                                "rps": len(latencies) / elapsed,
+                                "p50_ms": p50,
+                                "p95_ms": p95,
+                                "p99_ms": p99,
+                                "gemini_calls": sum(gemini.calls.values()) - gemini_before,
+                                "fit_calls": fit_service.calls - fit_before,
+                            })
+                            print(_format_row(results[-1]), flush=True)
+                finally:
+                    await stop()
+    finally:
+        await gemini.stop()
+    return results
+
+
+HEADER = f"{'scenario':<10}{'conc':>6}{'reqs':>7}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'gemini':>8}{'fit':>6}"
+
+
+def _format_row(row: Dict) -> str:
+    return (
+        f"{row['scenario']:<10}{row['concurrency']:>6}{row['requests']:>7}{row['errors']:>8}"
+        f"{row['rps']:>9.1f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}"
+        f"{row['gemini_calls']:>8}{row['fit_calls']:>6}"
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the AI Nurse Companion API against local fakes")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run; repeat for several (default: all)")
+    parser.add_argument("--concurrency", type=lambda value: [int(v) for v in value.split(",")], default=[1, 8, 32, 128],
+                        help="comma-separated concurrency levels (default: 1,8,32,128)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake Gemini base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="fake Gemini latency jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake Gemini calls that fail")
+    parser.add_argument("--fit-latency", type=float, default=0.15, help="fake Fit request latency in seconds")
+    parser.add_argument("--unique", action="store_true", help="make every request distinct to bypass caches")
+    parser.add_argument("--seed", type=int, default=None, help="seed for latency jitter and error injection")
+    parser.add_argument("--json", dest="json_path", help="write results to this JSON file")
+    parser.add_argument("--fail-p95-ms", type=float, default=None,
+                        help="exit with status 1 if any scenario's p95 latency exceeds this budget")
+    args = parser.parse_args(argv)
+    args.scenario = args.scenario or sorted(SCENARIOS)
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    random.seed(args.seed)
+    print(HEADER)
+    results = asyncio.run(run_benchmarks(args))
+
+    if args.json_path:
+        with open(args.json_path, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.fail_p95_ms is not None:
+        slow = [row for row in results if row["p95_ms"] > args.fail_p95_ms]
+        for row in slow:
+            print(f"p95 budget exceeded: {row['scenario']} at concurrency {row['concurrency']}: "
+                  f"{row['p95_ms']:.1f} ms > {args.fail_p95_ms:.1f} ms", file=sys.stderr)
+        return 1 if slow else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,8 +8,12 @@ const Chat = () => {
     const [messages, setMessages] = useState([]);
     const [input, setInput] = useState('');
     const [isLoading, setIsLoading] = useState(false);
-    const [healthData, setHealthData] = useState(null);
     const messagesEndRef = useRef(null);
+    const sessionRef = useRef(null);
+    const socketRef = useRef(null);
+    const reconnectRef = useRef(null);
+    const pendingRef = useRef(null);
+    const turnRef = useRef({ fields: {}, questions: null });
 
     const scrollToBottom = () => {
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -17,91 +21,158 @@ const Chat = () => {
 
     useEffect(() => {
         scrollToBottom();
-        fetchHealthData();
     }, [messages]);
 
-    const fetchHealthData = async () => {
-        try {
-            const response = await fetch('http://localhost:8000/api/health_data/7');
-            const data = await response.json();
-            setHealthData(data.health_data);
-        } catch (error) {
-            console.error('Error fetching health data:', error);
+    // One WebSocket carries the whole conversation: the server keeps the
+    // session, streams each analysis as it is generated and pushes health
+    // data whenever it changes
+    useEffect(() => {
+        let closed = false;
+        let retry = null;
+
+        const connect = () => {
+            const query = sessionRef.current ? `?session_id=${sessionRef.current}` : '';
+            const socket = new WebSocket(`ws://localhost:8000/api/chat${query}`);
+            socket.onopen = () => {
+                // A turn sent while disconnected goes out once the socket is back
+                if (pendingRef.current) {
+                    socket.send(pendingRef.current);
+                    pendingRef.current = null;
+                }
+            };
+            socket.onmessage = (message) => handleEvent(JSON.parse(message.data));
+            socket.onclose = (event) => {
+                if (closed) return;
+                if (event.code === 1000) {
+                    // Closed for idling: reconnect when the user next sends a message
+                    return;
+                }
+                if (event.code === 4404) {
+                    // The session expired: start a fresh one instead of asking for it again
+                    sessionRef.current = null;
+                } else if (event.code >= 4400 && event.code < 4500) {
+                    // Any other rejection will not succeed on retry
+                    return;
+                }
+                // Reconnect to the same session after network drops
+                retry = setTimeout(connect, 1000);
+            };
+            socketRef.current = socket;
+        };
+
+        reconnectRef.current = () => {
+            clearTimeout(retry);
+            connect();
+        };
+        connect();
+        const ping = setInterval(() => {
+            if (socketRef.current?.readyState === WebSocket.OPEN) {
+                socketRef.current.send(JSON.stringify({ type: 'ping' }));
+            }
+        }, 60000);
+        return () => {
+            closed = true;
+            clearTimeout(retry);
+            clearInterval(ping);
+            socketRef.current?.close();
+        };
+    }, []);
+
+    const formatAnalysis = (data) => [
+        data.urgency_level && `Urgency Level: ${data.urgency_level}`,
+        data.initial_assessment && `\nAssessment: ${data.initial_assessment}`,
+        ...(data.recommended_actions ? ['\nRecommended Actions:', ...data.recommended_actions.map(action => `- ${action}`)] : []),
+        ...(data.lifestyle_recommendations ? ['\nLifestyle Recommendations:', ...data.lifestyle_recommendations.map(rec => `- ${rec}`)] : []),
+        ...(data.warning_signs ? ['\nWarning Signs to Watch For:', ...data.warning_signs.map(sign => `- ${sign}`)] : []),
+    ].filter(Boolean).join('\n');
+
+    // Replace the assistant message of the turn in progress as fields arrive
+    const showAnalysis = (data) => {
+        const content = formatAnalysis(data);
+        setMessages(prev => {
+            const last = prev[prev.length - 1];
+            if (last && last.streaming) {
+                return [...prev.slice(0, -1), { ...last, content }];
+            }
+            return [...prev, { type: 'assistant', content, streaming: true }];
+        });
+    };
+
+    const handleEvent = (event) => {
+        switch (event.event) {
+            case 'session':
+                sessionRef.current = event.session_id;
+                break;
+            case 'turn_start':
+                turnRef.current = { fields: {}, questions: null };
+                break;
+            case 'field':
+                turnRef.current.fields[event.name] = event.value;
+                showAnalysis(turnRef.current.fields);
+                break;
+            case 'result':
+                turnRef.current.fields = event.data;
+                showAnalysis(event.data);
+                break;
+            case 'questions':
+                turnRef.current.questions = event.questions;
+                break;
+            case 'turn_end': {
+                const { questions } = turnRef.current;
+                setMessages(prev => {
+                    const done = prev.map(message => ({ ...message, streaming: false }));
+                    if (!questions || !questions.length) return done;
+                    return [...done, {
+                        type: 'assistant',
+                        content: 'Follow-up questions:\n' + questions.join('\n')
+                    }];
+                });
+                setIsLoading(false);
+                break;
+            }
+            case 'error':
+                console.error('Error:', event.detail);
+                setMessages(prev => [...prev.map(message => ({ ...message, streaming: false })), {
+                    type: 'error',
+                    content: 'Sorry, there was an error processing your request.'
+                }]);
+                setIsLoading(false);
+                break;
+            default:
+                // "health" updates the server-side session context; "pong" and
+                // analysis text deltas need no rendering
+                break;
         }
     };
 
-    const handleSubmit = async (e) => {
-        e.preventDefault();
-        if (!input.trim()) return;
+    const sendTurn = (text, inputType) => {
+        const socket = socketRef.current;
+        if (!text.trim() || !socket) return;
 
-        const userMessage = { type: 'user', content: input };
-        setMessages(prev => [...prev, userMessage]);
+        setMessages(prev => [...prev, { type: 'user', content: text }]);
         setInput('');
         setIsLoading(true);
-
-        try {
-            // Add health data context if available
-            const context = healthData ? {
-                recent_activity: healthData[0]
-            } : {};
-
-            // Analyze symptoms
-            const response = await fetch('http://localhost:8000/api/analyze_symptoms', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    symptoms: [input],
-                    context: context
-                }),
-            });
-
-            const data = await response.json();
-
-            // Format the response
-            const analysis = [
-                `Urgency Level: ${data.urgency_level}`,
-                `\nAssessment: ${data.initial_assessment}`,
-                '\nRecommended Actions:',
-                ...data.recommended_actions.map(action => `- ${action}`),
-                '\nLifestyle Recommendations:',
-                ...data.lifestyle_recommendations.map(rec => `- ${rec}`),
-                '\nWarning Signs to Watch For:',
-                ...data.warning_signs.map(sign => `- ${sign}`)
-            ].join('\n');
-
-            setMessages(prev => [...prev, { type: 'assistant', content: analysis }]);
-
-            // Generate follow-up questions
-            const followUpResponse = await fetch('http://localhost:8000/api/generate_followup', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    conversation_history: [
-                        { user: input, assistant: analysis }
-                    ]
-                }),
-            });
-
-            const followUpData = await followUpResponse.json();
-            if (followUpData.questions) {
-                setMessages(prev => [...prev, { 
-                    type: 'assistant', 
-                    content: 'Follow-up questions:\n' + followUpData.questions.join('\n') 
-                }]);
-            }
-        } catch (error) {
-            console.error('Error:', error);
-            setMessages(prev => [...prev, { 
-                type: 'error', 
-                content: 'Sorry, there was an error processing your request.' 
-            }]);
+        const turn = JSON.stringify({ type: 'turn', message: text, input: inputType });
+        if (socket.readyState === WebSocket.OPEN) {
+            socket.send(turn);
+            return;
         }
+        pendingRef.current = turn;
+        if (socket.readyState !== WebSocket.CONNECTING) reconnectRef.current();
+    };
 
-        setIsLoading(false);
+    const handleSubmit = (e) => {
+        e.preventDefault();
+        sendTurn(input, 'text');
     };
 
-    const handleVoiceInput = (transcript) => {
-        setInput(transcript);
+    // Interim transcripts fill the input box; a final one is sent as a voice turn
+    const handleVoiceInput = (transcript, isFinal) => {
+        if (isFinal) {
+            sendTurn(transcript, 'voice');
+        } else {
+            setInput(transcript);
+        }
     };
 
     return (
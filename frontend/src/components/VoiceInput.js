@@ -21,7 +21,7 @@ const VoiceInput = ({ onTranscript }) => {
                 const current = event.resultIndex;
                 const transcript = event.results[current][0].transcript;
                 setTranscript(transcript);
-                onTranscript(transcript);
+                onTranscript(transcript, event.results[current].isFinal);
             };
 
             recognition.onend = () => {
@@ -0,0 +1,16 @@
+# Multi-worker deployment: gunicorn -c gunicorn.conf.py src.app:app
+# Requires `pip install gunicorn`; workers share sessions, analyses and Fit
+# data through the stores configured by configure_workers.
+import multiprocessing
+import os
+
+from src.api.clients import configure_workers
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Streaming analyses can outlive the default 30s worker timeout
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+
+configure_workers(workers)
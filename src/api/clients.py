@@ -0,0 +1,152 @@
+import os
+import atexit
+import asyncio
+import shutil
+import tempfile
+from typing import Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class ClientProvider(Generic[T]):
+    """Build an upstream client once, on first use or from a background warm-up
+
+    Concurrent callers share a single construction, a failed construction is
+    retried on the next call, and ``status`` reports readiness without
+    triggering a build.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Awaitable[T]], closer: Optional[Callable[[T], Awaitable[None]]] = None):
+        self.name = name
+        self.factory = factory
+        self.closer = closer
+        self.client: Optional[T] = None
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Future] = None
+        self._warmup: Optional[asyncio.Future] = None
+
+    async def get(self) -> T:
+        if self.client is not None:
+            return self.client
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.factory())
+        task = self._task
+        try:
+            client = await asyncio.shield(task)
+        except Exception as e:
+            if self._task is task:
+                self._task = None
+            self.error = str(e)
+            raise
+        self.client = client
+        self.error = None
+        return client
+
+    def warm(self):
+        """Start building the client in the background without waiting for it"""
+        if self.client is not None or self._task is not None:
+            return
+        self._task = asyncio.ensure_future(self.factory())
+
+        async def build():
+            try:
+                await self.get()
+            except Exception as e:
+                print(f"Error warming {self.name} client: {str(e)}")
+
+        self._warmup = asyncio.ensure_future(build())
+
+    def status(self) -> str:
+        if self.client is not None:
+            return "ready"
+        if self._task is not None and not self._task.done():
+            return "warming"
+        if self.error is not None:
+            return "failed"
+        return "cold"
+
+    async def close(self):
+        if self.client is not None and self.closer is not None:
+            await self.closer(self.client)
+        self.client = None
+        self._task = None
+
+
+async def _build_gemini_client():
+    from src.api.gemini import GeminiClient
+
+    client = GeminiClient()
+    await client.start()
+    return client
+
+
+async def _close_gemini_client(client):
+    await client.close()
+
+
+async def _build_google_fit_client():
+    from src.api.google_fit import GoogleFitClient
+
+    # OAuth refresh, the consent flow and building the discovery document all block
+    return await asyncio.to_thread(GoogleFitClient)
+
+
+async def _close_google_fit_client(client):
+    client.close()
+
+
+gemini_provider: ClientProvider = ClientProvider("gemini", _build_gemini_client, _close_gemini_client)
+google_fit_provider: ClientProvider = ClientProvider("google_fit", _build_google_fit_client, _close_google_fit_client)
+PROVIDERS: List[ClientProvider] = [gemini_provider, google_fit_provider]
+
+
+def get_gemini_provider() -> ClientProvider:
+    """FastAPI dependency for the GeminiClient provider
+
+    Routes receive the provider rather than the client so that requests the
+    local triage rules can answer never wait on, or fail with, Gemini.
+    """
+    return gemini_provider
+
+
+def get_google_fit_provider() -> ClientProvider:
+    """FastAPI dependency for the GoogleFitClient provider"""
+    return google_fit_provider
+
+
+def warm_clients():
+    """Start building every client in the background unless WARM_CLIENTS_ON_STARTUP is false"""
+    if os.getenv("WARM_CLIENTS_ON_STARTUP", "true").lower() == "true":
+        for provider in PROVIDERS:
+            provider.warm()
+
+
+async def close_clients():
+    for provider in PROVIDERS:
+        await provider.close()
+
+
+def client_status() -> Dict[str, str]:
+    return {provider.name: provider.status() for provider in PROVIDERS}
+
+
+def configure_workers(workers: int):
+    """Point per-process state at stores the worker processes can share
+
+    With more than one worker, sessions and cached analyses default to
+    SQLite files in a private temporary directory for this run, removed on
+    exit, unless configured explicitly. Admission limits
+    (GEMINI_MAX_CONCURRENCY etc.) remain per worker.
+    """
+    if workers > 1 and not (os.getenv("SESSION_STORE_PATH") and os.getenv("SHARED_CACHE_URL")):
+        run_dir = tempfile.mkdtemp(prefix="nurse-companion-")
+        owner = os.getpid()
+
+        def remove_run_dir():
+            # Forked workers inherit this hook; only the process that made the directory removes it
+            if os.getpid() == owner:
+                shutil.rmtree(run_dir, ignore_errors=True)
+
+        atexit.register(remove_run_dir)
+        os.environ.setdefault("SESSION_STORE_PATH", os.path.join(run_dir, "sessions.db"))
+        os.environ.setdefault("SHARED_CACHE_URL", os.path.join(run_dir, "shared_cache.db"))
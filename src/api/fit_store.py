@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from src.utils.shared_cache import RedisSharedCache, connect_sqlite, create_shared_cache
+
+
+class FitDayStore:
+    """SQLite store of Google Fit records, one row per (kind, day)
+
+    Each row keeps the parsed record for that day (or nothing, for days Fit
+    had no data) and when it was fetched, so callers can tell complete past
+    days from ones that may still change. The file is opened in WAL mode so
+    the workers of a multi-process deployment can share it.
+    """
+
+    def __init__(self, path: str = "fit_cache.db"):
+        self._conn = connect_sqlite(path)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fit_days ("
+                " kind TEXT NOT NULL,"
+                " day TEXT NOT NULL,"
+                " payload TEXT,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (kind, day))"
+            )
+
+    def get(self, kind: str, days: Iterable[str]) -> Dict[str, Tuple[Optional[Dict], float]]:
+        """Return {day: (payload, fetched_at)} for the stored days among ``days``"""
+        days = list(days)
+        if not days:
+            return {}
+        placeholders = ",".join("?" * len(days))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT day, payload, fetched_at FROM fit_days WHERE kind = ? AND day IN ({placeholders})",
+                [kind, *days],
+            ).fetchall()
+        return {day: (json.loads(payload) if payload else None, fetched_at) for day, payload, fetched_at in rows}
+
+    def put(self, kind: str, records: Dict[str, Optional[Dict]], fetched_at: float):
+        """Insert or replace the records for several days"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO fit_days (kind, day, payload, fetched_at) VALUES (?, ?, ?, ?)",
+                [
+                    (kind, day, json.dumps(payload) if payload is not None else None, fetched_at)
+                    for day, payload in records.items()
+                ],
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SharedFitDayStore:
+    """FitDayStore interface over a shared cache, for workers that share no disk
+
+    Rows expire after ``ttl`` seconds; by then past days have long been
+    complete, and refetching them is cheap.
+    """
+
+    def __init__(self, cache, ttl: float = 30 * 86400):
+        self.cache = cache
+        self.ttl = ttl
+
+    def get(self, kind: str, days: Iterable[str]) -> Dict[str, Tuple[Optional[Dict], float]]:
+        found = self.cache.get_many(f"{kind}:{day}" for day in days)
+        rows = {}
+        for key, value in found.items():
+            row = json.loads(value)
+            rows[key.split(":", 1)[1]] = (row["payload"], row["fetched_at"])
+        return rows
+
+    def put(self, kind: str, records: Dict[str, Optional[Dict]], fetched_at: float):
+        self.cache.set_many(
+            {
+                f"{kind}:{day}": json.dumps({"payload": payload, "fetched_at": fetched_at})
+                for day, payload in records.items()
+            },
+            self.ttl,
+        )
+
+    def close(self):
+        self.cache.close()
+
+
+def create_fit_store():
+    """Build the day store: Redis when SHARED_CACHE_URL names one, else the
+    SQLite file at GOOGLE_FIT_CACHE_PATH ("" disables the store)"""
+    cache = create_shared_cache("fit") if os.getenv("SHARED_CACHE_URL", "").startswith(("redis", "unix")) else None
+    if isinstance(cache, RedisSharedCache):
+        return SharedFitDayStore(cache)
+    path = os.getenv("GOOGLE_FIT_CACHE_PATH", "fit_cache.db")
+    return FitDayStore(path) if path else None
@@ -1,12 +1,95 @@
 import os
 import json
+import re
+import time
 import asyncio
-from typing import List, Dict, Optional
-from dotenv import l google.generativeai as genai
+import hashlib
+from typing import TYPE_CHECKING, AsyncIterator, List, Dict, Optional, Tuple
+from dotenv import load_dotenv
 from pydantic import BaseModel
+from src.core.conversation import ConversationSummary, compact_history, format_turn
+from src.core.triage import critical_signature
+from src.utils.cache import TTLCache
+from src.utils.semantic_cache import SemanticCache
+from src.utils.shared_cache import create_shared_cache
+from src.utils.concurrency import MicroBatcher, SingleFlight
+from src.utils.metrics import REGISTRY
+from src.utils.structured import StructuredOutputError, extract_json
+from src.utils.resilience import (
+    CircuitBreaker,
+    LatencyTracker,
+    UpstreamError,
+    backoff_delay,
+    hedged,
+    parse_retry_after,
+)
+
+if TYPE_CHECKING:
+    import aiohttp
 
 load_dotenv()
 
+_WHITESPACE = re.compile(r"\s+")
+
+GEMINI_STAGE_SECONDS = REGISTRY.histogram(
+    "gemini_stage_seconds", "Time spent in each stage of a Gemini call", ("stage",), timing_prefix="gemini"
+)
+GEMINI_UPSTREAM_REQUESTS = REGISTRY.counter(
+    "gemini_upstream_requests_total", "Gemini API requests by endpoint and HTTP status", ("endpoint", "status")
+)
+GEMINI_UPSTREAM_IN_FLIGHT = REGISTRY.gauge("gemini_upstream_in_flight", "Gemini API requests currently open")
+GEMINI_RETRIES = REGISTRY.counter("gemini_retries_total", "Gemini API calls retried after a transient failure", ("reason",))
+GEMINI_HEDGES = REGISTRY.counter("gemini_hedged_requests_total", "Backup Gemini requests sent after the hedging delay")
+GEMINI_BATCH_SIZE = REGISTRY.histogram(
+    "gemini_microbatch_size", "Analyses sent per micro-batched Gemini call", buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+GEMINI_BATCH_ITEMS = REGISTRY.counter(
+    "gemini_microbatch_items_total", "Micro-batched analyses by how they were answered", ("outcome",)
+)
+GEMINI_SEMANTIC_LOOKUPS = REGISTRY.counter(
+    "gemini_semantic_cache_lookups_total", "Semantic cache lookups after an exact-match miss", ("outcome",)
+)
+GEMINI_REPAIRS = REGISTRY.counter(
+    "gemini_output_repairs_total", "Re-prompts sent after Gemini returned unparseable output", ("kind", "outcome")
+)
+GEMINI_BREAKER_REJECTIONS = REGISTRY.counter(
+    "gemini_breaker_rejections_total", "Gemini calls refused without a request while the circuit breaker was open"
+)
+
+# Response schemas for JSON mode, in the OpenAPI subset Gemini accepts
+_STRING_LIST = {"type": "ARRAY", "items": {"type": "STRING"}}
+ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "urgency_level": {"type": "STRING", "enum": ["LOW", "MEDIUM", "HIGH", "EMERGENCY"]},
+        "initial_assessment": {"type": "STRING"},
+        "recommended_actions": _STRING_LIST,
+        "lifestyle_recommendations": _STRING_LIST,
+        "warning_signs": _STRING_LIST,
+    },
+    "required": [
+        "urgency_level", "initial_assessment", "recommended_actions",
+        "lifestyle_recommendations", "warning_signs",
+    ],
+}
+FOLLOW_UP_SCHEMA = _STRING_LIST
+BATCH_ANALYSIS_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        **ANALYSIS_SCHEMA,
+        "properties": {"patient": {"type": "INTEGER"}, **ANALYSIS_SCHEMA["properties"]},
+        "required": ["patient", *ANALYSIS_SCHEMA["required"]],
+    },
+}
+
+_ANALYSIS_FORMAT = [
+    '  "urgency_level": "(LOW/MEDIUM/HIGH/EMERGENCY)",',
+    '  "initial_assessment": "Brief analysis of symptoms",',
+    '  "recommended_actions": ["Action 1", "Action 2", ...],',
+    '  "lifestyle_recommendations": ["Recommendation 1", "Recommendation 2", ...],',
+    '  "warning_signs": ["Warning sign 1", "Warning sign 2", ...]',
+]
+
 class HealthAnalysisResponse(BaseModel):
     urgency_level: str
     initial_assessment: str
@@ -14,198 +97,675 @@ class HealthAnalysisResponse(BaseModel):
     lifestyle_recommendations: List[str]
     warning_signs: List[str]
 
-class GeminiClient:
+class _FieldExtractor:
+    """Pull top-level analysis fields out of a partially streamed JSON document"""
+
+    STRING_FIELDS = ("urgency_level", "initial_assessment")
+    LIST_FIELDS = ("recommended_actions", "lifestyle_recommendations", "warning_signs")
+
     def __init__(self):
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
+        self.buffer = ""
+        self.pending = {
+            name: re.compile(rf'"{name}"\s*:\s*("(?:[^"\\]|\\.)*")')
+            for name in self.STRING_FIELDS
+        }
+        self.pending.update({
+            name: re.compile(rf'"{name}"\s*:\s*(\[(?:[^\[\]"]|"(?:[^"\\]|\\.)*")*\])')
+            for name in self.LIST_FIELDS
+        })
+
+    def feed(self, chunk: str) -> List[Tuple[str, object]]:
+        """Add streamed text and return fields that became complete"""
+        self.buffer += chunk
+        completed = []
+        for name, pattern in list(self.pending.items()):
+            match = pattern.search(self.buffer)
+            if match is None:
+                continue
+            try:
+                completed.append((name, json.loads(match.group(1))))
+            except ValueError:
+                continue
+            del self.pending[name]
+        return completed
+
+class GeminiClient:
+    def __init__(
+        self,
+        pool_limit: Optional[int] = None,
+        pool_limit_per_host: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        request_timeout: Optional[float] = None,
+        cache_size: Optional[int] = None,
+        cache_ttl: Optional[float] = None,
+    ):
+        self.api_key = os.getenv("GOOGLE_API_KEY")
+        if not self.api_key:
             raise ValueError("GOOGLE_API_KEY environment variable is not set")
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-pro')
-        
+        api_base = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+        self.model = os.getenv("GEMINI_MODEL", "gemini-pro")
+        self.model_url = f"{api_base.rstrip('/')}/models/{self.model}"
+        self.endpoint = f"{self.model_url}:generateContent"
+        self.stream_endpoint = f"{self.model_url}:streamGenerateContent?alt=sse"
+
+        # Connection pool settings, overridable per instance or via environment
+        self.pool_limit = pool_limit or int(os.getenv("GEMINI_POOL_LIMIT", "100"))
+        self.pool_limit_per_host = pool_limit_per_host or int(os.getenv("GEMINI_POOL_LIMIT_PER_HOST", "20"))
+        self.connect_timeout = connect_timeout or float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5"))
+        self.request_timeout = request_timeout or float(os.getenv("GEMINI_REQUEST_TIMEOUT", "30"))
+        self.keepalive_timeout = float(os.getenv("GEMINI_KEEPALIVE_TIMEOUT", "30"))
+        self.dns_cache_ttl = int(os.getenv("GEMINI_DNS_CACHE_TTL", "300"))
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self.generation_config = {
+            "temperature": 0.3,
+            "topP": 0.8,
+            "topK": 40
+        }
+
+        # JSON mode constrains output to the response schema; it needs Gemini
+        # 1.5 or later, so "auto" leaves it off for the 1.0 models
+        json_mode = os.getenv("GEMINI_JSON_MODE", "auto").lower()
+        if json_mode == "auto":
+            json_mode = "false" if self.model.startswith(("gemini-pro", "gemini-1.0")) else "true"
+        self.json_mode = json_mode == "true"
+        self.analysis_config = self._structured_config(ANALYSIS_SCHEMA)
+        self.follow_up_config = self._structured_config(FOLLOW_UP_SCHEMA)
+        self.batch_analysis_config = self._structured_config(BATCH_ANALYSIS_SCHEMA)
+
+        # Optional micro-batching: concurrent analyses arriving within
+        # GEMINI_MICROBATCH_MAX_WAIT_MS share one multi-patient prompt. A max
+        # size of 1 (the default) turns it off; larger sizes and waits trade
+        # per-request latency for fewer upstream calls.
+        batch_size = int(os.getenv("GEMINI_MICROBATCH_MAX_SIZE", "1"))
+        batch_wait = float(os.getenv("GEMINI_MICROBATCH_MAX_WAIT_MS", "5")) / 1000
+        self.batcher = MicroBatcher(self._analyze_batch, batch_size, batch_wait) if batch_size > 1 else None
+
+        # Parsed analyses keyed on the canonical prompt; a size of 0 disables caching
+        self.analysis_cache = TTLCache(
+            maxsize=int(os.getenv("GEMINI_CACHE_SIZE", "1024")) if cache_size is None else cache_size,
+            ttl=float(os.getenv("GEMINI_CACHE_TTL", "600")) if cache_ttl is None else cache_ttl,
+        )
+        # Analyses of paraphrased symptoms ("my head hurts a lot" / "severe
+        # headache"), reused only when the urgency-critical terms agree; off
+        # unless GEMINI_SEMANTIC_CACHE_SIZE is set
+        self.semantic_cache = SemanticCache(
+            maxsize=int(os.getenv("GEMINI_SEMANTIC_CACHE_SIZE", "0")),
+            threshold=float(os.getenv("GEMINI_SEMANTIC_THRESHOLD", "0.9")),
+            ttl=self.analysis_cache.ttl,
+        )
+        self.semantic_cache_path = os.getenv("GEMINI_SEMANTIC_CACHE_PATH", "")
+        # Analyses shared between worker processes (SHARED_CACHE_URL); the
+        # in-process cache above stays in front of it
+        self.shared_cache = create_shared_cache("gemini-analysis")
+        self._semantic_loaded = False
+
+        # Identical prompts in flight at the same time share one upstream request
+        self._inflight = SingleFlight()
+
+        # Follow-up prompts quote at most this many recent turns within this
+        # many (estimated) tokens; older turns are summarized
+        self.follow_up_token_budget = int(os.getenv("GEMINI_FOLLOWUP_TOKEN_BUDGET", "1500"))
+        self.follow_up_recent_turns = int(os.getenv("GEMINI_FOLLOWUP_RECENT_TURNS", "6"))
+
+        # Resilience: every call gets an overall deadline; transient failures
+        # (429, 5xx, network errors) are retried with jittered backoff inside it,
+        # and the breaker fails calls fast while the upstream keeps failing.
+        self.deadline = float(os.getenv("GEMINI_DEADLINE", str(self.request_timeout)))
+        self.max_attempts = int(os.getenv("GEMINI_MAX_ATTEMPTS", "3"))
+        self.backoff_base = float(os.getenv("GEMINI_BACKOFF_BASE", "0.25"))
+        self.backoff_max = float(os.getenv("GEMINI_BACKOFF_MAX", "4"))
+        # Hedging sends a backup request once the first is slower than the
+        # observed latency percentile; it costs extra quota, so it is opt-in.
+        self.hedge = os.getenv("GEMINI_HEDGE", "false").lower() == "true"
+        self.hedge_percentile = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95"))
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker(
+            "Gemini",
+            failure_threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET", "30")),
+        )
+
+    async def start(self):
+        """Open the shared HTTP session used for all Gemini calls"""
+        if self.semantic_cache_path and not self._semantic_loaded:
+            self._semantic_loaded = True
+            try:
+                self.semantic_cache.load(self.semantic_cache_path, lambda data: HealthAnalysisResponse(**data))
+            except Exception as e:
+                print(f"Error loading semantic cache: {str(e)}")
+        if self._session is not None and not self._session.closed:
+            return
+        # Imported here rather than at module level to keep app import fast
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_limit,
+            limit_per_host=self.pool_limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout, connect=self.connect_timeout)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self):
+        """Close the shared HTTP session and release pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self.semantic_cache_path:
+            try:
+                self.semantic_cache.save(self.semantic_cache_path, lambda result: result.model_dump())
+            except Exception as e:
+                print(f"Error saving semantic cache: {str(e)}")
+
+    async def _get_session(self) -> "aiohttp.ClientSession":
+        """Return the shared session, opening it on first use outside the app lifecycle"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
     async def analyze_symptoms(self, symptoms: List[str], context: Optional[Dict] = None) -> HealthAnalysisResponse:
         """Analyze symptoms and generate health insights using Gemini API"""
-        prompt = self._build_analysis_prompt(symptoms, context)
-        response = await self._call_gemini_api(prompt)
-        return self._parse_analysis_response(response)
-        
-    async def generate_follow_up(self, conversation_history: List[Dict]) -> str:
-        """Generate relevant follow-up questions based on conversation history"""
-        prompt = self._build_follow_up_prompt(conversation_history)
-        response = await self._call_gemini_api(prompt)
-        return response
-        
-    def _build_analysis_prompt(self, symptoms: List[str], context: Optional[Dict] = None) -> str:
-        """Build a structured prompt for symptom analysis"""
-        base_prompt = [
-            "As a medical AI assistant, analyze these symptoms for triage:",
-            f"Symptoms: {', '.join(symptoms)}"
-        ]
-        
-        if context:
-            base_prompt.append(f"Additional Context: {json.dumps(context)}")
-            
-        analysis_requirements = [
-            "Please provide a JSON response with the following structure:",
-            "{",
-            '  "urgency_level": "(LOW/MEDIUM/HIGH/EMERGENCY)",',
-            '  "initial_assessment": "Brief analysis of symptoms",',
-            '  "recommended_actions": ["Action 1", "Action 2", ...],',
-            '  "lifestyle_recommendations": ["Recommendation 1", "Recommendation 2", ...],',
-            '  "warning_signs": ["Warning sign 1", "Warning sign 2", ...]',
-            "}"
-        ]
-        
-        return "\n".join(base_prompt + [""] + analysis_requirements)
-    
-    def _build_follow_up_prompt(self, conversation_history: List[Dict]) -> str:
-        """Build prompt for generating follow-up questions"""
-        conversation = "\n".join([
-            f"User: {msg['user']}\nAssistant: {msg['assistant']}"
-            for msg in conversation_history
-        ])
-        
-        return (
-            "Based on this medical conversation, generate 2-3 relevant follow-up "
-            "questions to better understand the patient's condition:\n\n"
-            f"{conversation}\n\n"
-            "Format the questions as a JSON array."
+        with GEMINI_STAGE_SECONDS.time(stage="prompt"):
+            prompt = self._build_analysis_prompt(symptoms, context)
+        cached = await self._cached_analysis(prompt, symptoms, context)
+        if cached is not None:
+            return cached
+
+        if self.batcher is not None:
+            result = await self.batcher.submit((prompt, symptoms, context))
+        else:
+            result = await self._analyze_prompt(prompt)
+        await self._remember_analysis(prompt, symptoms, context, result)
+        return result
+
+    async def _analyze_prompt(self, prompt: str) -> HealthAnalysisResponse:
+        response = await self._call_gemini_api(prompt, self.analysis_config)
+        return await self._parse_or_repair(
+            "analysis", prompt, response, self._parse_analysis_response, self.analysis_config
         )
-    
-    async def _call_gemini_api(self, prompt: str) -> str:
-        """Make an async call to the Gemini API"""
+
+    async def _analyze_batch(self, items: List[Tuple[str, List[str], Optional[Dict]]]) -> List:
+        """Answer several analyses with one multi-patient call
+
+        Identical prompts in the batch are asked once. Each patient's entry is
+        validated on its own; entries that are missing or invalid are retried
+        with a single-patient call, so one bad item never fails the others.
+        Returns a result or an exception per item.
+        """
+        unique: Dict[str, Tuple[List[str], Optional[Dict]]] = {}
+        for prompt, symptoms, context in items:
+            unique.setdefault(prompt, (symptoms, context))
+        prompts = list(unique)
+        GEMINI_BATCH_SIZE.observe(len(prompts))
+
+        answers: Dict[str, HealthAnalysisResponse] = {}
+        if len(prompts) > 1:
+            batch_prompt = self._build_batch_analysis_prompt(list(unique.values()))
+            try:
+                response = await self._call_gemini_api(batch_prompt, self.batch_analysis_config)
+            except UpstreamError as e:
+                return [e] * len(items)
+            answers = self._parse_batch_analysis_response(response, prompts)
+        GEMINI_BATCH_ITEMS.inc(len(answers), outcome="batched")
+
+        missing = [prompt for prompt in prompts if prompt not in answers]
+        GEMINI_BATCH_ITEMS.inc(len(missing), outcome="single")
+        singles = await asyncio.gather(*(self._analyze_prompt(prompt) for prompt in missing), return_exceptions=True)
+        answers.update(zip(missing, singles))
+        return [answers[prompt] for prompt, _, _ in items]
+
+    def _parse_batch_analysis_response(self, response: str, prompts: List[str]) -> Dict[str, HealthAnalysisResponse]:
+        """Map each patient's valid entry in a batch answer to its prompt"""
         try:
-            response = await asyncio.to_thread(
-                self.model.generate_content,
-                prompt,
-                generation_config={
-                    'temperature': 0.3,
-                    'top_p': 0.8,
-                    'top_k': 40
-                }
-            )
-            return response.text
-        except Exception as e:
-            raise Exception(f"Error calling Gemini API: {str(e)}")
-    
-    def _parse_analysis_response(self, response: str) -> HealthAnalysisResponse:
-        """Parse and validate the Gemini API response"""
+            entries = extract_json(response, list)
+        except StructuredOutputError:
+            return {}
+        answers = {}
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            # Prefer the patient number the model echoed; fall back to position
+            number = entry.pop("patient", position + 1)
+            if not isinstance(number, int) or not 1 <= number <= len(prompts):
+                continue
+            try:
+                answers.setdefault(prompts[number - 1], HealthAnalysisResponse(**entry))
+            except ValueError:
+                continue
+        return answers
+
+    async def stream_analysis(self, symptoms: List[str], context: Optional[Dict] = None) -> AsyncIterator[Dict]:
+        """Stream a symptom analysis as incremental events
+
+        Yields ``delta`` events with raw model text as it arrives, ``field`` events
+        as soon as each top-level field of the JSON answer is complete, and a final
+        ``result`` event carrying the validated analysis.
+        """
+        prompt = self._build_analysis_prompt(symptoms, context)
+        cached = await self._cached_analysis(prompt, symptoms, context)
+        if cached is not None:
+            data = cached.model_dump()
+            for name, value in data.items():
+                yield {"event": "field", "name": name, "value": value}
+            yield {"event": "result", "data": data}
+            return
+
+        text = []
+        extractor = _FieldExtractor()
+        async for chunk in self._stream_gemini_api(prompt):
+            text.append(chunk)
+            yield {"event": "delta", "text": chunk}
+            for name, value in extractor.feed(chunk):
+                yield {"event": "field", "name": name, "value": value}
+
+        result = await self._parse_or_repair(
+            "analysis", prompt, "".join(text), self._parse_analysis_response, self.analysis_config
+        )
+        await self._remember_analysis(prompt, symptoms, context, result)
+        yield {"event": "result", "data": result.model_dump()}
+
+    async def generate_follow_up(self, conversation_history: List[Dict], summary: Optional[ConversationSummary] = None) -> List[str]:
+        """Generate relevant follow-up questions based on conversation history
+
+        ``summary`` carries turns before ``conversation_history`` that a
+        session has already folded; it is not modified.
+        """
+        prompt = self._build_follow_up_prompt(conversation_history, summary)
+        response = await self._call_gemini_api(prompt, self.follow_up_config)
+        return await self._parse_or_repair(
+            "follow_up", prompt, response, self._parse_follow_up_response, self.follow_up_config
+        )
+
+    def _semantic_key(self, symptoms: List[str], context: Optional[Dict]) -> Tuple[str, str, str]:
+        """Return (text, scope, guard) for the semantic cache
+
+        The guard is computed on the paraphrase-normalized text, so "a lot"
+        counts as "severe" on both sides of a match.
+        """
+        words = self.semantic_cache.vectorizer.normalize(", ".join(self._normalize_symptoms(symptoms)))
+        text = " ".join(words)
+        return text, json.dumps(context or {}, sort_keys=True), critical_signature(text)
+
+    async def _cached_analysis(self, prompt: str, symptoms: List[str], context: Optional[Dict]) -> Optional[HealthAnalysisResponse]:
+        """Look up the exact-prompt cache, then the semantic cache"""
+        cached = self.analysis_cache.get(prompt)
+        if cached is None and self.shared_cache is not None:
+            cached = await self._shared_analysis(prompt)
+        if cached is not None or self.semantic_cache.maxsize <= 0:
+            return cached
+        text, scope, guard = self._semantic_key(symptoms, context)
+        cached = self.semantic_cache.get(text, scope=scope, guard=guard)
+        GEMINI_SEMANTIC_LOOKUPS.inc(outcome="hit" if cached is not None else "miss")
+        if cached is not None:
+            self.analysis_cache.set(prompt, cached)
+        return cached
+
+    async def _shared_analysis(self, prompt: str) -> Optional[HealthAnalysisResponse]:
+        """Look up another worker's answer; a shared cache outage is a miss
+
+        The shared caches block (SQLite lock waits, Redis round trips), so
+        they are called from a worker thread rather than the event loop.
+        """
         try:
-            data = json.loads(response)
-            return HealthAnalysisResponse(**data)
+            value = await asyncio.to_thread(self.shared_cache.get, self._shared_key(prompt))
         except Exception as e:
-            raise ValueError(f"Failed to parse Gemini API response: {str(e)}")
-    """
-    # Code to handle the response from the Gemini API goes here
-    pass
+            print(f"Error reading shared cache: {str(e)}")
+            return None
+        if value is None:
+            return None
+        result = HealthAnalysisResponse.model_validate_json(value)
+        self.analysis_cache.set(prompt, result)
+        return result
 
-import os
-import json
-import asyncio
-import aiohttp
-from typing import List, Dict, Optional
-from dotenv import load_dotenv
-from pydantic import BaseModel
+    @staticmethod
+    def _shared_key(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode()).hexdigest()
 
-load_dotenv()
+    async def _remember_analysis(self, prompt: str, symptoms: List[str], context: Optional[Dict], result: HealthAnalysisResponse):
+        self.analysis_cache.set(prompt, result)
+        if self.shared_cache is not None:
+            try:
+                await asyncio.to_thread(
+                    self.shared_cache.set, self._shared_key(prompt), result.model_dump_json(), self.analysis_cache.ttl
+                )
+            except Exception as e:
+                print(f"Error writing shared cache: {str(e)}")
+        if self.semantic_cache.maxsize > 0:
+            text, scope, guard = self._semantic_key(symptoms, context)
+            self.semantic_cache.set(text, result, scope=scope, guard=guard)
 
-class HealthAnalysisResponse(BaseModel):
-    urgency_level: str
-    initial_assessment: str
-    recommended_actions: List[str]
-    lifestyle_recommendations: List[str]
-    warning_signs: List[str]
+    def _structured_config(self, schema: Dict) -> Dict:
+        if not self.json_mode:
+            return self.generation_config
+        return {**self.generation_config, "responseMimeType": "application/json", "responseSchema": schema}
+
+    async def _parse_or_repair(self, kind: str, prompt: str, response: str, parse, generation_config: Dict):
+        """Parse model output, re-prompting once with the parse error if it is malformed
+
+        Raises a non-retryable UpstreamError if the repaired output is still
+        malformed, so routes can fall back instead of failing with a 500.
+        """
+        try:
+            with GEMINI_STAGE_SECONDS.time(stage="parse"):
+                return parse(response)
+        except ValueError as e:
+            error = e
+
+        repaired = await self._call_gemini_api(self._build_repair_prompt(prompt, response, error), generation_config)
+        try:
+            with GEMINI_STAGE_SECONDS.time(stage="parse"):
+                result = parse(repaired)
+        except ValueError as e:
+            GEMINI_REPAIRS.inc(kind=kind, outcome="failed")
+            raise UpstreamError(f"Gemini returned malformed output: {str(e)}", status=502, retryable=False)
+        GEMINI_REPAIRS.inc(kind=kind, outcome="repaired")
+        return result
+
+    @staticmethod
+    def _normalize_symptoms(symptoms: List[str]) -> List[str]:
+        """Canonicalize symptoms: split comma lists, fold case/whitespace, dedupe and sort"""
+        normalized = set()
+        for symptom in symptoms:
+            for part in symptom.split(","):
+                part = _WHITESPACE.sub(" ", part).strip().lower()
+                if part:
+                    normalized.add(part)
+        return sorted(normalized)
 
-class GeminiClient:
-    def __init__(self):
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            raise ValueError("GOOGLE_API_KEY environment variable is not set")
-        self.endpoint = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
-        
-    async def analyze_symptoms(self, symptoms: List[str], context: Optional[Dict] = None) -> HealthAnalysisResponse:
-        """Analyze symptoms and generate health insights using Gemini API"""
-        prompt = self._build_analysis_prompt(symptoms, context)
-        response = await self._call_gemini_api(prompt)
-        return self._parse_analysis_response(response)
-        
-    async def generate_follow_up(self, conversation_history: List[Dict]) -> str:
-        """Generate relevant follow-up questions based on conversation history"""
-        prompt = self._build_follow_up_prompt(conversation_history)
-        response = await self._call_gemini_api(prompt)
-        return response
-        
     def _build_analysis_prompt(self, symptoms: List[str], context: Optional[Dict] = None) -> str:
-        """Build a structured prompt for symptom analysis"""
+        """Build a structured prompt for symptom analysis
+
+        Symptoms and context are canonicalized so that equivalent inputs produce
+        byte-identical prompts, which lets the prompt double as the cache key.
+        """
         base_prompt = [
             "As a medical AI assistant, analyze these symptoms for triage:",
-            f"Symptoms: {', '.join(symptoms)}"
+            *self._patient_lines(symptoms, context),
         ]
-        
-        if context:
-            base_prompt.append(f"Additional Context: {json.dumps(context)}")
-            
+
         analysis_requirements = [
             "Please provide a JSON response with the following structure:",
             "{",
-            '  "urgency_level": "(LOW/MEDIUM/HIGH/EMERGENCY)",',
-            '  "initial_assessment": "Brief analysis of symptoms",',
-            '  "recommended_actions": ["Action 1", "Action 2", ...],',
-            '  "lifestyle_recommendations": ["Recommendation 1", "Recommendation 2", ...],',
-            '  "warning_signs": ["Warning sign 1", "Warning sign 2", ...]',
+            *_ANALYSIS_FORMAT,
             "}"
         ]
-        
+
         return "\n".join(base_prompt + [""] + analysis_requirements)
-    
-    def _build_follow_up_prompt(self, conversation_history: List[Dict]) -> str:
-        """Build prompt for generating follow-up questions"""
-        conversation = "\n".join([
-            f"User: {msg['user']}\nAssistant: {msg['assistant']}"
-            for msg in conversation_history
-        ])
-        
+
+    def _patient_lines(self, symptoms: List[str], context: Optional[Dict]) -> List[str]:
+        lines = [f"Symptoms: {', '.join(self._normalize_symptoms(symptoms))}"]
+        if context:
+            lines.append(f"Additional Context: {json.dumps(context, sort_keys=True)}")
+        return lines
+
+    def _build_batch_analysis_prompt(self, patients: List[Tuple[List[str], Optional[Dict]]]) -> str:
+        """Build one prompt asking for an independent analysis of each patient"""
+        lines = [
+            "As a medical AI assistant, analyze the symptoms of each of these patients for triage.",
+            "Assess every patient independently; do not let one patient's symptoms affect another's analysis.",
+        ]
+        for number, (symptoms, context) in enumerate(patients, 1):
+            lines += ["", f"Patient {number}:", *self._patient_lines(symptoms, context)]
+        lines += [
+            "",
+            "Please provide a JSON array with one object per patient, in the same order, each with the following structure:",
+            "{",
+            '  "patient": (patient number),',
+            *_ANALYSIS_FORMAT,
+            "}",
+        ]
+        return "\n".join(lines)
+
+    def _build_follow_up_prompt(self, conversation_history: List[Dict], summary: Optional[ConversationSummary] = None) -> str:
+        """Build prompt for generating follow-up questions
+
+        Only the most recent turns that fit the token budget are quoted; older
+        ones are folded into a short structured summary, so prompt size stays
+        flat however long the chat runs.
+        """
+        summary, recent = compact_history(
+            conversation_history,
+            self.follow_up_token_budget,
+            self.follow_up_recent_turns,
+            summary=summary.copy() if summary is not None else None,
+        )
+        conversation = "\n".join(format_turn(turn) for turn in recent)
+        earlier = f"Summary of the earlier conversation:\n{summary.render()}\n\n" if summary.turns else ""
+
         return (
             "Based on this medical conversation, generate 2-3 relevant follow-up "
             "questions to better understand the patient's condition:\n\n"
+            f"{earlier}"
             f"{conversation}\n\n"
             "Format the questions as a JSON array."
         )
-    
-    async def _call_gemini_api(self, prompt: str) -> str:
-        """Make an async call to the Gemini API"""
-        headers = {
+
+    @staticmethod
+    def _build_repair_prompt(prompt: str, response: str, error: Exception) -> str:
+        """Build a re-prompt asking the model to fix output that failed to parse"""
+        return (
+            f"{prompt}\n\n"
+            "Your previous reply could not be used:\n"
+            f"{response[:4000]}\n\n"
+            f"Problem: {str(error)[:500]}\n"
+            "Reply again with only the corrected JSON, without markdown fences or explanation."
+        )
+
+    async def _call_gemini_api(self, prompt: str, generation_config: Optional[Dict] = None) -> str:
+        """Make an async call to the Gemini API, coalescing identical concurrent prompts"""
+        generation_config = generation_config or self.generation_config
+        key = (prompt, json.dumps(generation_config, sort_keys=True))
+        return await self._inflight.do(key, lambda: self._call_with_retries(prompt, generation_config))
+
+    def _check_breaker(self):
+        try:
+            self.breaker.allow()
+        except UpstreamError:
+            GEMINI_BREAKER_REJECTIONS.inc()
+            raise
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    async def _hedged_request(self, prompt: str, generation_config: Dict) -> str:
+        sent = 0
+
+        async def attempt():
+            nonlocal sent
+            sent += 1
+            if sent > 1:
+                GEMINI_HEDGES.inc()
+            return await self._request(prompt, generation_config)
+
+        return await hedged(attempt, self._hedge_delay())
+
+    async def _call_with_retries(self, prompt: str, generation_config: Dict) -> str:
+        """Call upstream within the deadline, retrying transient failures with backoff"""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self._check_breaker()
+            try:
+                result = await asyncio.wait_for(
+                    self._hedged_request(prompt, generation_config),
+                    timeout=max(deadline - time.monotonic(), 0),
+                )
+            except asyncio.TimeoutError:
+                self.breaker.record_failure()
+                raise UpstreamError(
+                    f"Error calling Gemini API: no response within {self.deadline:g}s", status=504, retryable=False
+                )
+            except UpstreamError as e:
+                if not e.retryable:
+                    # The upstream answered; the request itself was at fault
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                attempt += 1
+                delay = backoff_delay(attempt - 1, self.backoff_base, self.backoff_max, e.retry_after)
+                if attempt >= self.max_attempts or time.monotonic() + delay >= deadline:
+                    raise
+                GEMINI_RETRIES.inc(reason=str(e.status or "network"))
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    @staticmethod
+    def _status_error(status: int, text: str, headers) -> UpstreamError:
+        """Build the error for a non-200 response; 429 and 5xx are worth retrying"""
+        return UpstreamError(
+            f"Error calling Gemini API: API call failed: {text}",
+            status=status,
+            retry_after=parse_retry_after(headers.get("Retry-After")),
+            retryable=status == 429 or status >= 500,
+        )
+
+    def _headers(self) -> Dict[str, str]:
+        return {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
-        
-        data = {
+
+    @staticmethod
+    def _payload(prompt: str, generation_config: Dict) -> Dict:
+        return {
             "contents": [{
                 "role": "user",
                 "parts": [{"text": prompt}]
             }],
-            "generationConfig": {
-                "temperature": 0.3,
-                "topP": 0.8,
-                "topK": 40
-            }
+            "generationConfig": generation_config
         }
-        
+
+    async def _request(self, prompt: str, generation_config: Dict) -> str:
+        """Send a single generateContent request upstream"""
+        status = "error"
+        GEMINI_UPSTREAM_IN_FLIGHT.inc()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.endpoint, headers=headers, json=data) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise Exception(f"API call failed: {error_text}")
-                    
+            session = await self._get_session()
+            started = time.perf_counter()
+            async with session.post(
+                self.endpoint,
+                headers=self._headers(),
+                json=self._payload(prompt, generation_config),
+            ) as response:
+                # Time to headers covers network round trip plus model generation
+                GEMINI_STAGE_SECONDS.observe_timing(time.perf_counter() - started, stage="upstream_wait")
+                status = response.status
+                if response.status != 200:
+                    raise self._status_error(response.status, await response.text(), response.headers)
+
+                with GEMINI_STAGE_SECONDS.time(stage="upstream_read"):
                     result = await response.json()
-                    return result["candidates"][0]["content"]["parts"][0]["text"]
+                self.latency.observe(time.perf_counter() - started)
+                return result["candidates"][0]["content"]["parts"][0]["text"]
+        except UpstreamError:
+            raise
+        except (KeyError, IndexError, TypeError) as e:
+            raise UpstreamError(f"Error calling Gemini API: unexpected response: {str(e)}", status=status, retryable=False)
         except Exception as e:
-            raise Exception(f"Error calling Gemini API: {str(e)}")
-    
+            raise UpstreamError(f"Error calling Gemini API: {str(e)}")
+        finally:
+            GEMINI_UPSTREAM_IN_FLIGHT.dec()
+            GEMINI_UPSTREAM_REQUESTS.inc(endpoint="generateContent", status=status)
+
+    async def _stream_gemini_api(self, prompt: str) -> AsyncIterator[str]:
+        """Stream text chunks from the Gemini streamGenerateContent endpoint
+
+        Opening the stream is retried like other calls. Once text has been
+        yielded a failure is raised as is, since replaying would repeat output.
+        """
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self._check_breaker()
+            yielded = False
+            try:
+                async for chunk in self._stream_once(prompt, deadline):
+                    yielded = True
+                    yield chunk
+            except UpstreamError as e:
+                if not e.retryable:
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                attempt += 1
+                delay = backoff_delay(attempt - 1, self.backoff_base, self.backoff_max, e.retry_after)
+                if yielded or attempt >= self.max_attempts or time.monotonic() + delay >= deadline:
+                    raise
+                GEMINI_RETRIES.inc(reason=str(e.status or "network"))
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return
+
+    async def _stream_once(self, prompt: str, deadline: float) -> AsyncIterator[str]:
+        status = "error"
+        GEMINI_UPSTREAM_IN_FLIGHT.inc()
+        try:
+            session = await self._get_session()
+            started = time.perf_counter()
+            first_chunk_at = None
+            async with session.post(
+                self.stream_endpoint,
+                headers=self._headers(),
+                json=self._payload(prompt, self.analysis_config),
+                timeout=self._stream_timeout(deadline),
+            ) as response:
+                status = response.status
+                if response.status != 200:
+                    raise self._status_error(response.status, await response.text(), response.headers)
+
+                async for line in response.content:
+                    line = line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+                    if first_chunk_at is None:
+                        first_chunk_at = time.perf_counter()
+                        GEMINI_STAGE_SECONDS.observe_timing(first_chunk_at - started, stage="stream_first_chunk")
+                    result = json.loads(line[5:])
+                    for candidate in result.get("candidates", [])[:1]:
+                        for part in candidate.get("content", {}).get("parts", []):
+                            if part.get("text"):
+                                yield part["text"]
+            if first_chunk_at is not None:
+                # Includes time the consumer spends between chunks
+                GEMINI_STAGE_SECONDS.observe_timing(time.perf_counter() - first_chunk_at, stage="stream_generation")
+        except UpstreamError:
+            raise
+        except Exception as e:
+            raise UpstreamError(f"Error calling Gemini API: {str(e)}")
+        finally:
+            GEMINI_UPSTREAM_IN_FLIGHT.dec()
+            GEMINI_UPSTREAM_REQUESTS.inc(endpoint="streamGenerateContent", status=status)
+
+    @staticmethod
+    def _stream_timeout(deadline: float):
+        """Limit a streaming request to what is left of the call's deadline"""
+        import aiohttp
+
+        return aiohttp.ClientTimeout(total=max(deadline - time.monotonic(), 0.001))
+
     def _parse_analysis_response(self, response: str) -> HealthAnalysisResponse:
         """Parse and validate the Gemini API response"""
         try:
-            data = json.loads(response)
-            return HealthAnalysisResponse(**data)
+            return HealthAnalysisResponse(**extract_json(response, dict))
         except Exception as e:
-            raise ValueError(f"Failed to parse Gemini API response: {str(e)}")
\ No newline at end of file
+            raise ValueError(f"Failed to parse Gemini API response: {str(e)}")
+
+    @staticmethod
+    def _parse_follow_up_response(response: str) -> List[str]:
+        """Parse follow-up questions from a JSON array of strings (or of {"question": ...})"""
+        items = extract_json(response, list)
+        questions = []
+        for item in items:
+            if isinstance(item, dict):
+                item = item.get("question")
+            if isinstance(item, str) and item.strip():
+                questions.append(item.strip())
+        if not questions:
+            raise StructuredOutputError(f"No follow-up questions in model output: {response[:200]!r}")
+        return questions
@@ -1,11 +1,20 @@
 import os
-from typing import Dict, List, Optional
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional
 import datetime
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import numpy as np
 from pydantic import BaseModel
+from src.api.fit_store import FitDayStore, create_fit_store
+from src.core.fitness import IntradayWindow, sleep_features, summarize_features
+from src.utils.cache import TTLCache
+from src.utils.metrics import REGISTRY
+from src.utils.shared_cache import file_lock
+
+if TYPE_CHECKING:
+    from google_auth_httplib2 import AuthorizedHttp
 
 SCOPES = [
     'https://www.googleapis.com/auth/fitness.activity.read',
@@ -13,93 +22,371 @@ SCOPES = [
     'https://www.googleapis.com/auth/fitness.sleep.read'
 ]
 
+FIT_STAGE_SECONDS = REGISTRY.histogram(
+    "google_fit_stage_seconds", "Time spent in Google Fit store lookups and upstream calls", ("kind", "stage"),
+    timing_prefix="fit",
+)
+FIT_UPSTREAM_REQUESTS = REGISTRY.counter(
+    "google_fit_upstream_requests_total", "Google Fit aggregate requests by outcome", ("kind", "status")
+)
+FIT_DAYS_SERVED = REGISTRY.counter(
+    "google_fit_days_total", "Days of Fit data requested, by where they were served from", ("kind", "source")
+)
+
+# Merged raw data sources Google Fit derives from every connected device
+INTRADAY_SOURCES = {
+    "heart_rate": "derived:com.google.heart_rate.bpm:com.google.android.gms:merge_heart_rate_bpm",
+    "steps": "derived:com.google.step_count.delta:com.google.android.gms:estimated_steps",
+    "sleep": "derived:com.google.sleep.segment:com.google.android.gms:merged",
+}
+
+# Sleep segments are fetched from this long before a window's first midnight,
+# so the night ending on its first morning is complete
+SLEEP_LOOKBACK_SECONDS = 12 * 3600
+
 class FitnessData(BaseModel):
     date: str
-    steps: Optional[int]
-    active_minutes: Optional[int]
-    heart_rate_avg: Optional[int]
-    sleep_hours: Optional[float]
-    deep_sleep_percentage: Optional[float]
+    steps: Optional[int] = None
+    active_minutes: Optional[int] = None
+    heart_rate_avg: Optional[int] = None
+    sleep_hours: Optional[float] = None
+    deep_sleep_percentage: Optional[float] = None
 
 class GoogleFitClient:
-    def __init__(self):
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        store: Optional[FitDayStore] = None,
+        stale_after: Optional[float] = None,
+    ):
         self.creds = None
         self.service = None
-        self.load_credentials()
+        # googleapiclient is blocking, so requests run on a bounded thread pool.
+        # httplib2 is not thread-safe; each worker thread gets its own connection.
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("GOOGLE_FIT_MAX_WORKERS", "4")),
+            thread_name_prefix="google-fit",
+        )
+        self._local = threading.local()
+
+        # Completed days are immutable once fetched; today's bucket is refetched
+        # after ``stale_after`` seconds. GOOGLE_FIT_CACHE_PATH="" disables the store.
+        self.store = store if store is not None else create_fit_store()
+        self.stale_after = stale_after if stale_after is not None else float(os.getenv("GOOGLE_FIT_STALE_SECONDS", "300"))
+        self.upstream_calls = 0
+
+        # Intraday windows are capped in days so memory per user stays bounded;
+        # dataset points are fetched and ingested one page at a time
+        self.intraday_max_days = int(os.getenv("GOOGLE_FIT_INTRADAY_MAX_DAYS", "14"))
+        self.page_size = int(os.getenv("GOOGLE_FIT_PAGE_SIZE", "1000"))
+        self._summaries = TTLCache(maxsize=32, ttl=self.stale_after)
+
+        # token.json is shared by every worker process; refreshes hold this
+        # lock file so only one worker refreshes and the rest reuse its token
+        self.token_path = os.getenv("GOOGLE_FIT_TOKEN_PATH", "token.json")
+        self._refresh_lock = threading.Lock()
+        try:
+            self.load_credentials()
+        except BaseException:
+            # A failed build is retried on the next request (ClientProvider);
+            # each attempt must not leave a thread pool and a connection behind
+            self._executor.shutdown(wait=False)
+            if store is None and self.store is not None:
+                self.store.close()
+            raise
 
     def load_credentials(self):
         """Load or refresh Google Fit API credentials"""
-        if os.path.exists('token.json'):
-            self.creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+        # The Google client libraries are slow to import; load them only when
+        # a Fit client is actually built so app startup stays fast.
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from googleapiclient.discovery import build
+
+        with file_lock(f"{self.token_path}.lock"):
+            self.creds = self._read_token()
+            if not self.creds or not self.creds.valid:
+                if self.creds and self.creds.expired and self.creds.refresh_token:
+                    self._refresh_token(self.creds)
+                else:
+                    flow = InstalledAppFlow.from_client_secrets_file(
+                        'credentials.json', SCOPES)
+                    self.creds = flow.run_local_server(port=0)
+                    self._write_token(self.creds)
+
+        self.service = build('fitness', 'v1', credentials=self.creds)
+
+    def _read_token(self):
+        from google.oauth2.credentials import Credentials
+
+        if os.path.exists(self.token_path):
+            return Credentials.from_authorized_user_file(self.token_path, SCOPES)
+        return None
+
+    def _write_token(self, creds):
+        # Write then rename, so other workers never read a partial file
+        tmp = f"{self.token_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as token:
+            token.write(creds.to_json())
+        os.replace(tmp, self.token_path)
 
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
+    def _refresh_token(self, creds):
+        from google.auth.transport.requests import Request
+
+        creds.refresh(Request())
+        self._write_token(creds)
+
+    def ensure_fresh_credentials(self):
+        """Refresh expired credentials once across threads and worker processes
+
+        Called on worker threads before each request. Under the lock, a token
+        another worker already refreshed is adopted from token.json instead of
+        refreshing again.
+        """
+        if self.creds is None or self.creds.valid:
+            return
+        with self._refresh_lock, file_lock(f"{self.token_path}.lock"):
+            if self.creds.valid:
+                return
+            shared = self._read_token()
+            if shared is not None and shared.valid:
+                # Update in place: every thread's AuthorizedHttp holds self.creds
+                self.creds.token = shared.token
+                self.creds.expiry = shared.expiry
             else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    'credentials.json', SCOPES)
-                self.creds = flow.run_local_server(port=0)
+                self._refresh_token(self.creds)
 
-            with open('token.json', 'w') as token:
-                token.write(self.creds.to_json())
+    def close(self):
+        """Stop the worker threads used for Google Fit requests"""
+        self._executor.shutdown(wait=False)
+        if self.store is not None:
+            self.store.close()
 
-        self.service = build('fitness', 'v1', credentials=self.creds)
+    def _thread_http(self) -> "AuthorizedHttp":
+        """Return the calling worker thread's authorized HTTP connection"""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
 
-    async def get_activity_data(self, days: int = 7) -> List[FitnessData]:
-        """Get user's activity data for the last n days"""
-        end_time = datetime.datetime.utcnow()
-        start_time = end_time - datetime.timedelta(days=days)
+            http = AuthorizedHttp(self.creds, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    async def _execute(self, request):
+        """Run a blocking googleapiclient request without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+
+        def execute():
+            self.ensure_fresh_credentials()
+            return request.execute(http=self._thread_http())
 
-        # Convert times to nanoseconds for the API
-        end_nanos = int(end_time.timestamp() * 1000000000)
-        start_nanos = int(start_time.timestamp() * 1000000000)
+        return await loop.run_in_executor(self._executor, execute)
 
+    async def _aggregate(self, data_types: List[str], start: datetime.datetime, end: datetime.datetime) -> Dict:
+        """Aggregate the given data types into daily buckets between start and end"""
         body = {
-            "aggregateBy": [{
-                "dataTypeName": "com.google.step_count.delta",
-            }, {
-                "dataTypeName": "com.google.active_minutes",
-            }, {
-                "dataTypeName": "com.google.heart_rate.bpm",
-            }],
+            "aggregateBy": [{"dataTypeName": data_type} for data_type in data_types],
             "bucketByTime": {"durationMillis": 86400000},  # 1 day
-            "startTimeMillis": start_nanos // 1000000,
-            "endTimeMillis": end_nanos // 1000000
+            "startTimeMillis": int(start.timestamp() * 1000),
+            "endTimeMillis": int(end.timestamp() * 1000)
         }
+        request = self.service.users().dataset().aggregate(userId="me", body=body)
+        self.upstream_calls += 1
+        return await self._execute(request)
 
+    def _is_fresh(self, day: datetime.date, entry: Optional[tuple], now: float, today: datetime.date) -> bool:
+        """Whether a stored day can be served without asking Google Fit again"""
+        if entry is None:
+            return False
+        fetched_at = entry[1]
+        if day < today:
+            # Only trust a past day if it was fetched after the day had ended
+            day_end = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min, datetime.timezone.utc)
+            return fetched_at >= day_end.timestamp()
+        return now - fetched_at < self.stale_after
+
+    async def _get_daily(self, kind: str, data_types: List[str], defaults: Dict, days: int) -> List[FitnessData]:
+        """Serve the last n UTC days of aggregated data from the local store, fetching only missing or stale days"""
+        async def fetch(start: datetime.datetime, end: datetime.datetime) -> Dict[str, Dict]:
+            response = await self._aggregate(data_types, start, end)
+            return {
+                data.date: data.model_dump(exclude_none=True)
+                for data in self._parse_activity_response(response, defaults)
+            }
+
+        return await self._get_stored_days(kind, days, fetch)
+
+    async def _get_stored_days(self, kind: str, days: int, fetch) -> List[FitnessData]:
+        """Serve the last n UTC days from the local store, fetching only missing or stale days
+
+        ``fetch(start, end)`` returns {date: FitnessData fields} for the days it
+        found between two UTC datetimes; days it leaves out are stored as empty.
+        """
+        now = time.time()
+        today = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).date()
+        dates = [(today - datetime.timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+        with FIT_STAGE_SECONDS.time(kind=kind, stage="store"):
+            # The store blocks (SQLite lock waits, Redis round trips); keep it off the event loop
+            stored = await asyncio.to_thread(self.store.get, kind, dates) if self.store is not None else {}
+
+        missing = [
+            day for day in dates
+            if not self._is_fresh(datetime.date.fromisoformat(day), stored.get(day), now, today)
+        ]
+        FIT_DAYS_SERVED.inc(len(dates) - len(missing), kind=kind, source="store")
+        FIT_DAYS_SERVED.inc(len(missing), kind=kind, source="upstream")
+        if missing:
+            first = datetime.date.fromisoformat(missing[0])
+            last = datetime.date.fromisoformat(missing[-1])
+            start = datetime.datetime.combine(first, datetime.time.min, datetime.timezone.utc)
+            end = min(
+                datetime.datetime.combine(last + datetime.timedelta(days=1), datetime.time.min, datetime.timezone.utc),
+                datetime.datetime.fromtimestamp(now, datetime.timezone.utc),
+            )
+            try:
+                with FIT_STAGE_SECONDS.time(kind=kind, stage="upstream"):
+                    fetched = await fetch(start, end)
+            except Exception as e:
+                # Serve whatever is stored rather than failing the whole window
+                FIT_UPSTREAM_REQUESTS.inc(kind=kind, status="error")
+                print(f"Error fetching {kind} data: {str(e)}")
+            else:
+                FIT_UPSTREAM_REQUESTS.inc(kind=kind, status="ok")
+                records = {day: fetched.get(day) for day in dates[dates.index(missing[0]):dates.index(missing[-1]) + 1]}
+                if self.store is not None:
+                    await asyncio.to_thread(self.store.put, kind, records, now)
+                stored.update({day: (payload, now) for day, payload in records.items()})
+
+        return [FitnessData(**stored[day][0]) for day in dates if day in stored and stored[day][0]]
+
+    async def get_activity_data(self, days: int = 7) -> List[FitnessData]:
+        """Get user's step and active-minute data for the last n days"""
         try:
-            response = await self.service.users().dataset().aggregate(userId="me", body=body).execute()
-            return self._parse_activity_response(response)
+            return await self._get_daily(
+                "activity",
+                ["com.google.step_count.delta", "com.google.active_minutes"],
+                {"steps": 0, "active_minutes": 0},
+                days,
+            )
         except Exception as e:
             print(f"Error fetching activity data: {str(e)}")
             return []
 
+    async def get_heart_rate_data(self, days: int = 7) -> List[FitnessData]:
+        """Get user's average heart rate for the last n days"""
+        try:
+            return await self._get_daily("heart_rate", ["com.google.heart_rate.bpm"], {"heart_rate_avg": 0}, days)
+        except Exception as e:
+            print(f"Error fetching heart rate data: {str(e)}")
+            return []
+
     async def get_sleep_data(self, days: int = 7) -> List[FitnessData]:
-        """Get user's sleep data for the last n days"""
-        # Note: Sleep data requires different endpoint and parsing
-        # This is a placeholder implementation
-        return [
-            FitnessData(
-                date="2025-09-20",
-                sleep_hours=7.5,
-                deep_sleep_percentage=20
+        """Get user's nightly sleep hours and deep-sleep share for the last n days
+
+        Nights are credited to the day they end on. Completed nights are kept in
+        the day store like the aggregated kinds, so only today's (possibly still
+        partial) night is fetched again once stale.
+        """
+        async def fetch(start: datetime.datetime, end: datetime.datetime) -> Dict[str, Dict]:
+            window = IntradayWindow(int(start.timestamp()), (end.date() - start.date()).days + 1)
+            # Start the evening before, so the first night's early segments are included
+            failed = await self._ingest_window(window, window.start - SLEEP_LOOKBACK_SECONDS, int(end.timestamp()), ("sleep",))
+            if failed:
+                raise RuntimeError("intraday sleep data unavailable")
+            features = sleep_features(window.sleep, window.start, window.days)
+            hours, deep = features["sleep_hours"], features["deep_sleep_percentage"]
+            nights = {}
+            for day in np.flatnonzero(~np.isnan(hours)):
+                date = self._window_date(window, day)
+                nights[date] = FitnessData(
+                    date=date,
+                    sleep_hours=round(float(hours[day]), 2),
+                    deep_sleep_percentage=None if np.isnan(deep[day]) else round(float(deep[day]), 1),
+                ).model_dump(exclude_none=True)
+            return nights
+
+        try:
+            return await self._get_stored_days("sleep", max(1, min(days, self.intraday_max_days)), fetch)
+        except Exception as e:
+            print(f"Error fetching sleep data: {str(e)}")
+            return []
+
+    @staticmethod
+    def _window_date(window: IntradayWindow, day: int) -> str:
+        return datetime.datetime.fromtimestamp(window.start + day * 86400, datetime.timezone.utc).strftime("%Y-%m-%d")
+
+    async def _dataset_pages(self, source: str, start: int, end: int):
+        """Yield the points of a raw dataset between two epoch seconds, one page at a time"""
+        dataset_id = f"{start * 1_000_000_000}-{end * 1_000_000_000}"
+        page_token = None
+        while True:
+            request = self.service.users().dataSources().datasets().get(
+                userId="me", dataSourceId=source, datasetId=dataset_id, limit=self.page_size, pageToken=page_token
             )
-        ]
+            self.upstream_calls += 1
+            response = await self._execute(request)
+            yield response.get("point", [])
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return
+
+    async def get_intraday(self, days: int = 7, kinds=tuple(INTRADAY_SOURCES)) -> IntradayWindow:
+        """Fetch raw intraday data for the last n UTC days (at most GOOGLE_FIT_INTRADAY_MAX_DAYS)
+
+        Each kind is fetched concurrently and streamed page by page into the
+        window's fixed-size arrays. A kind that fails is logged and left empty.
+        """
+        days = max(1, min(days, self.intraday_max_days))
+        now = time.time()
+        today = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).date()
+        first = datetime.datetime.combine(today - datetime.timedelta(days=days - 1), datetime.time.min, datetime.timezone.utc)
+        window = IntradayWindow(int(first.timestamp()), days)
+        await self._ingest_window(window, window.start, int(now), kinds)
+        return window
+
+    async def _ingest_window(self, window: IntradayWindow, start: int, end: int, kinds) -> List[str]:
+        """Stream each kind's dataset pages between two epoch seconds into ``window``, concurrently
+
+        A kind that fails is logged and left empty; the failed kinds are returned.
+        """
+        failed = []
 
-    def _parse_activity_response(self, response: Dict) -> List[FitnessData]:
+        async def ingest(kind: str):
+            try:
+                with FIT_STAGE_SECONDS.time(kind=f"intraday_{kind}", stage="upstream"):
+                    async for points in self._dataset_pages(INTRADAY_SOURCES[kind], start, end):
+                        window.add_points(kind, points)
+            except Exception as e:
+                failed.append(kind)
+                FIT_UPSTREAM_REQUESTS.inc(kind=f"intraday_{kind}", status="error")
+                print(f"Error fetching intraday {kind} data: {str(e)}")
+            else:
+                FIT_UPSTREAM_REQUESTS.inc(kind=f"intraday_{kind}", status="ok")
+
+        await asyncio.gather(*(ingest(kind) for kind in kinds))
+        return failed
+
+    async def get_health_summary(self, days: int = 7) -> Dict:
+        """Compact summary of today's intraday features against the previous days
+
+        Suitable as analysis context; cached for GOOGLE_FIT_STALE_SECONDS.
+        """
+        summary = self._summaries.get(days)
+        if summary is None:
+            window = await self.get_intraday(days)
+            summary = summarize_features(window.features(), baseline_days=window.days - 1)
+            self._summaries.set(days, summary)
+        return summary
+
+    def _parse_activity_response(self, response: Dict, defaults: Optional[Dict] = None) -> List[FitnessData]:
         """Parse the Google Fit API activity response"""
         fitness_data = []
         for bucket in response.get("bucket", []):
             date = datetime.datetime.fromtimestamp(
-                int(bucket["startTimeMillis"]) / 1000
+                int(bucket["startTimeMillis"]) / 1000, datetime.timezone.utc
             ).strftime("%Y-%m-%d")
             
-            data = FitnessData(
-                date=date,
-                steps=0,
-                active_minutes=0,
-                heart_rate_avg=0
-            )
+            data = FitnessData(date=date, **(defaults or {}))
 
             for dataset in bucket.get("dataset", []):
                 for point in dataset.get("point", []):
@@ -108,6 +395,9 @@ class GoogleFitClient:
                         data.steps = sum(val["intVal"] for val in point["value"])
                     elif data_type == "com.google.active_minutes":
                         data.active_minutes = sum(val["intVal"] for val in point["value"])
+                    elif data_type == "com.google.heart_rate.summary":
+                        # Aggregated heart rate points carry [average, max, min]
+                        data.heart_rate_avg = int(point["value"][0]["fpVal"]) if point["value"] else 0
                     elif data_type == "com.google.heart_rate.bpm":
                         values = [val["fpVal"] for val in point["value"]]
                         data.heart_rate_avg = int(sum(values) / len(values)) if values else 0
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from src.models.session import Session
+from src.utils.cache import TTLCache
+from src.utils.shared_cache import connect_sqlite
+
+
+class MemorySessionStore:
+    """Sessions held in process, evicted after ``ttl`` idle seconds or LRU beyond ``maxsize``"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0):
+        self._sessions = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return self._sessions.get(session_id)
+
+    def put(self, session: Session):
+        # Re-setting restarts the idle TTL
+        self._sessions.set(session.id, session)
+
+    def delete(self, session_id: str):
+        self._sessions.pop(session_id)
+
+    # Async forms for request handlers; nothing here blocks
+    async def aget(self, session_id: str) -> Optional[Session]:
+        return self.get(session_id)
+
+    async def aput(self, session: Session):
+        self.put(session)
+
+    async def adelete(self, session_id: str):
+        self.delete(session_id)
+
+    def close(self):
+        self._sessions.clear()
+
+
+class SQLiteSessionStore:
+    """Sessions in a SQLite file, so they survive restarts and can be shared by workers
+
+    Rows idle for longer than ``ttl`` are treated as missing and purged
+    periodically on write.
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str, ttl: float = 3600.0):
+        self.ttl = ttl
+        self._conn = connect_sqlite(path)
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+
+    def get(self, session_id: str) -> Optional[Session]:
+        payload = self._read(session_id)
+        return Session.from_dict(json.loads(payload)) if payload is not None else None
+
+    def put(self, session: Session):
+        self._write(session.id, json.dumps(session.to_dict()))
+
+    def delete(self, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    # Async forms for request handlers: lock waits (up to the busy timeout
+    # under write contention) happen on a worker thread, not the event loop.
+    # Sessions are encoded on the loop, so the thread never sees one mid-update.
+    async def aget(self, session_id: str) -> Optional[Session]:
+        payload = await asyncio.to_thread(self._read, session_id)
+        return Session.from_dict(json.loads(payload)) if payload is not None else None
+
+    async def aput(self, session: Session):
+        await asyncio.to_thread(self._write, session.id, json.dumps(session.to_dict()))
+
+    async def adelete(self, session_id: str):
+        await asyncio.to_thread(self.delete, session_id)
+
+    def _read(self, session_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM sessions WHERE id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.ttl),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _write(self, session_id: str, payload: str):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, payload, updated_at) VALUES (?, ?, ?)",
+                (session_id, payload, now),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_session_store():
+    """Build the store named by SESSION_STORE_PATH (SQLite), or an in-memory one if unset"""
+    ttl = float(os.getenv("SESSION_TTL", "3600"))
+    path = os.getenv("SESSION_STORE_PATH")
+    if path:
+        return SQLiteSessionStore(path, ttl=ttl)
+    return MemorySessionStore(maxsize=int(os.getenv("SESSION_MAX_SESSIONS", "10000")), ttl=ttl)
+
+
+_session_store = None
+
+
+def get_session_store():
+    """FastAPI dependency for the shared session store, created on first use"""
+    global _session_store
+    if _session_store is None:
+        _session_store = create_session_store()
+    return _session_store
+
+
+def close_session_store():
+    global _session_store
+    if _session_store is not None:
+        _session_store.close()
+        _session_store = None
@@ -1,11 +1,40 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 import os
+import json
+import time
+import asyncio
 from dotenv import load_dotenv
-from src.api.gemini import GeminiClient, HealthAnalysisResponse
-from src.api.google_fit import GoogleFitClient, FitnessData
+from src.api.gemini import HealthAnalysisResponse
+from src.api.google_fit import FitnessData
+from src.api.clients import (
+    ClientProvider,
+    gemini_provider,
+    get_gemini_provider,
+    get_google_fit_provider,
+    warm_clients,
+    close_clients,
+    client_status,
+    configure_workers,
+)
+from src.api.session_store import get_session_store, close_session_store
+from src.models.session import Session
+from src.core.triage import (
+    get_default_engine,
+    build_local_analysis,
+    build_fallback_analysis,
+    ask_clarifying_questions,
+    local_clarifying_questions,
+)
+from src.core.analysis import summarize_batch
+from src.core.clarifying import get_clarifying_index
+from src.utils.concurrency import Outbox, SlowConsumer, bounded_gather
+from src.utils.metrics import REGISTRY, Gauge, MetricsMiddleware
+from src.utils.resilience import CircuitOpenError, UpstreamError
+from src.utils.admission import URGENT, ROUTINE, AdmissionController, AdmissionRejected
 
 load_dotenv()
 
@@ -20,13 +49,146 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize clients
-gemini_client = GeminiClient()
-google_fit_client = GoogleFitClient()
+# Request counts and latency by route; METRICS_TIMING_HEADERS=true also returns
+# a Server-Timing header breaking each request down into its stages
+app.add_middleware(
+    MetricsMiddleware,
+    timing_headers=os.getenv("METRICS_TIMING_HEADERS", "false").lower() == "true",
+)
+
+TRIAGE_DECISIONS = REGISTRY.counter(
+    "triage_decisions_total", "Symptom analyses by who answered them", ("source",)
+)
+FOLLOW_UP_DECISIONS = REGISTRY.counter(
+    "followup_decisions_total", "Follow-up questions in conversation turns by who answered them", ("source",)
+)
+CHAT_CONNECTIONS = REGISTRY.gauge("chat_websocket_connections", "Open chat WebSocket connections")
+CHAT_TURNS = REGISTRY.counter("chat_websocket_turns_total", "Chat WebSocket turns by input type", ("input",))
+CHAT_CLOSES = REGISTRY.counter("chat_websocket_closes_total", "Closed chat WebSocket connections by reason", ("reason",))
+CHAT_DROPPED = REGISTRY.counter(
+    "chat_websocket_dropped_deltas_total", "Streamed analysis text skipped because a chat client was reading slowly"
+)
+
+def _collect_gemini_metrics():
+    """Read GeminiClient cache and request coalescing stats at scrape time"""
+    client = gemini_provider.client
+    if client is None:
+        return []
+    stats = client.analysis_cache.stats()
+    cache = Gauge("gemini_analysis_cache", "Gemini analysis cache counters", ("stat",))
+    for stat in ("size", "hits", "misses", "evictions", "hit_ratio"):
+        cache.set(stats[stat], stat=stat)
+    inflight = Gauge("gemini_singleflight_calls", "Gemini calls started vs. joined an identical in-flight call", ("outcome",))
+    inflight.set(client._inflight.started, outcome="started")
+    inflight.set(client._inflight.shared, outcome="shared")
+    semantic = Gauge("gemini_semantic_cache", "Gemini semantic cache counters", ("stat",))
+    for stat, value in client.semantic_cache.stats().items():
+        semantic.set(value, stat=stat)
+    breaker = Gauge("gemini_breaker_open", "1 while the Gemini circuit breaker refuses calls")
+    breaker.set(int(client.breaker.state == "open"))
+    metrics = [cache, inflight, semantic, breaker]
+    if client.shared_cache is not None:
+        shared = Gauge("gemini_shared_cache", "Lookups in the analysis cache shared between workers", ("stat",))
+        for stat, value in client.shared_cache.stats().items():
+            shared.set(value, stat=stat)
+        metrics.append(shared)
+    return metrics
+
+def _collect_admission_metrics():
+    gauge = Gauge("gemini_admission", "Gemini admission control slots and rejections", ("stat",))
+    for stat, value in admission.stats().items():
+        gauge.set(value, stat=stat)
+    return [gauge]
+
+REGISTRY.register_collector(_collect_gemini_metrics)
+REGISTRY.register_collector(_collect_admission_metrics)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after + 0.5))},
+    )
+
+# Maximum concurrent Gemini calls issued by a single batch request
+BATCH_CONCURRENCY = int(os.getenv("GEMINI_BATCH_CONCURRENCY", "8"))
+
+# Answer analysis requests from the local triage rules when Gemini is down
+FALLBACK_TO_TRIAGE = os.getenv("GEMINI_FALLBACK_TO_TRIAGE", "true").lower() == "true"
+
+# Verbatim turns a session keeps before folding older ones into its summary
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "12"))
+
+# Chat WebSocket connections: close after CHAT_IDLE_TIMEOUT seconds without a
+# turn from the client (pings do not count, nor does time with a turn in progress); buffer at most
+# CHAT_SEND_QUEUE outgoing events and close clients that leave it full for
+# CHAT_SEND_TIMEOUT seconds; accept CHAT_MAX_PENDING_TURNS turns queued behind
+# the one in progress; re-check health data every CHAT_HEALTH_REFRESH seconds
+# (0 turns health pushes off)
+CHAT_IDLE_TIMEOUT = float(os.getenv("CHAT_IDLE_TIMEOUT", "300"))
+CHAT_SEND_QUEUE = int(os.getenv("CHAT_SEND_QUEUE", "64"))
+CHAT_SEND_TIMEOUT = float(os.getenv("CHAT_SEND_TIMEOUT", "10"))
+CHAT_MAX_PENDING_TURNS = int(os.getenv("CHAT_MAX_PENDING_TURNS", "4"))
+CHAT_HEALTH_REFRESH = float(os.getenv("CHAT_HEALTH_REFRESH", "300"))
+CHAT_HEALTH_DAYS = 7
+
+# Every Gemini call takes a slot here first, so a spike queues (briefly and
+# boundedly) or is shed with 429/503 instead of piling onto the upstream quota
+admission = AdmissionController.from_env()
+
+# Clients are built lazily (see src/api/clients.py): warm-up starts in the
+# background at startup so the worker accepts requests immediately, and the
+# first request for a backend that is not warm yet awaits the same build.
+@app.on_event("startup")
+async def startup():
+    """Start warming upstream clients and compiling the clarifying-question
+    index without blocking startup"""
+    warm_clients()
+    asyncio.get_running_loop().run_in_executor(None, get_clarifying_index)
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled upstream connections"""
+    await close_clients()
+    close_session_store()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Expose collected metrics in the Prometheus text format
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/ready")
+async def ready():
+    """
+    Report whether each upstream client has been built and is ready to serve
+    """
+    backends = client_status()
+    is_ready = all(status == "ready" for status in backends.values())
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"ready": is_ready, "backends": backends},
+    )
 
 class SymptomRequest(BaseModel):
     symptoms: List[str]
     context: Optional[Dict] = None
+    # Without an explicit context, the session's stored fitness context is used
+    session_id: Optional[str] = None
+
+class BatchSymptomRequest(BaseModel):
+    patients: List[SymptomRequest]
+
+class BatchAnalysisItem(BaseModel):
+    source: str
+    analysis: Optional[HealthAnalysisResponse] = None
+    error: Optional[str] = None
+
+class BatchAnalysisResponse(BaseModel):
+    results: List[BatchAnalysisItem]
+    summary: Dict
 
 class ConversationMessage(BaseModel):
     user: str
@@ -35,51 +197,638 @@ class ConversationMessage(BaseModel):
 class FollowUpRequest(BaseModel):
     conversation_history: List[ConversationMessage]
 
+class SessionRequest(BaseModel):
+    context: Optional[Dict] = None
+
+class SessionContextRequest(BaseModel):
+    context: Dict
+
+class TurnRequest(BaseModel):
+    message: str
+
+class TurnResponse(BaseModel):
+    analysis: HealthAnalysisResponse
+    questions: List[str]
+    # Who answered each part: "rules", "gemini" or "fallback"
+    sources: Dict[str, str]
+
+async def _get_session(session_id: str, store) -> Session:
+    session = await store.aget(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+async def _request_context(request: SymptomRequest, store) -> Optional[Dict]:
+    if request.context is not None or request.session_id is None:
+        return request.context
+    return (await _get_session(request.session_id, store)).context
+
+def get_tenant(request: Request) -> str:
+    """FastAPI dependency naming who a request counts against for admission limits"""
+    api_key = request.headers.get("X-API-Key")
+    if api_key:
+        return f"key:{api_key}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+def _priority(triage: Dict) -> int:
+    """Requests the rules already consider HIGH or EMERGENCY skip the routine queue"""
+    return URGENT if triage["urgency_level"] in ("HIGH", "EMERGENCY") else ROUTINE
+
+def _local_analysis(triage: Dict) -> Optional[HealthAnalysisResponse]:
+    """Answer from the local triage rules when they are decisive"""
+    analysis = build_local_analysis(triage)
+    TRIAGE_DECISIONS.inc(source="rules" if analysis else "gemini")
+    return HealthAnalysisResponse(**analysis) if analysis else None
+
+def _fallback_analysis(triage: Dict, error: UpstreamError) -> HealthAnalysisResponse:
+    """Answer from the local triage rules after Gemini failed, or re-raise"""
+    if not FALLBACK_TO_TRIAGE:
+        raise error
+    TRIAGE_DECISIONS.inc(source="fallback")
+    return HealthAnalysisResponse(**build_fallback_analysis(triage))
+
+def _upstream_http_error(error: UpstreamError) -> HTTPException:
+    """Map an upstream failure to 503 (breaker open), 504 (deadline) or 502"""
+    if isinstance(error, CircuitOpenError):
+        status_code = 503
+    elif error.status == 504:
+        status_code = 504
+    else:
+        status_code = 502
+    headers = {"Retry-After": str(int(error.retry_after))} if error.retry_after is not None else None
+    return HTTPException(status_code=status_code, detail=str(error), headers=headers)
+
 @app.post("/api/analyze_symptoms", response_model=HealthAnalysisResponse)
-async def analyze_symptoms(request: SymptomRequest):
+async def analyze_symptoms(
+    request: SymptomRequest,
+    gemini: ClientProvider = Depends(get_gemini_provider),
+    tenant: str = Depends(get_tenant),
+    sessions=Depends(get_session_store),
+):
     """
     Analyze symptoms using Gemini AI and return health insights
     """
-    try:
-        return await gemini_client.analyze_symptoms(request.symptoms, request.context)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    triage = get_default_engine().evaluate(request.symptoms)
+    local = _local_analysis(triage)
+    if local is not None:
+        return local
+    context = await _request_context(request, sessions)
+    async with admission.slot(tenant, _priority(triage)):
+        try:
+            gemini_client = await gemini.get()
+            try:
+                return await gemini_client.analyze_symptoms(request.symptoms, context)
+            except UpstreamError as e:
+                return _fallback_analysis(triage, e)
+        except UpstreamError as e:
+            raise _upstream_http_error(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+def _sse(event: Dict) -> str:
+    """Format an event dict as a Server-Sent Events frame"""
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+class _SlotStreamingResponse(StreamingResponse):
+    """StreamingResponse that releases an admission slot however the response ends"""
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+@app.post("/api/analyze_symptoms/stream")
+async def analyze_symptoms_stream(
+    request: SymptomRequest,
+    gemini: ClientProvider = Depends(get_gemini_provider),
+    tenant: str = Depends(get_tenant),
+    sessions=Depends(get_session_store),
+):
+    """
+    Stream symptom analysis as Server-Sent Events while Gemini generates it
+    """
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    triage = get_default_engine().evaluate(request.symptoms)
+
+    def fields_and_result(analysis: HealthAnalysisResponse):
+        data = analysis.model_dump()
+        for name, value in data.items():
+            yield _sse({"event": "field", "name": name, "value": value})
+        yield _sse({"event": "result", "data": data})
+
+    local = _local_analysis(triage)
+    if local is not None:
+        return StreamingResponse(fields_and_result(local), media_type="text/event-stream", headers=headers)
+
+    context = await _request_context(request, sessions)
+    # Take the slot before responding so a shed request gets a real 429/503
+    await admission.acquire(tenant, _priority(triage))
+    started = time.monotonic()
+
+    async def events():
+        try:
+            gemini_client = await gemini.get()
+            streaming = False
+            try:
+                async for event in gemini_client.stream_analysis(request.symptoms, context):
+                    streaming = True
+                    yield _sse(event)
+            except UpstreamError as e:
+                # Only fall back if nothing from Gemini reached the client yet
+                if streaming:
+                    raise
+                for frame in fields_and_result(_fallback_analysis(triage, e)):
+                    yield frame
+        except Exception as e:
+            yield _sse({"event": "error", "detail": str(e)})
+
+    return _SlotStreamingResponse(
+        events(),
+        release=lambda: admission.release(tenant, time.monotonic() - started),
+        media_type="text/event-stream",
+        headers=headers,
+    )
+
+@app.post("/api/analyze_symptoms/batch", response_model=BatchAnalysisResponse)
+async def analyze_symptoms_batch(
+    request: BatchSymptomRequest,
+    gemini: ClientProvider = Depends(get_gemini_provider),
+    tenant: str = Depends(get_tenant),
+):
+    """
+    Triage many patients in one call; only cases the local rules cannot
+    settle are sent to Gemini, with bounded concurrency
+    """
+    triage = get_default_engine().evaluate_batch([patient.symptoms for patient in request.patients])
+    results: List[Optional[BatchAnalysisItem]] = [None] * len(request.patients)
+    pending = []
+    for index, result in enumerate(triage):
+        local = build_local_analysis(result)
+        TRIAGE_DECISIONS.inc(source="rules" if local else "gemini")
+        if local is not None:
+            results[index] = BatchAnalysisItem(source="rules", analysis=HealthAnalysisResponse(**local))
+        else:
+            pending.append(index)
+
+    async def analyze(index: int) -> HealthAnalysisResponse:
+        patient = request.patients[index]
+        async with admission.slot(tenant, _priority(triage[index])):
+            gemini_client = await gemini.get()
+            return await gemini_client.analyze_symptoms(patient.symptoms, patient.context)
+
+    def fallback(index: int, error: UpstreamError) -> BatchAnalysisItem:
+        try:
+            analysis = _fallback_analysis(triage[index], error)
+        except UpstreamError:
+            return BatchAnalysisItem(source="gemini", error=str(error))
+        return BatchAnalysisItem(source="fallback", analysis=analysis)
+
+    analyses = await bounded_gather(
+        [lambda index=index: analyze(index) for index in pending],
+        limit=BATCH_CONCURRENCY,
+        return_exceptions=True,
+    )
+    for index, analysis in zip(pending, analyses):
+        if isinstance(analysis, UpstreamError):
+            results[index] = fallback(index, analysis)
+        elif isinstance(analysis, Exception):
+            results[index] = BatchAnalysisItem(source="gemini", error=str(analysis))
+        else:
+            results[index] = BatchAnalysisItem(source="gemini", analysis=analysis)
+
+    summary = summarize_batch(
+        [item.analysis.urgency_level if item.analysis else None for item in results],
+        [item.source for item in results],
+    )
+    return BatchAnalysisResponse(results=results, summary=summary)
 
 @app.post("/api/generate_followup")
-async def generate_followup(request: FollowUpRequest):
+async def generate_followup(
+    request: FollowUpRequest,
+    gemini: ClientProvider = Depends(get_gemini_provider),
+    tenant: str = Depends(get_tenant),
+):
     """
     Generate follow-up questions based on conversation history
     """
+    async with admission.slot(tenant, ROUTINE):
+        try:
+            gemini_client = await gemini.get()
+            questions = await gemini_client.generate_follow_up(
+                [message.model_dump() for message in request.conversation_history]
+            )
+            return {"questions": questions}
+        except UpstreamError as e:
+            raise _upstream_http_error(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/sessions")
+async def create_session(request: Optional[SessionRequest] = None, sessions=Depends(get_session_store)):
+    """
+    Start a server-side chat session; later turns send only the new message
+    """
+    session = Session(context=request.context if request else None)
+    await sessions.aput(session)
+    return {"session_id": session.id}
+
+@app.put("/api/sessions/{session_id}/context")
+async def update_session_context(session_id: str, request: SessionContextRequest, sessions=Depends(get_session_store)):
+    """
+    Replace the fitness context used for the session's analyses
+    """
+    session = await _get_session(session_id, sessions)
+    session.context = request.context
+    await sessions.aput(session)
+    return {"session_id": session.id}
+
+@app.post("/api/sessions/{session_id}/followup")
+async def session_followup(
+    session_id: str,
+    message: ConversationMessage,
+    gemini: ClientProvider = Depends(get_gemini_provider),
+    tenant: str = Depends(get_tenant),
+    sessions=Depends(get_session_store),
+):
+    """
+    Add a turn to the session and generate follow-up questions from its
+    stored history and rolling summary
+    """
+    session = await _get_session(session_id, sessions)
+    session.add_turn(message.model_dump(), SESSION_MAX_TURNS)
+    await sessions.aput(session)
+    async with admission.slot(tenant, ROUTINE):
+        try:
+            gemini_client = await gemini.get()
+            questions = await gemini_client.generate_follow_up(session.history, session.summary)
+            return {"questions": questions}
+        except UpstreamError as e:
+            raise _upstream_http_error(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+def _analysis_text(analysis: HealthAnalysisResponse) -> str:
+    """Condense an analysis into the assistant message kept in session history"""
+    return (
+        f"Urgency Level: {analysis.urgency_level}\n"
+        f"Assessment: {analysis.initial_assessment}\n"
+        f"Recommended Actions: {'; '.join(analysis.recommended_actions)}"
+    )
+
+async def _resolved(value):
+    return value
+
+async def _turn_analysis(message: str, triage: Dict, context: Optional[Dict], gemini_client) -> tuple:
+    try:
+        return await gemini_client.analyze_symptoms([message], context), "gemini"
+    except UpstreamError as e:
+        return _fallback_analysis(triage, e), "fallback"
+
+async def _turn_questions(message: str, session: Session, gemini_client) -> tuple:
+    # Asked from the history plus the new message, so it runs alongside the
+    # analysis instead of waiting for the assistant's reply to it
+    pending = session.history + [{"user": message, "assistant": ""}]
+    try:
+        return await gemini_client.generate_follow_up(pending, session.summary), "gemini"
+    except UpstreamError:
+        return [ask_clarifying_questions(message)], "fallback"
+
+async def _rules_turn_questions(message: str, session: Session, gemini: ClientProvider, tenant: str, priority: int) -> tuple:
+    # The rules already answered the analysis, so shedding load or a client
+    # that cannot be built costs only the Gemini questions, never the answer
     try:
-        questions = await gemini_client.generate_follow_up(request.conversation_history)
-        return {"questions": questions}
+        async with admission.slot(tenant, priority):
+            gemini_client = await gemini.get()
+            return await _turn_questions(message, session, gemini_client)
+    except AdmissionRejected:
+        pass
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        print(f"Error generating follow-up questions: {str(e)}")
+    return [ask_clarifying_questions(message)], "fallback"
+
+@app.post("/api/sessions/{session_id}/turn", response_model=TurnResponse)
+async def session_turn(
+    session_id: str,
+    request: TurnRequest,
+    gemini: ClientProvider = Depends(get_gemini_provider),
+    tenant: str = Depends(get_tenant),
+    sessions=Depends(get_session_store),
+):
+    """
+    Handle one chat message: analyze it and generate follow-up questions in
+    a single round trip, then add the turn to the session
+
+    The local triage rules and clarifying-question table answer what they
+    can; whatever is left goes to Gemini, with both calls issued at once.
+    An analysis the rules settle is returned even when Gemini is shed or
+    unavailable; only its questions then fall back to the local table.
+    """
+    session = await _get_session(session_id, sessions)
+    triage = get_default_engine().evaluate([request.message])
+    analysis = _local_analysis(triage)
+    questions = local_clarifying_questions([request.message])
+
+    if analysis is not None and questions is not None:
+        sources = {"analysis": "rules", "questions": "rules"}
+    elif analysis is not None:
+        questions, questions_source = await _rules_turn_questions(
+            request.message, session, gemini, tenant, _priority(triage)
+        )
+        sources = {"analysis": "rules", "questions": questions_source}
+    else:
+        async with admission.slot(tenant, _priority(triage)):
+            try:
+                gemini_client = await gemini.get()
+                (analysis, analysis_source), (questions, questions_source) = await asyncio.gather(
+                    _turn_analysis(request.message, triage, session.context, gemini_client),
+                    _turn_questions(request.message, session, gemini_client)
+                    if questions is None else _resolved((questions, "rules")),
+                )
+            except UpstreamError as e:
+                raise _upstream_http_error(e)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+        sources = {"analysis": analysis_source, "questions": questions_source}
+
+    FOLLOW_UP_DECISIONS.inc(source=sources["questions"])
+    session.add_turn(
+        {"user": request.message, "assistant": _analysis_text(analysis), "questions": questions}, SESSION_MAX_TURNS
+    )
+    await sessions.aput(session)
+    return TurnResponse(analysis=analysis, questions=questions, sources=sources)
+
+async def _emit_analysis(analysis: HealthAnalysisResponse, outbox: Outbox):
+    data = analysis.model_dump()
+    for name, value in data.items():
+        await outbox.put({"event": "field", "name": name, "value": value})
+    await outbox.put({"event": "result", "data": data})
+
+async def _stream_turn_analysis(message: str, triage: Dict, context: Optional[Dict], gemini_client, outbox: Outbox) -> tuple:
+    analysis, streaming = None, False
+    try:
+        async for event in gemini_client.stream_analysis([message], context):
+            streaming = True
+            if event["event"] == "result":
+                analysis = HealthAnalysisResponse(**event["data"])
+            # Raw text deltas are repeated by the field and result events, so
+            # they are the part a slow client can go without
+            if event["event"] == "delta":
+                if not outbox.offer(event):
+                    CHAT_DROPPED.inc()
+            else:
+                await outbox.put(event)
+        return analysis, "gemini"
+    except UpstreamError as e:
+        # Only fall back if nothing from Gemini reached the client yet
+        if streaming:
+            raise
+        analysis = _fallback_analysis(triage, e)
+        await _emit_analysis(analysis, outbox)
+        return analysis, "fallback"
+
+async def _emit_questions(pending, outbox: Outbox) -> tuple:
+    questions, source = await pending
+    await outbox.put({"event": "questions", "questions": questions, "source": source})
+    return questions, source
+
+async def _chat_turn(message: str, session: Session, sessions, gemini: ClientProvider, tenant: str, outbox: Outbox) -> Dict:
+    """Answer one chat message over the socket, streaming the analysis, and
+    record the turn; returns who answered each part"""
+    triage = get_default_engine().evaluate([message])
+    analysis = _local_analysis(triage)
+    questions = local_clarifying_questions([message])
+
+    if analysis is not None and questions is not None:
+        await _emit_analysis(analysis, outbox)
+        await outbox.put({"event": "questions", "questions": questions, "source": "rules"})
+        sources = {"analysis": "rules", "questions": "rules"}
+    elif analysis is not None:
+        await _emit_analysis(analysis, outbox)
+        questions, questions_source = await _emit_questions(
+            _rules_turn_questions(message, session, gemini, tenant, _priority(triage)), outbox
+        )
+        sources = {"analysis": "rules", "questions": questions_source}
+    else:
+        async with admission.slot(tenant, _priority(triage)):
+            gemini_client = await gemini.get()
+            asking = asyncio.ensure_future(_emit_questions(
+                _turn_questions(message, session, gemini_client)
+                if questions is None else _resolved((questions, "rules")),
+                outbox,
+            ))
+            try:
+                analysis, analysis_source = await _stream_turn_analysis(
+                    message, triage, session.context, gemini_client, outbox
+                )
+                questions, questions_source = await asking
+            finally:
+                # A failed analysis ends the turn with an error; its questions must not follow it
+                asking.cancel()
+        sources = {"analysis": analysis_source, "questions": questions_source}
+
+    FOLLOW_UP_DECISIONS.inc(source=sources["questions"])
+    session.add_turn(
+        {"user": message, "assistant": _analysis_text(analysis), "questions": questions}, SESSION_MAX_TURNS
+    )
+    await sessions.aput(session)
+    return sources
+
+@app.websocket("/api/chat")
+async def chat_socket(
+    websocket: WebSocket,
+    session_id: Optional[str] = None,
+    gemini: ClientProvider = Depends(get_gemini_provider),
+    google_fit: ClientProvider = Depends(get_google_fit_provider),
+    sessions=Depends(get_session_store),
+):
+    """
+    Carry a whole conversation over one WebSocket
+
+    The client sends {"type": "turn", "message": ..., "input": "text" or
+    "voice"} per message and {"type": "ping"} to keep intermediaries from
+    dropping the connection; a chat without turns is still closed after
+    CHAT_IDLE_TIMEOUT. The server
+    pushes "session" once, then per turn "turn_start", the streamed analysis
+    ("delta", "field", "result"), "questions" and "turn_end", plus "health"
+    whenever the health summary changes. Turns are answered one at a time
+    in order; a connection costs a few small tasks and a bounded send queue,
+    so one worker can hold thousands of idle chats.
+    """
+    await websocket.accept()
+    if session_id is None:
+        session = Session()
+        await sessions.aput(session)
+    else:
+        session = await sessions.aget(session_id)
+        if session is None:
+            await websocket.send_json({"event": "error", "detail": "Session not found or expired"})
+            await websocket.close(code=4404)
+            return
+
+    tenant = get_tenant(websocket)
+    outbox = Outbox(CHAT_SEND_QUEUE, CHAT_SEND_TIMEOUT)
+    turns: asyncio.Queue = asyncio.Queue(CHAT_MAX_PENDING_TURNS)
+    busy = False
+
+    async def sender():
+        while True:
+            await websocket.send_text(json.dumps(await outbox.get()))
+
+    async def receiver() -> str:
+        # Only turns count as activity: an open tab's pings keep the
+        # connection up through proxies but not past the idle timeout
+        loop = asyncio.get_running_loop()
+        idle_at = loop.time() + CHAT_IDLE_TIMEOUT
+        while True:
+            try:
+                text = await asyncio.wait_for(websocket.receive_text(), max(idle_at - loop.time(), 0))
+            except asyncio.TimeoutError:
+                if busy or not turns.empty():
+                    idle_at = loop.time() + CHAT_IDLE_TIMEOUT
+                    continue
+                return "idle"
+            try:
+                data = json.loads(text)
+                kind = data.get("type")
+            except (ValueError, AttributeError):
+                outbox.offer({"event": "error", "detail": "Messages must be JSON objects"})
+                continue
+            if kind == "ping":
+                outbox.offer({"event": "pong"})
+            elif kind == "turn" and str(data.get("message") or "").strip():
+                idle_at = loop.time() + CHAT_IDLE_TIMEOUT
+                try:
+                    turns.put_nowait(data)
+                except asyncio.QueueFull:
+                    outbox.offer({"event": "error", "id": data.get("id"), "detail": "Too many turns waiting; try again shortly"})
+            else:
+                outbox.offer({"event": "error", "detail": "Expected a ping or a turn with a message"})
+
+    async def processor():
+        nonlocal busy
+        while True:
+            data = await turns.get()
+            busy = True
+            turn_id, input_type = data.get("id"), "voice" if data.get("input") == "voice" else "text"
+            CHAT_TURNS.inc(input=input_type)
+            await outbox.put({"event": "turn_start", "id": turn_id})
+            try:
+                sources = await _chat_turn(str(data["message"]).strip(), session, sessions, gemini, tenant, outbox)
+                await outbox.put({"event": "turn_end", "id": turn_id, "sources": sources})
+            except SlowConsumer:
+                raise
+            except AdmissionRejected as e:
+                await outbox.put({"event": "error", "id": turn_id, "status": e.status_code, "retry_after": e.retry_after, "detail": str(e)})
+            except Exception as e:
+                await outbox.put({"event": "error", "id": turn_id, "detail": str(e)})
+            finally:
+                busy = False
+
+    async def health():
+        last = None
+        while True:
+            try:
+                google_fit_client = await google_fit.get()
+                summary = await google_fit_client.get_health_summary(CHAT_HEALTH_DAYS)
+            except Exception as e:
+                print(f"Error refreshing chat health data: {str(e)}")
+            else:
+                # Only changes are pushed; the summary also becomes the session's analysis context
+                if summary and summary != last:
+                    last = summary
+                    session.context = {**(session.context or {}), "fitness": summary}
+                    await sessions.aput(session)
+                    await outbox.put({"event": "health", "summary": summary})
+            await asyncio.sleep(CHAT_HEALTH_REFRESH)
+
+    await websocket.send_json({"event": "session", "session_id": session.id})
+    CHAT_CONNECTIONS.inc()
+    tasks = [asyncio.ensure_future(receiver()), asyncio.ensure_future(sender()), asyncio.ensure_future(processor())]
+    if CHAT_HEALTH_REFRESH > 0:
+        tasks.append(asyncio.ensure_future(health()))
+    reason = "client"
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        task = done.pop()
+        error = task.exception()
+        if isinstance(error, SlowConsumer):
+            reason = "slow_consumer"
+            await websocket.close(code=1008, reason="Client is not reading messages")
+        elif error is None and task.result() == "idle":
+            reason = "idle"
+            await websocket.close(code=1000, reason="Idle timeout")
+        elif error is not None and not isinstance(error, WebSocketDisconnect):
+            reason = "error"
+            print(f"Error in chat connection: {str(error)}")
+            await websocket.close(code=1011)
+    except (WebSocketDisconnect, RuntimeError):
+        # The client went away while we were closing
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        CHAT_CONNECTIONS.dec()
+        CHAT_CLOSES.inc(reason=reason)
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str, sessions=Depends(get_session_store)):
+    """
+    Forget a session and its history
+    """
+    await sessions.adelete(session_id)
+    return {"deleted": True}
 
 @app.get("/api/health_data/{days}")
-async def get_health_data(days: int = 7):
+async def get_health_data(days: int = 7, google_fit: ClientProvider = Depends(get_google_fit_provider)):
     """
     Get user's health data from Google Fit
     """
     try:
-        activity_data = await google_fit_client.get_activity_data(days)
-        sleep_data = await google_fit_client.get_sleep_data(days)
-        
-        # Merge activity and sleep data by date
+        google_fit_client = await google_fit.get()
+
+        # Each Fit call runs on the client's thread pool, so they proceed in parallel
+        results = await asyncio.gather(
+            google_fit_client.get_activity_data(days),
+            google_fit_client.get_heart_rate_data(days),
+            google_fit_client.get_sleep_data(days),
+        )
+
+        # Merge activity, heart rate and sleep data by date
         health_data = {}
-        for data in activity_data:
-            health_data[data.date] = data.dict()
-            
-        for data in sleep_data:
-            if data.date in health_data:
-                health_data[data.date].update(data.dict())
-            else:
-                health_data[data.date] = data.dict()
-                
+        for records in results:
+            for data in records:
+                merged = health_data.setdefault(data.date, FitnessData(date=data.date).model_dump())
+                merged.update(data.model_dump(exclude_none=True))
+
         return {"health_data": list(health_data.values())}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/health_summary/{days}")
+async def get_health_summary(days: int = 7, google_fit: ClientProvider = Depends(get_google_fit_provider)):
+    """
+    Summarize today's intraday Fit data (resting heart rate, variability,
+    steps, sleep stages) against the previous days, compact enough to send as
+    analysis context
+    """
+    try:
+        google_fit_client = await google_fit.get()
+        return {"summary": await google_fit_client.get_health_summary(days)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # WEB_CONCURRENCY > 1 runs that many worker processes, one core each
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    configure_workers(workers)
+    if workers > 1:
+        uvicorn.run("src.app:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
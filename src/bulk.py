@@ -0,0 +1,412 @@
+"""Replay archived conversations through the triage pipeline in bulk.
+
+Reads a JSONL file one line at a time and runs every record through the
+same path as /api/analyze_symptoms: the local triage rules answer decisive
+cases, the rest go to Gemini, and Gemini failures fall back to the rules.
+Results are written in input order to JSONL, or to Parquet part files when
+the output ends in ``.parquet`` (needs pyarrow).
+
+    python -m src.bulk archive.jsonl results.jsonl --concurrency 16 --rate 20
+
+A record needs "symptoms" (a list or a string), or free text in "message",
+"text" or "body"; "context" and "id" (or "request_id") are optional.
+
+Progress is checkpointed next to the output after every flush, so an
+interrupted run picks up where it stopped when started again with the same
+arguments (--restart starts over). --dry-run serves Gemini from a local
+stand-in instead of the real API, and --api-base points at any other one.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.triage import build_fallback_analysis, build_local_analysis, get_default_engine
+from src.utils.admission import TokenBucket
+from src.utils.resilience import UpstreamError
+
+TEXT_FIELDS = ("message", "text", "body")
+
+
+def read_records(path: str, offset: int = 0, line: int = 0) -> Iterator[Tuple[int, int, object]]:
+    """Yield (line number, byte offset after the line, record) from ``offset`` on
+
+    The file is read lazily. Blank lines are skipped; a line that is not
+    valid JSON yields the ValueError in place of the record.
+    """
+    with open(path, "rb") as source:
+        source.seek(offset)
+        for raw in source:
+            offset += len(raw)
+            line += 1
+            if not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+            except ValueError as e:
+                record = e
+            yield line, offset, record
+
+
+def record_input(record: Dict, line: int) -> Tuple[str, List[str], Optional[Dict]]:
+    """Return (id, symptoms, context) for an archived record"""
+    if not isinstance(record, dict):
+        raise ValueError("record is not a JSON object")
+    symptoms = record.get("symptoms")
+    if symptoms is None:
+        text = next((record[field] for field in TEXT_FIELDS if record.get(field)), None)
+        symptoms = [text] if text else None
+    if isinstance(symptoms, str):
+        symptoms = [symptoms]
+    if not symptoms:
+        raise ValueError("record has no symptoms, message, text or body")
+    context = record.get("context")
+    return str(record.get("id", record.get("request_id", line))), [str(symptom) for symptom in symptoms], context
+
+
+class JsonlResultWriter:
+    """Append result rows to a JSONL file; the file size is the checkpoint"""
+
+    def __init__(self, path: str, state: Optional[Dict] = None):
+        self.path = path
+        self._file = open(path, "ab")
+        # Drop rows written after the last checkpoint, they are redone on resume
+        self._file.truncate(state["output_size"] if state else 0)
+        self._file.seek(0, os.SEEK_END)
+
+    def write(self, rows: List[Dict]) -> Dict:
+        self._file.write(b"".join(json.dumps(row).encode() + b"\n" for row in rows))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"output_size": self._file.tell()}
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """Write each flush of result rows as a numbered Parquet part file
+
+    Parquet files cannot be appended to, so ``results.parquet`` becomes
+    ``results-00000.parquet``, ``results-00001.parquet`` and so on; the part
+    count is the checkpoint. Nested values are stored as JSON strings.
+    """
+
+    def __init__(self, path: str, state: Optional[Dict] = None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("Parquet output needs the pyarrow package") from e
+        self._pyarrow = pyarrow
+        self._parquet = pyarrow.parquet
+        self.stem = path[:-len(".parquet")]
+        self.parts = state["parts"] if state else 0
+        # Remove parts written after the last checkpoint
+        stale = self.parts
+        while os.path.exists(self._part_path(stale)):
+            os.remove(self._part_path(stale))
+            stale += 1
+
+    def _part_path(self, part: int) -> str:
+        return f"{self.stem}-{part:05d}.parquet"
+
+    def write(self, rows: List[Dict]) -> Dict:
+        columns = {
+            name: [json.dumps(row[name]) if isinstance(row[name], (dict, list)) else row[name] for row in rows]
+            for name in rows[0]
+        }
+        self._parquet.write_table(self._pyarrow.table(columns), self._part_path(self.parts))
+        self.parts += 1
+        return {"parts": self.parts}
+
+    def close(self):
+        pass
+
+
+def create_writer(path: str, state: Optional[Dict] = None):
+    if path.endswith(".parquet"):
+        return ParquetResultWriter(path, state)
+    return JsonlResultWriter(path, state)
+
+
+def load_checkpoint(path: str, input_path: str) -> Optional[Dict]:
+    """Return the saved state for ``input_path``, or None to start from the beginning"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as checkpoint:
+        state = json.load(checkpoint)
+    if state.get("input") != os.path.abspath(input_path):
+        raise ValueError(f"checkpoint {path} belongs to {state.get('input')}; use --restart to overwrite it")
+    return state
+
+
+def save_checkpoint(path: str, state: Dict):
+    # Write then rename, so a crash never leaves a partial checkpoint
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as checkpoint:
+        json.dump(state, checkpoint)
+    os.replace(tmp, path)
+
+
+class LatencyReservoir:
+    """Uniform sample of at most ``size`` latencies, for percentiles over runs of any length
+
+    Percentiles are exact until ``size`` values have been seen; after that
+    each new value replaces a random slot with probability size / seen.
+    """
+
+    def __init__(self, size: int = 10_000, seed: Optional[int] = None):
+        self.samples = np.empty(size, dtype=np.float64)
+        self.seen = 0
+        self.random = random.Random(seed)
+
+    def add(self, value: float):
+        if self.seen < len(self.samples):
+            self.samples[self.seen] = value
+        else:
+            slot = self.random.randrange(self.seen + 1)
+            if slot < len(self.samples):
+                self.samples[slot] = value
+        self.seen += 1
+
+    def percentiles(self, qs: List[float]) -> List[float]:
+        if not self.seen:
+            return [0.0] * len(qs)
+        return np.percentile(self.samples[:min(self.seen, len(self.samples))], qs).tolist()
+
+
+class BulkRunner:
+    """Run records through triage and Gemini with a bounded pool of workers
+
+    ``concurrency`` workers take records from a bounded queue, so at most a
+    few records are read ahead of the slowest one in flight. Gemini calls
+    are spaced to ``rate`` per second (0 for no limit); rule-answered
+    records are not. Rows are written in input order, which lets a single
+    byte offset into the input serve as the resume point.
+    """
+
+    def __init__(self, gemini_client=None, concurrency: int = 8, rate: float = 0.0,
+                 flush_every: int = 100, progress_every: float = 10.0, fallback: bool = True,
+                 timer=time.monotonic, log=None):
+        self.gemini_client = gemini_client
+        self.concurrency = concurrency
+        self.rate = rate
+        self.flush_every = flush_every
+        self.progress_every = progress_every
+        self.fallback = fallback
+        self.timer = timer
+        self.log = log or (lambda message: print(message, file=sys.stderr))
+        self.engine = get_default_engine()
+        self.sources = Counter()
+        self.latencies = LatencyReservoir()
+        self._bucket = TokenBucket(rate, 1.0, timer()) if rate > 0 else None
+
+    async def _throttle(self):
+        if self._bucket is None:
+            return
+        while True:
+            delay = self._bucket.take(self.timer())
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def process(self, line: int, record) -> Dict:
+        """Triage one record; failures become an error row instead of stopping the run"""
+        row = {"id": str(line), "line": line, "source": "error", "urgency_level": None, "analysis": None, "error": None, "latency_ms": 0.0}
+        started = self.timer()
+        try:
+            if isinstance(record, ValueError):
+                raise ValueError(f"invalid JSON: {record}")
+            row["id"], symptoms, context = record_input(record, line)
+            triage = self.engine.evaluate(symptoms)
+            analysis, source = build_local_analysis(triage), "rules"
+            if analysis is None:
+                if self.gemini_client is None:
+                    raise ValueError("the triage rules are not decisive and no Gemini client is configured")
+                await self._throttle()
+                try:
+                    analysis, source = (await self.gemini_client.analyze_symptoms(symptoms, context)).model_dump(), "gemini"
+                except UpstreamError:
+                    if not self.fallback:
+                        raise
+                    analysis, source = build_fallback_analysis(triage), "fallback"
+            row.update(source=source, urgency_level=analysis["urgency_level"], analysis=analysis)
+        except Exception as e:
+            row["error"] = str(e) or type(e).__name__
+        row["latency_ms"] = (self.timer() - started) * 1000
+        return row
+
+    async def run(self, input_path: str, writer, checkpoint_path: Optional[str] = None,
+                  state: Optional[Dict] = None, limit: Optional[int] = None) -> Dict:
+        """Process ``input_path`` from ``state`` on and return the run's report
+
+        Args:
+            input_path: JSONL archive to read.
+            writer: A JsonlResultWriter or ParquetResultWriter.
+            checkpoint_path: Where to save progress after each flush, if anywhere.
+            state: A checkpoint to resume from.
+            limit: Stop after this many records (for sampling an archive).
+        """
+        state = dict(state or {"input": os.path.abspath(input_path), "offset": 0, "line": 0, "processed": 0})
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        # Bounds rows waiting on a slow earlier record before they can be written
+        window = asyncio.Semaphore(self.concurrency * 4)
+        done: Dict[int, Tuple[int, int, Dict]] = {}
+        buffer: List[Dict] = []
+        next_seq = 0
+        started = last_report = self.timer()
+        processed = 0
+
+        def flush():
+            if buffer:
+                state.update(writer.write(buffer))
+                buffer.clear()
+                if checkpoint_path:
+                    save_checkpoint(checkpoint_path, state)
+
+        def complete(seq: int, line: int, offset: int, row: Dict):
+            nonlocal next_seq, processed, last_report
+            done[seq] = (line, offset, row)
+            while next_seq in done:
+                line, offset, row = done.pop(next_seq)
+                next_seq += 1
+                processed += 1
+                buffer.append(row)
+                state.update(offset=offset, line=line, processed=state["processed"] + 1)
+                self.sources[row["source"]] += 1
+                self.latencies.add(row["latency_ms"])
+                window.release()
+                if len(buffer) >= self.flush_every:
+                    flush()
+            now = self.timer()
+            if self.progress_every and now - last_report >= self.progress_every:
+                last_report = now
+                self.log(f"{processed} records, {processed / (now - started):.1f}/s, {dict(self.sources)}")
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                seq, line, offset, record = item
+                complete(seq, line, offset, await self.process(line, record))
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            records = read_records(input_path, state["offset"], state["line"])
+            for seq, (line, offset, record) in enumerate(records):
+                if limit is not None and seq >= limit:
+                    break
+                await window.acquire()
+                await queue.put((seq, line, offset, record))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            # Whatever was written in order is kept, so an interrupted run resumes after it
+            flush()
+
+        elapsed = self.timer() - started
+        p50, p95, p99 = self.latencies.percentiles([50, 95, 99])
+        return {
+            "records": processed,
+            "total_processed": state["processed"],
+            "elapsed_s": elapsed,
+            "records_per_second": processed / elapsed if elapsed else 0.0,
+            "sources": dict(self.sources),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+        }
+
+
+async def run_bulk(args) -> Dict:
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    state = load_checkpoint(checkpoint_path, args.input)
+    if state:
+        print(f"Resuming after line {state['line']} ({state['processed']} records done)", file=sys.stderr)
+
+    fake_gemini = gemini_client = None
+    if args.dry_run:
+        from src.utils.fake_gemini import FakeGeminiServer
+
+        fake_gemini = FakeGeminiServer(latency=args.dry_run_latency, jitter=0.0)
+        await fake_gemini.start()
+        os.environ.setdefault("GOOGLE_API_KEY", "dry-run")
+        args.api_base = fake_gemini.api_base
+    if args.api_base:
+        os.environ["GEMINI_API_BASE"] = args.api_base
+    writer = create_writer(args.output, state)
+    try:
+        if not args.rules_only:
+            from src.api.gemini import GeminiClient
+
+            gemini_client = GeminiClient()
+            await gemini_client.start()
+        runner = BulkRunner(
+            gemini_client,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            flush_every=args.flush_every,
+            progress_every=args.progress_every,
+            fallback=not args.no_fallback,
+        )
+        return await runner.run(args.input, writer, checkpoint_path, state, args.limit)
+    finally:
+        writer.close()
+        if gemini_client is not None:
+            await gemini_client.close()
+        if fake_gemini is not None:
+            await fake_gemini.stop()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run archived conversations through the triage pipeline")
+    parser.add_argument("input", help="JSONL archive to replay")
+    parser.add_argument("output", help="results file, .jsonl or .parquet")
+    parser.add_argument("--concurrency", type=int, default=8, help="records processed at once")
+    parser.add_argument("--rate", type=float, default=0.0, help="maximum Gemini calls per second (0 for no limit)")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many records")
+    parser.add_argument("--flush-every", type=int, default=100, help="records per output flush and checkpoint")
+    parser.add_argument("--progress-every", type=float, default=10.0, help="seconds between progress lines (0 for none)")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: OUTPUT.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    parser.add_argument("--rules-only", action="store_true", help="never call Gemini; undecided records become errors")
+    parser.add_argument("--no-fallback", action="store_true", help="record Gemini failures as errors instead of falling back to the rules")
+    parser.add_argument("--api-base", help="Gemini API base URL, e.g. a local stand-in")
+    parser.add_argument("--dry-run", action="store_true", help="answer Gemini calls from a local stand-in server")
+    parser.add_argument("--dry-run-latency", type=float, default=0.05, help="stand-in response latency in seconds")
+    parser.add_argument("--json", dest="json_path", help="write the run report to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        report = asyncio.run(run_bulk(args))
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error running bulk triage: {str(e)}", file=sys.stderr)
+        return 1
+    print(f"{report['records']} records in {report['elapsed_s']:.1f} s ({report['records_per_second']:.1f}/s), "
+          f"{report['total_processed']} in total; sources {report['sources']}")
+    print(f"latency p50 {report['p50_ms']:.1f} ms, p95 {report['p95_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms")
+    if args.json_path:
+        with open(args.json_path, "w") as output:
+            json.dump(report, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,81 @@
+import numpy as np
+
+from src.models.symptom import SymptomBatch
+
+
+# Upper severity bound (exclusive) for each lifestyle suggestion bucket
+SUGGESTION_BUCKETS = (
+    (3, "Maintain a healthy lifestyle and stay hydrated."),
+    (6, "Consider rest and monitor your symptoms."),
+    (None, "Seek medical attention if symptoms persist."),
+)
+
+
 def perform_analysis(symptoms):
     """
     Perform preliminary analysis based on user input symptoms.
-    
+
     Args:
-        symptoms (list): A list of symptom objects containing details.
-    
+        symptoms (list or SymptomBatch): Symptom objects, or a columnar
+            SymptomBatch for large record sets.
+
     Returns:
         dict: A dictionary containing analysis results and lifestyle suggestions.
     """
+    batch = symptoms if isinstance(symptoms, SymptomBatch) else SymptomBatch.from_symptoms(symptoms)
+    if not len(batch):
+        raise ValueError("perform_analysis requires at least one symptom")
+
     analysis_results = {}
-    
-    # Example analysis logic (to be expanded)
-    severity_levels = [symptom.severity for symptom in symptoms]
-    average_severity = sum(severity_levels) / len(severity_levels)
-    
+    severity = batch.severity.astype(np.float64)
+    average_severity = float(severity.mean())
+
     analysis_results['average_severity'] = average_severity
-    
+    p50, p90, p99 = np.percentile(severity, [50, 90, 99]).tolist()
+    analysis_results['severity_percentiles'] = {'p50': p50, 'p90': p90, 'p99': p99}
+
+    # Per-record suggestion buckets, counted in one pass
+    bounds = [bound for bound, _ in SUGGESTION_BUCKETS if bound is not None]
+    bucket_counts = np.bincount(np.digitize(severity, bounds), minlength=len(SUGGESTION_BUCKETS))
+    analysis_results['suggestion_buckets'] = {
+        suggestion: int(count) for (_, suggestion), count in zip(SUGGESTION_BUCKETS, bucket_counts)
+    }
+
+    # Mean severity per distinct symptom name
+    name_counts = np.bincount(batch.name_ids, minlength=len(batch.names))
+    name_totals = np.bincount(batch.name_ids, weights=severity, minlength=len(batch.names))
+    analysis_results['severity_by_symptom'] = {
+        name: total / count
+        for name, total, count in zip(batch.names, name_totals.tolist(), name_counts.tolist())
+        if count
+    }
+
     # Lifestyle suggestions based on average severity
-    if average_severity < 3:
-        analysis_results['suggestions'] = "Maintain a healthy lifestyle and stay hydrated."
-    elif average_severity < 6:
-        analysis_results['suggestions'] = "Consider rest and monitor your symptoms."
-    else:
-        analysis_results['suggestions'] = "Seek medical attention if symptoms persist."
-    
-    return analysis_results
\ No newline at end of file
+    bucket = int(np.digitize(average_severity, bounds))
+    analysis_results['suggestions'] = SUGGESTION_BUCKETS[bucket][1]
+
+    return analysis_results
+
+
+def summarize_batch(urgency_levels, sources):
+    """
+    Summarize the outcome of a batch triage run.
+
+    Args:
+        urgency_levels (list): Final urgency level per patient, or None on failure.
+        sources (list): Where each result came from ("rules" or "gemini").
+
+    Returns:
+        dict: Patient counts per urgency level and per source.
+    """
+    levels, level_counts = np.unique(
+        np.array([level or "UNRESOLVED" for level in urgency_levels], dtype=str),
+        return_counts=True,
+    )
+    origins, origin_counts = np.unique(np.array(sources, dtype=str), return_counts=True)
+
+    return {
+        "total": len(urgency_levels),
+        "by_urgency": dict(zip(levels.tolist(), level_counts.tolist())),
+        "by_source": dict(zip(origins.tolist(), origin_counts.tolist())),
+    }
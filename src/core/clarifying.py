@@ -0,0 +1,344 @@
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_KNOWLEDGE_BASE = os.path.join(os.path.dirname(__file__), "data", "clarifying_questions.json")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Words that carry no symptom meaning; dropped from phrases and queries alike
+_STOPWORDS = frozenset([
+    "a", "an", "and", "the", "my", "i", "im", "me", "is", "am", "are", "was", "it", "its", "of", "in", "on",
+    "at", "to", "with", "have", "has", "had", "got", "been", "since", "this", "that", "very", "really",
+    "bad", "some", "bit", "little", "lot", "feel", "feels", "feeling", "like", "for", "from", "all",
+    "but", "also", "again", "today", "yesterday", "morning", "night", "tonight",
+])
+# The token after one of these is not a symptom the user has ("no fever")
+_NEGATIONS = frozenset(["no", "not", "without", "denies", "never"])
+
+# Cap on memoized fuzzy expansions of query tokens
+_EXPANSION_CACHE_SIZE = 10000
+
+
+def tokenize(text):
+    """
+    Split text into lowercase content tokens.
+
+    Apostrophes are dropped first, so "can't" and "cant" are the same token.
+
+    Args:
+        text (str): Free text.
+
+    Returns:
+        list: Tokens in order, without stopwords.
+    """
+    return [token for token in _TOKEN.findall(text.lower().replace("'", "")) if token not in _STOPWORDS]
+
+
+def _trigrams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def expand_knowledge_base(data):
+    """
+    Expand a knowledge base document into flat entries.
+
+    Explicit ``symptoms`` come first, then every ``templates`` entry is
+    instantiated once per body site, with "{site}" replaced by the site and,
+    for synonyms, by each of its aliases.
+
+    Args:
+        data (dict): Parsed knowledge base with "symptoms", "sites" and "templates".
+
+    Returns:
+        list: Entries with "symptom", "synonyms" and "questions".
+    """
+    entries = [dict(entry) for entry in data.get("symptoms", [])]
+    for template in data.get("templates", []):
+        for site, aliases in data.get("sites", {}).items():
+            names = [site, *aliases]
+            entries.append({
+                "symptom": template["symptom"].format(site=site),
+                "synonyms": [
+                    synonym.format(site=name)
+                    for synonym in [template["symptom"], *template.get("synonyms", [])]
+                    for name in names
+                ],
+                "questions": [question.format(site=site) for question in template["questions"]],
+            })
+    return entries
+
+
+class ClarifyingQuestionIndex:
+    """
+    Ranked fuzzy lookup from symptom text to clarifying questions.
+
+    Every symptom name and synonym becomes a phrase of content tokens. Tokens
+    map to the phrases containing them (an inverted index), and character
+    trigrams map to vocabulary tokens, so misspelled query tokens ("hedache")
+    are expanded to similar known ones before lookup. A phrase scores the
+    share of its tokens found in the query, weighted by match similarity.
+    """
+
+    def __init__(self, entries, min_coverage=0.6, min_similarity=0.6):
+        self.min_coverage = min_coverage
+        self.min_similarity = min_similarity
+        self.entries = []
+        self.vocabulary = {}
+        phrase_tokens, phrase_entries, seen = [], [], set()
+
+        for entry in entries:
+            entry_id = len(self.entries)
+            self.entries.append({"symptom": entry["symptom"], "questions": list(entry["questions"])})
+            for phrase in [entry["symptom"], *entry.get("synonyms", [])]:
+                tokens = tuple(dict.fromkeys(tokenize(phrase)))
+                # The first entry to claim a phrase keeps it
+                if not tokens or tokens in seen:
+                    continue
+                seen.add(tokens)
+                phrase_tokens.append([self.vocabulary.setdefault(token, len(self.vocabulary)) for token in tokens])
+                phrase_entries.append(entry_id)
+
+        self.phrase_tokens = [np.array(tokens, dtype=np.int32) for tokens in phrase_tokens]
+        self.phrase_entry = np.array(phrase_entries, dtype=np.int32)
+        self.phrase_length = np.array([len(tokens) for tokens in phrase_tokens], dtype=np.float32)
+
+        postings = [[] for _ in self.vocabulary]
+        for phrase_id, tokens in enumerate(phrase_tokens):
+            for token_id in tokens:
+                postings[token_id].append(phrase_id)
+        self.postings = [np.array(ids, dtype=np.int32) for ids in postings]
+
+        self.tokens = list(self.vocabulary)
+        # Phrases that are themselves negated ("no appetite", "not eating"):
+        # negation token -> ids of the tokens that can follow it
+        self.negated_starts = {}
+        for tokens in phrase_tokens:
+            if len(tokens) > 1 and self.tokens[tokens[0]] in _NEGATIONS:
+                self.negated_starts.setdefault(self.tokens[tokens[0]], set()).add(tokens[1])
+        self.token_trigrams = np.array([len(_trigrams(token)) for token in self.tokens], dtype=np.float32)
+        self.trigram_index = {}
+        for token_id, token in enumerate(self.tokens):
+            for trigram in _trigrams(token):
+                self.trigram_index.setdefault(trigram, []).append(token_id)
+        self._expansions = {}
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """
+        Compile an index from a JSON knowledge base file.
+
+        Args:
+            path (str): Path to the knowledge base.
+
+        Returns:
+            ClarifyingQuestionIndex: The compiled index.
+        """
+        with open(path) as knowledge_base:
+            return cls(expand_knowledge_base(json.load(knowledge_base)), **kwargs)
+
+    @property
+    def phrase_count(self):
+        return len(self.phrase_entry)
+
+    def _expand(self, token):
+        """Return [(token_id, similarity)] for a query token: itself if known, else near spellings"""
+        token_id = self.vocabulary.get(token)
+        if token_id is not None:
+            return [(token_id, 1.0)]
+        cached = self._expansions.get(token)
+        if cached is not None:
+            return cached
+        matches = []
+        if len(token) >= 4:
+            trigrams = _trigrams(token)
+            shared = {}
+            for trigram in trigrams:
+                for candidate in self.trigram_index.get(trigram, ()):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+            for candidate, count in shared.items():
+                # Dice coefficient over padded character trigrams
+                similarity = 2.0 * count / (len(trigrams) + self.token_trigrams[candidate])
+                if similarity >= self.min_similarity:
+                    matches.append((candidate, float(similarity)))
+        if len(self._expansions) >= _EXPANSION_CACHE_SIZE:
+            self._expansions.clear()
+        self._expansions[token] = matches
+        return matches
+
+    def _starts_negated_phrase(self, negation, following):
+        """Whether ``negation`` and the next content word in ``following`` begin a known phrase"""
+        starts = self.negated_starts.get(negation)
+        if not starts:
+            return False
+        word = next((word for word in following if word not in _STOPWORDS), None)
+        return word is not None and any(token_id in starts for token_id, _ in self._expand(word))
+
+    def lookup(self, text, limit=3, strict=False):
+        """
+        Find the symptoms best matching a piece of text.
+
+        Args:
+            text (str): Free-text symptom description.
+            limit (int): Maximum number of symptoms to return.
+            strict (bool): Return nothing unless the returned symptoms account
+                for every content word of the text, so "pain in my chest and
+                left arm" does not get only the arm pain questions.
+
+        Returns:
+            list: (entry, score) tuples, best first; score is in (0, 1].
+        """
+        best = {}
+        query_tokens = []
+        skip_next = False
+        words = _TOKEN.findall(text.lower().replace("'", ""))
+        for position, token in enumerate(words):
+            if token in _NEGATIONS:
+                # Kept only where it starts a negated phrase; otherwise it and
+                # the symptom it negates are skipped
+                skip_next = not self._starts_negated_phrase(token, words[position + 1:])
+                if skip_next:
+                    continue
+            elif skip_next or token in _STOPWORDS:
+                skip_next = skip_next and token in _STOPWORDS
+                continue
+            expansions = self._expand(token)
+            query_tokens.append({token_id for token_id, _ in expansions})
+            for token_id, similarity in expansions:
+                if similarity > best.get(token_id, 0.0):
+                    best[token_id] = similarity
+        if not best:
+            return []
+
+        matched = np.zeros(len(self.phrase_entry), dtype=np.float32)
+        for token_id, similarity in best.items():
+            matched[self.postings[token_id]] += similarity
+        coverage = matched / self.phrase_length
+        candidates = np.flatnonzero(coverage >= self.min_coverage)
+        if not len(candidates):
+            return []
+        # Best coverage first, then more matched tokens (more specific), then
+        # earlier entries, which puts explicit symptoms ahead of templates
+        order = np.lexsort((self.phrase_entry[candidates], -matched[candidates], -coverage[candidates]))
+
+        results, seen, used = [], set(), set()
+        for phrase_id in candidates[order]:
+            entry_id = int(self.phrase_entry[phrase_id])
+            if entry_id in seen:
+                continue
+            seen.add(entry_id)
+            used.update(self.phrase_tokens[phrase_id].tolist())
+            results.append((self.entries[entry_id], float(coverage[phrase_id])))
+            if len(results) >= limit:
+                break
+        if strict and not all(expansions & used for expansions in query_tokens):
+            return []
+        return results
+
+    def questions(self, text, limit=3, strict=False):
+        """
+        Return clarifying questions for a piece of text.
+
+        Questions of the best matching symptom come first, then those of the
+        next best ones, until ``limit`` is reached.
+
+        Args:
+            text (str): Free-text symptom description.
+            limit (int): Maximum number of questions.
+            strict (bool): See lookup().
+
+        Returns:
+            list: Questions, empty if no symptom matched.
+        """
+        questions = []
+        for entry, _ in self.lookup(text, limit, strict):
+            questions.extend(entry["questions"])
+        return list(dict.fromkeys(questions))[:limit]
+
+
+class ReloadingIndex:
+    """
+    A ClarifyingQuestionIndex that recompiles when its file changes.
+
+    The file's modification time is checked at most every ``interval``
+    seconds. Changes are compiled on a background thread while lookups keep
+    using the previous index, so a reload never stalls a request; a file that
+    fails to load is reported and the previous index kept.
+    """
+
+    def __init__(self, path, interval=5.0, timer=time.monotonic):
+        self.path = path
+        self.interval = interval
+        self.timer = timer
+        self.index = None
+        self.loaded_mtime = None
+        self.reloads = 0
+        self._checked_at = None
+        self._reloading = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.index is None:
+            with self._lock:
+                if self.index is None:
+                    self._load(os.stat(self.path).st_mtime_ns)
+            return self.index
+        now = self.timer()
+        if now - self._checked_at >= self.interval:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                print(f"Error checking clarifying questions at {self.path}: {str(e)}")
+            else:
+                if mtime != self.loaded_mtime and not self._reloading:
+                    self._reloading = True
+                    threading.Thread(target=self._reload, args=(mtime,), daemon=True).start()
+        return self.index
+
+    def _load(self, mtime):
+        index = ClarifyingQuestionIndex.from_file(self.path)
+        self.index, self.loaded_mtime = index, mtime
+        self._checked_at = self.timer()
+        self.reloads += 1
+
+    def _reload(self, mtime):
+        try:
+            with self._lock:
+                self._load(mtime)
+        except (OSError, ValueError, KeyError) as e:
+            # Keep serving the previous index; retry only once the file changes again
+            self.loaded_mtime = mtime
+            print(f"Error reloading clarifying questions from {self.path}: {str(e)}")
+        finally:
+            self._reloading = False
+
+    def wait(self, timeout=None):
+        """Block until a background reload in progress has finished (for tests and tools)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._reloading and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.01)
+
+
+_reloading_index = None
+
+
+def get_clarifying_index():
+    """
+    Return the shared clarifying-question index, compiling it on first use.
+
+    The knowledge base is read from CLARIFYING_QUESTIONS_PATH if set, else the
+    bundled one, and reloaded when the file changes (checked every
+    CLARIFYING_QUESTIONS_RELOAD_SECONDS, default 5; 0 checks on every call).
+    """
+    global _reloading_index
+    if _reloading_index is None:
+        _reloading_index = ReloadingIndex(
+            os.getenv("CLARIFYING_QUESTIONS_PATH", DEFAULT_KNOWLEDGE_BASE),
+            interval=float(os.getenv("CLARIFYING_QUESTIONS_RELOAD_SECONDS", "5")),
+        )
+    return _reloading_index.get()
@@ -0,0 +1,173 @@
+from src.core.triage import URGENCY_LEVELS, get_default_engine
+
+# Gemini averages roughly four characters per token on English text; close
+# enough to budget prompts without shipping a tokenizer.
+CHARS_PER_TOKEN = 4
+
+# Bounds on the rolling summary so it cannot grow with the conversation
+MAX_SUMMARY_SYMPTOMS = 20
+MAX_SUMMARY_QUESTIONS = 5
+MAX_QUESTION_CHARS = 120
+
+
+def estimate_tokens(text):
+    """
+    Estimate how many model tokens a piece of text costs.
+
+    Args:
+        text (str): Prompt text.
+
+    Returns:
+        int: Approximate token count.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def format_turn(turn):
+    """
+    Render one conversation turn the way follow-up prompts show it.
+
+    Args:
+        turn (dict): A turn with "user" and "assistant" messages.
+
+    Returns:
+        str: The turn as prompt text.
+    """
+    return f"User: {turn['user']}\nAssistant: {turn['assistant']}"
+
+
+def _truncate(text, limit):
+    return text if len(text) <= limit else text[:max(limit - 3, 0)].rstrip() + "..."
+
+
+class ConversationSummary:
+    """
+    Structured state folded from turns that no longer fit the prompt window.
+
+    Keeps the number of earlier turns, the symptoms the user mentioned (found
+    with the triage lexicon) with the highest urgency among them, and the
+    last few questions already asked, so Gemini does not repeat them.
+    """
+
+    def __init__(self):
+        self.turns = 0
+        self.symptoms = {}
+        self.asked = []
+
+    def add_turn(self, turn, engine=None):
+        """
+        Fold one turn into the summary.
+
+        Args:
+            turn (dict): A turn with "user" and "assistant" messages, and the
+                follow-up "questions" asked with it if the assistant message
+                is not itself the question.
+            engine (TriageRuleEngine): Lexicon matcher; the default engine if None.
+        """
+        engine = engine or get_default_engine()
+        self.turns += 1
+        for phrase, level in engine.match(turn["user"]):
+            self.symptoms.pop(phrase, None)
+            self.symptoms[phrase] = level
+        while len(self.symptoms) > MAX_SUMMARY_SYMPTOMS:
+            del self.symptoms[next(iter(self.symptoms))]
+        questions = turn["questions"] if "questions" in turn else [turn["assistant"]]
+        questions = [_truncate(question.strip(), MAX_QUESTION_CHARS) for question in questions if question.strip()]
+        self.asked = (self.asked + questions)[-MAX_SUMMARY_QUESTIONS:]
+
+    def copy(self):
+        return ConversationSummary.from_dict(self.to_dict())
+
+    def to_dict(self):
+        return {"turns": self.turns, "symptoms": dict(self.symptoms), "asked": list(self.asked)}
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls()
+        summary.turns = data["turns"]
+        summary.symptoms = dict(data["symptoms"])
+        summary.asked = list(data["asked"])
+        return summary
+
+    @property
+    def highest_urgency(self):
+        if not self.symptoms:
+            return None
+        return max(self.symptoms.values(), key=URGENCY_LEVELS.index)
+
+    def render(self):
+        """
+        Render the summary as prompt text.
+
+        Returns:
+            str: Summary lines, or an empty string if no turns were folded.
+        """
+        if not self.turns:
+            return ""
+        lines = [f"Earlier turns: {self.turns}"]
+        if self.symptoms:
+            lines.append(f"Symptoms mentioned: {', '.join(self.symptoms)}")
+            lines.append(f"Highest urgency so far: {self.highest_urgency}")
+        if self.asked:
+            lines.append("Already asked: " + " | ".join(self.asked))
+        return "\n".join(lines)
+
+
+def compact_history(conversation_history, token_budget, recent_turns, summary=None):
+    """
+    Split a conversation into a rolling summary and a window of recent turns.
+
+    The newest turns are kept verbatim, up to ``recent_turns`` of them and as
+    many as fit ``token_budget`` together with the summary; everything older
+    is folded into the summary. The newest turn is always kept, truncated if
+    it alone exceeds the budget.
+
+    Args:
+        conversation_history (list): Turns with "user" and "assistant" messages,
+            oldest first.
+        token_budget (int): Token budget for the summary plus the window.
+        recent_turns (int): Maximum number of turns kept verbatim.
+        summary (ConversationSummary): Summary of turns before
+            ``conversation_history``, extended in place; a new one if None.
+
+    Returns:
+        tuple: (ConversationSummary, list of recent turns oldest first).
+    """
+    if summary is None:
+        summary = ConversationSummary()
+    if not conversation_history:
+        return summary, []
+
+    # Walk back from the newest turn while the window fits the budget
+    start = len(conversation_history)
+    used = 0
+    while start > 0 and len(conversation_history) - start < max(recent_turns, 1):
+        cost = estimate_tokens(format_turn(conversation_history[start - 1])) + 1
+        if start < len(conversation_history) and used + cost > token_budget:
+            break
+        used += cost
+        start -= 1
+
+    for turn in conversation_history[:start]:
+        summary.add_turn(turn)
+
+    # The summary is bounded but not free; make room for it by folding more
+    summary_cost = estimate_tokens(summary.render())
+    while start < len(conversation_history) - 1 and used + summary_cost > token_budget:
+        turn = conversation_history[start]
+        used -= estimate_tokens(format_turn(turn)) + 1
+        summary.add_turn(turn)
+        summary_cost = estimate_tokens(summary.render())
+        start += 1
+
+    recent = list(conversation_history[start:])
+    overflow = used + summary_cost - token_budget
+    if overflow > 0:
+        newest = dict(recent[-1])
+        excess = overflow * CHARS_PER_TOKEN
+        for key in ("assistant", "user"):
+            keep = max(len(newest[key]) - excess, 0)
+            excess -= len(newest[key]) - keep
+            newest[key] = _truncate(newest[key], keep)
+        recent[-1] = newest
+    return summary, recent
@@ -0,0 +1,303 @@
+import numpy as np
+
+MINUTES_PER_DAY = 1440
+NANOS_PER_SECOND = 1_000_000_000
+
+# Google Fit sleep segment types (com.google.sleep.segment)
+SLEEP_STAGES = {1: "awake", 2: "sleep", 3: "out_of_bed", 4: "light", 5: "deep", 6: "rem"}
+ASLEEP_STAGES = (2, 4, 5, 6)
+
+# A minute with at least this many steps counts as active (brisk walking pace)
+ACTIVE_CADENCE = 100
+
+
+def points_to_arrays(points):
+    """
+    Convert Fit dataset points into compact arrays.
+
+    Args:
+        points (list): Dataset points with "startTimeNanos", "endTimeNanos"
+            and a first value holding "fpVal" or "intVal".
+
+    Returns:
+        tuple: (start seconds int64, end seconds int64, values float32).
+    """
+    count = len(points)
+    starts = np.fromiter((int(p["startTimeNanos"]) for p in points), dtype=np.int64, count=count)
+    ends = np.fromiter((int(p.get("endTimeNanos", p["startTimeNanos"])) for p in points), dtype=np.int64, count=count)
+    values = np.fromiter(
+        (p["value"][0].get("fpVal", p["value"][0].get("intVal", np.nan)) if p.get("value") else np.nan for p in points),
+        dtype=np.float32, count=count,
+    )
+    return starts // NANOS_PER_SECOND, ends // NANOS_PER_SECOND, values
+
+
+class MinuteSeries:
+    """
+    A metric binned to one-minute resolution over a fixed window of days.
+
+    Storage is two preallocated float32 arrays (sum and count per minute), so
+    memory is fixed by the window length however many raw points arrive;
+    points outside the window are dropped. Pages of points can be added as
+    they stream in.
+    """
+
+    def __init__(self, start, days):
+        """
+        Args:
+            start (int): Window start, epoch seconds at a UTC midnight.
+            days (int): Number of days in the window.
+        """
+        self.start = start
+        self.days = days
+        self.sums = np.zeros(days * MINUTES_PER_DAY, dtype=np.float32)
+        self.counts = np.zeros(days * MINUTES_PER_DAY, dtype=np.float32)
+
+    @property
+    def nbytes(self):
+        return self.sums.nbytes + self.counts.nbytes
+
+    def add(self, times, values):
+        """
+        Add samples.
+
+        Args:
+            times (ndarray): Sample times, epoch seconds.
+            values (ndarray): Sample values.
+        """
+        minutes = (np.asarray(times) - self.start) // 60
+        keep = (minutes >= 0) & (minutes < len(self.sums)) & ~np.isnan(values)
+        np.add.at(self.sums, minutes[keep], values[keep])
+        np.add.at(self.counts, minutes[keep], 1)
+
+    def means(self):
+        """Per-minute means shaped (days, 1440), NaN for minutes without samples"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (self.sums / self.counts).reshape(self.days, MINUTES_PER_DAY)
+
+    def totals(self):
+        """Per-minute sums shaped (days, 1440)"""
+        return self.sums.reshape(self.days, MINUTES_PER_DAY)
+
+    def coverage(self):
+        """Minutes with at least one sample, per day"""
+        return (self.counts.reshape(self.days, MINUTES_PER_DAY) > 0).sum(axis=1)
+
+
+class SleepSegments:
+    """
+    Sleep stage segments in a bounded ring of arrays.
+
+    At most ``capacity`` segments are kept; the oldest are overwritten, which
+    at several segments per night still covers weeks.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.starts = np.zeros(capacity, dtype=np.int64)
+        self.ends = np.zeros(capacity, dtype=np.int64)
+        self.stages = np.zeros(capacity, dtype=np.int8)
+        self.size = 0
+        self._next = 0
+
+    def add(self, starts, ends, stages):
+        for begin in range(0, len(starts), self.capacity):
+            chunk = slice(begin, begin + self.capacity)
+            count = len(starts[chunk])
+            slots = (self._next + np.arange(count)) % self.capacity
+            self.starts[slots] = starts[chunk]
+            self.ends[slots] = ends[chunk]
+            self.stages[slots] = stages[chunk]
+            self._next = int((self._next + count) % self.capacity)
+            self.size = min(self.size + count, self.capacity)
+
+    def arrays(self):
+        return self.starts[:self.size], self.ends[:self.size], self.stages[:self.size]
+
+
+def rolling_baseline(values, window):
+    """
+    Mean of each day's previous ``window`` days, ignoring missing (NaN) days.
+
+    Args:
+        values (ndarray): One value per day, oldest first.
+        window (int): Number of preceding days in the baseline.
+
+    Returns:
+        ndarray: Baseline per day; NaN where no earlier day has data.
+    """
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    days = np.arange(len(values))
+    first = np.maximum(days - window, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums[days] - sums[first]) / (counts[days] - counts[first])
+
+
+def heart_rate_features(series):
+    """
+    Daily heart-rate features from minute-level heart rate.
+
+    Resting HR is the 10th percentile of the day's minute means, which
+    tracks the sleeping or sitting rate without needing activity labels. The
+    variability proxy is the RMS of successive minute-to-minute differences
+    (an RMSSD computed on minute means, not beat intervals).
+
+    Args:
+        series (MinuteSeries): Heart rate in beats per minute.
+
+    Returns:
+        dict: Arrays with one value per day (NaN for days without data).
+    """
+    bpm = series.means()
+    has_data = series.coverage() > 0
+    with np.errstate(invalid="ignore"):
+        # Days without samples are zero-filled so the nan-reductions stay quiet
+        with_data = np.where(has_data[:, None], bpm, 0.0)
+        resting = np.where(has_data, np.nanpercentile(with_data, 10, axis=1), np.nan)
+        mean = np.where(has_data, np.nanmean(with_data, axis=1), np.nan)
+        maximum = np.where(has_data, np.nanmax(with_data, axis=1), np.nan)
+        diffs = np.diff(bpm, axis=1)
+        diff_count = (~np.isnan(diffs)).sum(axis=1)
+        rmssd = np.sqrt(np.nansum(diffs ** 2, axis=1) / np.maximum(diff_count, 1))
+    return {
+        "resting_hr": resting,
+        "mean_hr": mean,
+        "max_hr": maximum,
+        "hr_variability": np.where(diff_count > 0, rmssd, np.nan),
+    }
+
+
+def step_features(series):
+    """
+    Daily step totals and active minutes from minute-level step counts.
+
+    Args:
+        series (MinuteSeries): Step counts.
+
+    Returns:
+        dict: Arrays with one value per day (NaN for days without data).
+    """
+    steps = series.totals()
+    has_data = series.coverage() > 0
+    return {
+        "steps": np.where(has_data, steps.sum(axis=1), np.nan),
+        "active_minutes": np.where(has_data, (steps >= ACTIVE_CADENCE).sum(axis=1), np.nan),
+    }
+
+
+def sleep_features(segments, start, days):
+    """
+    Nightly sleep totals by stage.
+
+    Each segment counts towards the day its end falls on, so a night's sleep
+    is credited to the morning the user wakes up.
+
+    Args:
+        segments (SleepSegments): Sleep stage segments.
+        start (int): Window start, epoch seconds at a UTC midnight.
+        days (int): Number of days in the window.
+
+    Returns:
+        dict: Arrays with one value per day (NaN for days without sleep data).
+    """
+    starts, ends, stages = segments.arrays()
+    day = (ends - start) // 86400
+    keep = (day >= 0) & (day < days) & (ends > starts)
+    day, hours, stages = day[keep], (ends - starts)[keep] / 3600.0, stages[keep]
+
+    totals = np.zeros((days, max(SLEEP_STAGES) + 1))
+    np.add.at(totals, (day, stages), hours)
+    asleep = totals[:, list(ASLEEP_STAGES)].sum(axis=1)
+    has_data = np.bincount(day, minlength=days) > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "sleep_hours": np.where(has_data, asleep, np.nan),
+            "deep_sleep_percentage": np.where(has_data & (asleep > 0), 100.0 * totals[:, 5] / asleep, np.nan),
+            "rem_sleep_percentage": np.where(has_data & (asleep > 0), 100.0 * totals[:, 6] / asleep, np.nan),
+            "awake_hours": np.where(has_data, totals[:, 1], np.nan),
+        }
+
+
+def summarize_features(features, baseline_days=7, digits=1):
+    """
+    Compact summary of the latest day against its rolling baseline.
+
+    Only features with data on the latest day are included, as the value and
+    its difference from the mean of the previous ``baseline_days`` days.
+    Values are rounded so that summaries, and prompts built from them, stay
+    small and stable.
+
+    Args:
+        features (dict): Feature name -> array with one value per day.
+        baseline_days (int): Days in the rolling baseline.
+        digits (int): Decimal places to keep.
+
+    Returns:
+        dict: e.g. {"resting_hr": 64.0, "resting_hr_vs_baseline": 6.5, ...}.
+    """
+    summary = {}
+    for name, values in features.items():
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values) or np.isnan(values[-1]):
+            continue
+        summary[name] = round(float(values[-1]), digits)
+        baseline = rolling_baseline(values, baseline_days)[-1]
+        if not np.isnan(baseline):
+            summary[f"{name}_vs_baseline"] = round(float(values[-1] - baseline), digits)
+    return summary
+
+
+class IntradayWindow:
+    """
+    Intraday heart rate, steps and sleep for one user over a window of days.
+
+    Memory is fixed at construction: two minute series and a bounded ring of
+    sleep segments (about 95 KB per day of window plus 70 KB of segments).
+    """
+
+    def __init__(self, start, days, sleep_capacity=4096):
+        """
+        Args:
+            start (int): Window start, epoch seconds at a UTC midnight.
+            days (int): Number of days in the window, ending today.
+            sleep_capacity (int): Maximum sleep segments kept.
+        """
+        self.start = start
+        self.days = days
+        self.heart_rate = MinuteSeries(start, days)
+        self.steps = MinuteSeries(start, days)
+        self.sleep = SleepSegments(sleep_capacity)
+
+    @property
+    def nbytes(self):
+        sleep = self.sleep.starts.nbytes + self.sleep.ends.nbytes + self.sleep.stages.nbytes
+        return self.heart_rate.nbytes + self.steps.nbytes + sleep
+
+    def add_points(self, kind, points):
+        """
+        Ingest one page of Fit dataset points.
+
+        Args:
+            kind (str): "heart_rate", "steps" or "sleep".
+            points (list): Dataset points as returned by the Fit API.
+        """
+        starts, ends, values = points_to_arrays(points)
+        if kind == "sleep":
+            self.sleep.add(starts, ends, np.nan_to_num(values).astype(np.int8))
+        else:
+            getattr(self, kind).add(starts, values)
+
+    def features(self):
+        """
+        Compute every daily feature.
+
+        Returns:
+            dict: Feature name -> array with one value per day, oldest first.
+        """
+        return {
+            **heart_rate_features(self.heart_rate),
+            **step_features(self.steps),
+            **sleep_features(self.sleep, self.start, self.days),
+        }
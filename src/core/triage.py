@@ -1,47 +1,511 @@
+import json
+import os
+import re
+
+import numpy as np
+
+from src.core.clarifying import get_clarifying_index
+
+URGENCY_LEVELS = ("LOW", "MEDIUM", "HIGH", "EMERGENCY")
+
+# Symptom lexicon: urgency level -> phrases. Matching is case-insensitive and
+# whole-word; when phrases overlap the longest one wins ("mild headache" over
+# "headache"), so specific phrases can override generic ones.
+DEFAULT_LEXICON = {
+    "EMERGENCY": [
+        "chest pain", "chest pressure", "chest tightness", "crushing chest pain",
+        "difficulty breathing", "shortness of breath", "can't breathe", "cannot breathe",
+        "not breathing", "choking", "blue lips", "unconscious", "unresponsive",
+        "passed out", "seizure", "convulsions", "stroke", "face drooping",
+        "slurred speech", "sudden numbness", "sudden weakness", "paralysis",
+        "severe bleeding", "heavy bleeding", "uncontrolled bleeding", "coughing blood",
+        "vomiting blood", "suicidal", "overdose", "poisoning", "anaphylaxis",
+        "throat swelling", "worst headache of my life", "stiff neck and fever",
+    ],
+    "HIGH": [
+        "severe", "high fever", "fainting", "fainted", "confusion", "blood in stool",
+        "blood in urine", "severe abdominal pain", "severe headache", "dehydration",
+        "persistent vomiting", "broken bone", "head injury", "burn", "allergic reaction",
+    ],
+    "MEDIUM": [
+        "fever", "headache", "migraine", "vomiting", "diarrhea",
+        "abdominal pain", "stomach pain", "back pain", "ear pain", "rash",
+        "dizziness", "cough", "earache", "painful urination", "swelling",
+    ],
+    "LOW": [
+        "runny nose", "stuffy nose", "sneezing", "sore throat", "mild cough",
+        "mild headache", "mild fever", "tiredness", "fatigue", "itchy eyes",
+        "minor cut", "bruise", "hiccups", "dry skin", "muscle soreness",
+    ],
+}
+
+# Rules are not trusted with anything phrased as a negation ("no chest pain"),
+# except for negation words inside a matched phrase ("not breathing")
+_NEGATION = re.compile(r"\b(?:no|not|without|denies|never)\b")
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"[a-z0-9']+")
+
+# Words that may surround LOW phrases in a symptom still settled by the rules
+# ("a runny nose and sneezing"); any other unmatched word ("fatigue and
+# yellow skin") leaves the symptom to the language model
+_FILLER_WORDS = frozenset([
+    "a", "an", "the", "my", "i", "im", "i'm", "ive", "i've", "have", "has", "had", "got", "and", "with",
+    "also", "some", "bit", "little", "slight", "slightly", "since", "today", "yesterday", "this", "morning",
+])
+
+LOCAL_RESPONSES = {
+    "EMERGENCY": {
+        "initial_assessment": "Your symptoms include red-flag signs that need emergency care.",
+        "recommended_actions": [
+            "Call your local emergency number or go to the nearest emergency department now",
+            "Do not drive yourself; ask someone to take you or wait for an ambulance",
+        ],
+        "lifestyle_recommendations": [],
+        "warning_signs": [
+            "Loss of consciousness",
+            "Worsening breathing difficulty",
+            "Chest pain spreading to the arm, jaw or back",
+        ],
+    },
+    "LOW": {
+        "initial_assessment": "Your symptoms appear mild and can usually be managed at home.",
+        "recommended_actions": [
+            "Rest and monitor your symptoms",
+            "Consult a doctor if symptoms persist for more than a few days",
+        ],
+        "lifestyle_recommendations": [
+            "Stay hydrated",
+            "Get enough sleep",
+        ],
+        "warning_signs": [
+            "High fever",
+            "Difficulty breathing",
+            "Symptoms that suddenly get worse",
+        ],
+    },
+}
+
+
+def _build_trie_pattern(terms):
+    """
+    Compile phrases into a single prefix-trie regular expression.
+
+    Shared prefixes are factored out, so the matcher walks the input once and
+    its cost does not grow with the number of phrases sharing a prefix.
+
+    Args:
+        terms (iterable): Lowercase phrases to match.
+
+    Returns:
+        str: A regular expression matching any of the phrases.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def to_regex(node):
+        if "" in node and len(node) == 1:
+            return None
+        alternatives = []
+        for char in sorted(key for key in node if key):
+            sub = to_regex(node[char])
+            alternatives.append(re.escape(char) + (sub or ""))
+        pattern = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        if "" in node:
+            pattern = "(?:" + pattern + ")?"
+        return pattern
+
+    return to_regex(trie) or ""
+
+
+class TriageRuleEngine:
+    """
+    Rule-based triage over a configurable symptom lexicon.
+
+    All phrases are compiled into one trie regex, so each symptom is scanned in
+    a single pass regardless of lexicon size.
+    """
+
+    def __init__(self, lexicon=None):
+        lexicon = lexicon or DEFAULT_LEXICON
+        self.levels = {}
+        for level in URGENCY_LEVELS:
+            for term in lexicon.get(level, []):
+                self.levels[_WHITESPACE.sub(" ", term.strip().lower())] = level
+        self.pattern = re.compile(r"\b" + _build_trie_pattern(self.levels) + r"\b")
+
+        # Dense term ids and a term -> severity vector for batch scoring
+        self.terms = list(self.levels)
+        self.term_index = {term: index for index, term in enumerate(self.terms)}
+        self.term_levels = np.array(
+            [URGENCY_LEVELS.index(self.levels[term]) for term in self.terms], dtype=np.int8
+        )
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Load a lexicon from a JSON file mapping urgency levels to phrase lists.
+
+        Args:
+            path (str): Path to the lexicon file.
+
+        Returns:
+            TriageRuleEngine: An engine compiled from the file.
+        """
+        with open(path) as lexicon_file:
+            return cls(json.load(lexicon_file))
+
+    def match(self, text):
+        """
+        Find lexicon phrases in a piece of text.
+
+        Args:
+            text (str): Free-text symptom description.
+
+        Returns:
+            list: (phrase, urgency level) tuples in order of appearance.
+        """
+        text = _WHITESPACE.sub(" ", text.lower())
+        return [(m.group(0), self.levels[m.group(0)]) for m in self.pattern.finditer(text)]
+
+    def evaluate(self, symptoms):
+        """
+        Triage a list of symptoms and decide whether the rules are conclusive.
+
+        The result is decisive when any red flag is present (EMERGENCY), or when
+        every symptom is made up entirely of low-urgency phrases and filler
+        words (LOW). Anything else, including negated phrasing and symptoms
+        with words the lexicon does not know, is left for the language model.
+
+        Args:
+            symptoms (list): A list of symptom strings provided by the user.
+
+        Returns:
+            dict: Urgency level (or None if nothing matched), matched phrases
+            and whether the result is decisive.
+        """
+        matched_terms = []
+        highest = -1
+        all_covered = bool(symptoms)
+        negated = False
+
+        for symptom in symptoms:
+            text = _WHITESPACE.sub(" ", symptom.lower())
+            spans = [(m.start(), m.end()) for m in self.pattern.finditer(text)]
+            covered = np.zeros(len(text) + 1, dtype=bool)
+            for start, end in spans:
+                covered[start:end] = True
+            if not spans or any(
+                not covered[m.start()] and m.group(0) not in _FILLER_WORDS for m in _WORD.finditer(text)
+            ):
+                all_covered = False
+            negated = negated or any(not covered[m.start()] for m in _NEGATION.finditer(text))
+            for start, end in spans:
+                term = text[start:end]
+                matched_terms.append(term)
+                highest = max(highest, URGENCY_LEVELS.index(self.levels[term]))
+
+        urgency_level = URGENCY_LEVELS[highest] if highest >= 0 else None
+        decisive = not negated and (
+            urgency_level == "EMERGENCY" or (urgency_level == "LOW" and all_covered)
+        )
+        return {
+            "urgency_level": urgency_level,
+            "matched_terms": matched_terms,
+            "decisive": decisive,
+        }
+
+    def evaluate_batch(self, symptom_lists):
+        """
+        Triage many patients at once.
+
+        All symptoms are joined into one newline-separated corpus and scanned by
+        a single pass of the compiled matcher. Matches are mapped back to their
+        symptom and patient with array lookups, and severities, coverage and
+        negation are reduced per patient with NumPy instead of Python loops.
+
+        Args:
+            symptom_lists (list): One list of symptom strings per patient.
+
+        Returns:
+            list: One result per patient, in input order, shaped like evaluate().
+        """
+        n_patients = len(symptom_lists)
+        counts = np.fromiter((len(symptoms) for symptoms in symptom_lists), dtype=np.int64, count=n_patients)
+        texts = [_WHITESPACE.sub(" ", symptom.lower()) for symptoms in symptom_lists for symptom in symptoms]
+        owner = np.repeat(np.arange(n_patients), counts)
+        starts = np.zeros(len(texts), dtype=np.int64)
+        if texts:
+            np.cumsum([len(text) + 1 for text in texts[:-1]], out=starts[1:])
+        corpus = "\n".join(texts)
+
+        positions, ends, term_ids = [], [], []
+        for match in self.pattern.finditer(corpus):
+            positions.append(match.start())
+            ends.append(match.end())
+            term_ids.append(self.term_index[match.group(0)])
+        term_ids = np.array(term_ids, dtype=np.intp)
+        match_symptom = np.searchsorted(starts, positions, side="right") - 1
+        match_owner = owner[match_symptom]
+
+        highest = np.full(n_patients, -1, dtype=np.int8)
+        np.maximum.at(highest, match_owner, self.term_levels[term_ids])
+
+        # Characters inside a matched phrase, from +1/-1 marks at span edges
+        edges = np.zeros(len(corpus) + 1, dtype=np.int64)
+        np.add.at(edges, np.array(positions, dtype=np.intp), 1)
+        np.add.at(edges, np.array(ends, dtype=np.intp), -1)
+        covered = np.cumsum(edges) > 0
+
+        # A symptom is covered when it has a match and every other word is filler
+        symptom_matched = np.zeros(len(texts), dtype=bool)
+        symptom_matched[match_symptom] = True
+        word_positions = [m.start() for m in _WORD.finditer(corpus) if m.group(0) not in _FILLER_WORDS]
+        word_positions = np.array(word_positions, dtype=np.intp)
+        stray = word_positions[~covered[word_positions]]
+        stray_symptom = np.searchsorted(starts, stray, side="right") - 1
+        symptom_covered = symptom_matched & (np.bincount(stray_symptom, minlength=len(texts)) == 0)
+        uncovered = np.bincount(owner[~symptom_covered], minlength=n_patients)
+        all_covered = (uncovered == 0) & (counts > 0)
+
+        negation_positions = np.array([m.start() for m in _NEGATION.finditer(corpus)], dtype=np.intp)
+        negation_positions = negation_positions[~covered[negation_positions]]
+        negation_owner = owner[np.searchsorted(starts, negation_positions, side="right") - 1]
+        negated = np.bincount(negation_owner, minlength=n_patients) > 0
+
+        decisive = ~negated & (
+            (highest == URGENCY_LEVELS.index("EMERGENCY"))
+            | ((highest == URGENCY_LEVELS.index("LOW")) & all_covered)
+        )
+
+        # Matches arrive in corpus order, so each patient's terms are contiguous
+        boundaries = np.searchsorted(match_owner, np.arange(1, n_patients))
+        terms_per_patient = np.split(term_ids, boundaries) if n_patients else []
+
+        return [
+            {
+                "urgency_level": URGENCY_LEVELS[level] if level >= 0 else None,
+                "matched_terms": [self.terms[term] for term in terms],
+                "decisive": bool(is_decisive),
+            }
+            for level, terms, is_decisive in zip(highest.tolist(), terms_per_patient, decisive.tolist())
+        ]
+
+
+_default_engine = None
+
+
+def get_default_engine():
+    """
+    Return the shared rule engine, compiling it on first use.
+
+    The lexicon is read from the file named by TRIAGE_LEXICON_PATH if set,
+    otherwise DEFAULT_LEXICON is used.
+    """
+    global _default_engine
+    if _default_engine is None:
+        path = os.getenv("TRIAGE_LEXICON_PATH")
+        _default_engine = TriageRuleEngine.from_file(path) if path else TriageRuleEngine()
+    return _default_engine
+
+
+# Words a paraphrase match must not change: amounts, the units that make them
+# an age or a duration, and body sides. Embeddings score "3 year old" and
+# "3 month old", or "lower right" and "lower left", as near-identical.
+_DETAIL_TOKEN = re.compile(r"\d+(?:\.\d+)?|[a-z]+")
+_DETAIL_WORDS = {
+    **{word: word for word in (
+        "zero one two three four five six seven eight nine ten eleven twelve fifteen twenty thirty "
+        "forty fifty sixty seventy eighty ninety hundred half couple few several"
+    ).split()},
+    **{word: "second" for word in ("second", "seconds", "sec", "secs")},
+    **{word: "minute" for word in ("minute", "minutes", "min", "mins")},
+    **{word: "hour" for word in ("hour", "hours", "hr", "hrs")},
+    **{word: "day" for word in ("day", "days")},
+    **{word: "night" for word in ("night", "nights")},
+    **{word: "week" for word in ("week", "weeks", "wk", "wks")},
+    **{word: "month" for word in ("month", "months", "mo", "mos")},
+    **{word: "year" for word in ("year", "years", "yr", "yrs", "yo")},
+    **{word: word for word in ("old", "left", "right", "upper", "lower", "both")},
+}
+
+
+def critical_signature(text, engine=None):
+    """
+    Summarize the urgency-critical content of a symptom description.
+
+    Two descriptions with the same signature share their highest urgency
+    level, negation, exact set of red-flag phrases and the sequence of
+    numbers, age and duration units and body sides they mention, so an
+    answer cached for one may be reused for the other.
+
+    Args:
+        text (str): Free-text symptom description.
+        engine (TriageRuleEngine): Matcher to use; the default engine if None.
+
+    Returns:
+        str: A compact signature string.
+    """
+    engine = engine or get_default_engine()
+    matches = engine.match(text)
+    levels = [URGENCY_LEVELS.index(level) for _, level in matches]
+    highest = URGENCY_LEVELS[max(levels)] if levels else "NONE"
+    negated = "neg" if _NEGATION.search(text.lower()) else "pos"
+    red_flags = sorted({phrase for phrase, level in matches if level == "EMERGENCY"})
+    details = [
+        token if token[0].isdigit() else _DETAIL_WORDS[token]
+        for token in _DETAIL_TOKEN.findall(text.lower())
+        if token[0].isdigit() or token in _DETAIL_WORDS
+    ]
+    return f"{highest}|{negated}|{','.join(red_flags)}|{' '.join(details)}"
+
+
+def build_local_analysis(triage):
+    """
+    Build a full analysis from a decisive rule-based triage result.
+
+    Args:
+        triage (dict): Result of TriageRuleEngine.evaluate.
+
+    Returns:
+        dict: Fields matching HealthAnalysisResponse, or None if the result is
+        not decisive.
+    """
+    if not triage["decisive"]:
+        return None
+    level = triage["urgency_level"]
+    analysis = dict(LOCAL_RESPONSES[level], urgency_level=level)
+    analysis["initial_assessment"] = (
+        f"{analysis['initial_assessment']} {determine_urgency(level)}. "
+        f"Matched: {', '.join(dict.fromkeys(triage['matched_terms']))}."
+    )
+    return analysis
+
+
+FALLBACK_RESPONSE = {
+    "initial_assessment": (
+        "A detailed AI assessment is temporarily unavailable, so this is based "
+        "on a rule-based check of your symptoms only."
+    ),
+    "recommended_actions": [
+        "Contact a doctor or nurse to discuss your symptoms",
+        "Seek care sooner if your symptoms get worse",
+    ],
+    "lifestyle_recommendations": [
+        "Rest and stay hydrated",
+    ],
+    "warning_signs": [
+        "Difficulty breathing",
+        "Chest pain",
+        "Confusion or fainting",
+        "Symptoms that suddenly get worse",
+    ],
+}
+
+
+def build_fallback_analysis(triage):
+    """
+    Build a conservative analysis for when Gemini is unavailable.
+
+    Decisive results get the usual local analysis. Otherwise the matched
+    urgency is kept, but never reported below MEDIUM, since the rules alone
+    cannot rule out a more serious cause.
+
+    Args:
+        triage (dict): Result of TriageRuleEngine.evaluate.
+
+    Returns:
+        dict: Fields matching HealthAnalysisResponse.
+    """
+    analysis = build_local_analysis(triage)
+    if analysis is not None:
+        return analysis
+    level = triage["urgency_level"]
+    if level is None or URGENCY_LEVELS.index(level) < URGENCY_LEVELS.index("MEDIUM"):
+        level = "MEDIUM"
+    analysis = dict(FALLBACK_RESPONSE, urgency_level=level)
+    analysis["initial_assessment"] = f"{analysis['initial_assessment']} {determine_urgency(level)}."
+    return analysis
+
+
+def determine_urgency(severity):
+    """
+    Translate an urgency level into patient-facing guidance.
+
+    Args:
+        severity (str): An urgency level such as "low" or "HIGH".
+
+    Returns:
+        str: Short guidance for the patient.
+    """
+    guidance = {
+        "emergency": "Call emergency services immediately",
+        "high": "Immediate attention required",
+        "medium": "Consult a doctor within the next day",
+        "low": "Monitor and consult if symptoms persist",
+    }
+    return guidance.get(severity.lower(), guidance["low"])
+
+
 def process_symptoms(symptoms):
     """
     Process user symptoms and determine urgency level.
-    
+
     Args:
         symptoms (list): A list of symptom strings provided by the user.
-    
+
     Returns:
         dict: A dictionary containing processed symptoms and urgency level.
     """
-    # Placeholder for urgency determination logic
-    urgency_level = "low"  # Default urgency level
-    processed_symptoms = []
-
-    for symptom in symptoms:
-        # Here you would add logic to analyze each symptom
-        processed_symptoms.append(symptom)
-
-        # Example logic to determine urgency level
-        if "severe" in symptom.lower():
-            urgency_level = "high"
-        elif "moderate" in symptom.lower():
-            urgency_level = "medium"
+    triage = get_default_engine().evaluate(symptoms)
 
     return {
-        "processed_symptoms": processed_symptoms,
-        "urgency_level": urgency_level
+        "processed_symptoms": list(symptoms),
+        "urgency_level": (triage["urgency_level"] or "LOW").lower(),
+        "matched_terms": triage["matched_terms"],
+        "decisive": triage["decisive"],
+        "clarifying_questions": [ask_clarifying_questions(symptom) for symptom in symptoms],
     }
 
+GENERIC_CLARIFYING_QUESTION = "Can you provide more details about your symptom?"
+
+# At most this many locally answered follow-up questions per message
+MAX_LOCAL_QUESTIONS = 3
+
 def ask_clarifying_questions(symptom):
     """
     Ask clarifying questions based on the user's symptom input.
-    
+
     Args:
         symptom (str): The symptom provided by the user.
-    
+
     Returns:
         str: A clarifying question related to the symptom.
     """
-    # Example clarifying questions
-    questions = {
-        "headache": "How long have you been experiencing the headache?",
-        "fever": "What is your current temperature?",
-        "cough": "Is the cough dry or productive?"
-    }
-    
-    return questions.get(symptom.lower(), "Can you provide more details about your symptom?")
\ No newline at end of file
+    questions = get_clarifying_index().questions(symptom, limit=1)
+    return questions[0] if questions else GENERIC_CLARIFYING_QUESTION
+
+def local_clarifying_questions(symptoms):
+    """
+    Follow-up questions answered from the clarifying-question index, if it
+    recognizes every symptom in full.
+
+    Args:
+        symptoms (list): Symptom strings from the user's message.
+
+    Returns:
+        list: Up to MAX_LOCAL_QUESTIONS questions, or None if any symptom
+            has words no matched entry accounts for (Gemini can ask better ones).
+    """
+    index = get_clarifying_index()
+    per_symptom = [index.questions(symptom, limit=MAX_LOCAL_QUESTIONS, strict=True) for symptom in symptoms]
+    if not per_symptom or not all(per_symptom):
+        return None
+    # Take each symptom's best question first, then the runners-up
+    questions = []
+    for rank in range(MAX_LOCAL_QUESTIONS):
+        questions.extend(found[rank] for found in per_symptom if rank < len(found))
+    return list(dict.fromkeys(questions))[:MAX_LOCAL_QUESTIONS]
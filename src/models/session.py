@@ -0,0 +1,55 @@
+import secrets
+import time
+from typing import Dict, List, Optional
+
+from src.core.conversation import ConversationSummary
+
+
+class Session:
+    """
+    Server-side state of one chat.
+
+    Holds the newest ``max_turns`` turns verbatim and folds older ones into a
+    rolling ConversationSummary as they are added, so a session's size (and
+    the work to store or prompt from it) stays bounded however long the chat
+    runs. ``context`` is the latest fitness context sent for the chat.
+    """
+
+    __slots__ = ("id", "history", "summary", "context", "updated_at")
+
+    def __init__(self, id: Optional[str] = None, history: Optional[List[Dict]] = None,
+                 summary: Optional[ConversationSummary] = None, context: Optional[Dict] = None,
+                 updated_at: Optional[float] = None):
+        self.id = id or secrets.token_urlsafe(16)
+        self.history = history or []
+        self.summary = summary or ConversationSummary()
+        self.context = context
+        self.updated_at = updated_at or time.time()
+
+    def add_turn(self, turn: Dict, max_turns: int):
+        self.history.append(turn)
+        while len(self.history) > max(max_turns, 1):
+            self.summary.add_turn(self.history.pop(0))
+        self.updated_at = time.time()
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "history": self.history,
+            "summary": self.summary.to_dict(),
+            "context": self.context,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Session":
+        return cls(
+            id=data["id"],
+            history=data["history"],
+            summary=ConversationSummary.from_dict(data["summary"]),
+            context=data["context"],
+            updated_at=data["updated_at"],
+        )
+
+    def __repr__(self):
+        return f"Session(id={self.id}, turns={self.summary.turns + len(self.history)})"
@@ -1,8 +1,77 @@
+import numpy as np
+
+
 class Symptom:
+    __slots__ = ("name", "severity", "duration")
+
     def __init__(self, name: str, severity: int, duration: int):
         self.name = name
         self.severity = severity
         self.duration = duration
 
+    def __eq__(self, other):
+        if not isinstance(other, Symptom):
+            return NotImplemented
+        return (self.name, self.severity, self.duration) == (other.name, other.severity, other.duration)
+
+    def __hash__(self):
+        # Defining __eq__ alone would make Symptom unhashable
+        return hash((self.name, self.severity, self.duration))
+
+    def __repr__(self):
+        return f"Symptom(name={self.name}, severity={self.severity}, duration={self.duration})"
+
+
+class SymptomBatch:
+    """
+    Columnar container for many symptom records.
+
+    Names are dictionary-encoded into ``names`` and referenced by integer id,
+    and severity/duration live in typed NumPy arrays, so a million records
+    take a few megabytes instead of a million Python objects. Severity is
+    float32 so fractional scores such as 2.5 are kept as given.
+    """
+
+    __slots__ = ("names", "name_ids", "severity", "duration")
+
+    def __init__(self, names, name_ids, severity, duration):
+        self.names = list(names)
+        self.name_ids = np.asarray(name_ids, dtype=np.int32)
+        self.severity = np.asarray(severity, dtype=np.float32)
+        self.duration = np.asarray(duration, dtype=np.int32)
+        if not len(self.name_ids) == len(self.severity) == len(self.duration):
+            raise ValueError("SymptomBatch columns must have the same length")
+
+    @classmethod
+    def from_columns(cls, names, severity, duration):
+        """Build a batch from parallel columns of names, severities and durations"""
+        vocabulary, name_ids = np.unique(np.asarray(names, dtype=str), return_inverse=True)
+        return cls(vocabulary.tolist(), name_ids, severity, duration)
+
+    @classmethod
+    def from_symptoms(cls, symptoms):
+        """Build a batch from an iterable of Symptom objects"""
+        symptoms = list(symptoms)
+        count = len(symptoms)
+        index = {}
+        name_ids = np.fromiter(
+            (index.setdefault(symptom.name, len(index)) for symptom in symptoms), dtype=np.int32, count=count
+        )
+        severity = np.fromiter((symptom.severity for symptom in symptoms), dtype=np.float32, count=count)
+        duration = np.fromiter((symptom.duration for symptom in symptoms), dtype=np.int32, count=count)
+        return cls(list(index), name_ids, severity, duration)
+
+    def __len__(self):
+        return len(self.name_ids)
+
+    def __getitem__(self, index):
+        return Symptom(
+            self.names[self.name_ids[index]], self.severity[index].item(), int(self.duration[index])
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
     def __repr__(self):
-        return f"Symptom(name={self.name}, severity={self.severity}, duration={self.duration})"
\ No newline at end of file
+        return f"SymptomBatch(records={len(self)}, names={len(self.names)})"
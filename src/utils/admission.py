@@ -0,0 +1,217 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional
+
+from src.utils.cache import TTLCache
+
+URGENT = 0
+ROUTINE = 1
+
+
+class AdmissionRejected(Exception):
+    """A request was shed instead of queued; ``status_code`` is 429 or 503"""
+
+    def __init__(self, message: str, status_code: int, retry_after: float):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take a token and return 0, or return the seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "tenant", "future")
+
+    def __init__(self, priority: int, seq: int, tenant: str, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.tenant = tenant
+        self.future = future
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """Bound concurrent upstream calls globally and per tenant
+
+    Requests beyond the limits wait in a bounded priority queue: urgent
+    requests are admitted before routine ones, and when the queue is full an
+    urgent arrival displaces the newest routine waiter. Requests that would
+    wait past ``queue_timeout``, or find the queue full, are rejected at once
+    with 503; tenants over their request rate get 429. Both carry a
+    retry-after estimate from recent slot hold times.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 64,
+        per_tenant: int = 16,
+        max_queue: int = 256,
+        queue_timeout: float = 5.0,
+        tenant_rate: float = 0.0,
+        tenant_burst: float = 20.0,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.max_concurrent = max_concurrent
+        self.per_tenant = per_tenant
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.tenant_rate = tenant_rate
+        self.tenant_burst = tenant_burst
+        self.timer = timer
+        self.active = 0
+        self.active_by_tenant: Dict[str, int] = {}
+        self.rejected = {429: 0, 503: 0}
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._buckets = TTLCache(maxsize=10000, ttl=600)
+        # Moving average of how long a slot is held, for retry-after hints
+        self._hold_time = 1.0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_concurrent=int(os.getenv("GEMINI_MAX_CONCURRENCY", "64")),
+            per_tenant=int(os.getenv("GEMINI_TENANT_CONCURRENCY", "16")),
+            max_queue=int(os.getenv("GEMINI_QUEUE_SIZE", "256")),
+            queue_timeout=float(os.getenv("GEMINI_QUEUE_TIMEOUT", "5")),
+            tenant_rate=float(os.getenv("GEMINI_TENANT_RATE", "0")),
+            tenant_burst=float(os.getenv("GEMINI_TENANT_BURST", "20")),
+        )
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def _retry_after(self) -> float:
+        backlog = (len(self._queue) + 1) / max(self.max_concurrent, 1)
+        return max(1.0, backlog * self._hold_time)
+
+    def _reject(self, message: str, status_code: int, retry_after: Optional[float] = None) -> AdmissionRejected:
+        self.rejected[status_code] += 1
+        return AdmissionRejected(message, status_code, self._retry_after() if retry_after is None else retry_after)
+
+    def _can_run(self, tenant: str) -> bool:
+        return self.active < self.max_concurrent and self.active_by_tenant.get(tenant, 0) < self.per_tenant
+
+    def _start(self, tenant: str):
+        self.active += 1
+        self.active_by_tenant[tenant] = self.active_by_tenant.get(tenant, 0) + 1
+
+    def _check_rate(self, tenant: str):
+        if self.tenant_rate <= 0:
+            return
+        now = self.timer()
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            bucket = TokenBucket(self.tenant_rate, self.tenant_burst, now)
+            self._buckets.set(tenant, bucket)
+        wait = bucket.take(now)
+        if wait:
+            raise self._reject(f"Rate limit exceeded for {tenant}", 429, max(1.0, wait))
+
+    async def acquire(self, tenant: str, priority: int = ROUTINE):
+        """Wait for a slot, or raise AdmissionRejected"""
+        self._check_rate(tenant)
+        # Admit straight away unless someone of equal or higher priority is
+        # waiting who could use the slot (not just held back by their tenant limit)
+        if self._can_run(tenant) and not any(
+            w.priority <= priority and self._can_run(w.tenant) for w in self._queue
+        ):
+            self._start(tenant)
+            return
+
+        if len(self._queue) >= self.max_queue:
+            newest_routine = max((w for w in self._queue if w.priority > priority), default=None)
+            if newest_routine is None:
+                raise self._reject("Server is overloaded", 503)
+            self._queue.remove(newest_routine)
+            heapq.heapify(self._queue)
+            newest_routine.future.set_exception(self._reject("Displaced by an urgent request", 503))
+
+        waiter = _Waiter(priority, next(self._seq), tenant, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.exception():
+                # Admitted just as the wait timed out; hand the slot back
+                self.release(tenant)
+            self._discard(waiter)
+            raise self._reject("Timed out waiting for an upstream slot", 503)
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled() and not waiter.future.exception():
+                self.release(tenant)
+            self._discard(waiter)
+            raise
+
+    def _discard(self, waiter: _Waiter):
+        if waiter in self._queue:
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+        if not waiter.future.done():
+            waiter.future.cancel()
+
+    def release(self, tenant: str, held: Optional[float] = None):
+        self.active -= 1
+        remaining = self.active_by_tenant.get(tenant, 1) - 1
+        if remaining:
+            self.active_by_tenant[tenant] = remaining
+        else:
+            self.active_by_tenant.pop(tenant, None)
+        if held is not None:
+            self._hold_time = 0.9 * self._hold_time + 0.1 * held
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit waiters in priority order, skipping tenants at their limit"""
+        skipped = []
+        while self._queue and self.active < self.max_concurrent:
+            waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                continue
+            if not self._can_run(waiter.tenant):
+                skipped.append(waiter)
+                continue
+            self._start(waiter.tenant)
+            waiter.future.set_result(None)
+        for waiter in skipped:
+            heapq.heappush(self._queue, waiter)
+
+    @asynccontextmanager
+    async def slot(self, tenant: str, priority: int = ROUTINE):
+        """Hold an upstream slot for the duration of the block"""
+        await self.acquire(tenant, priority)
+        started = self.timer()
+        try:
+            yield
+        finally:
+            self.release(tenant, self.timer() - started)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self.active,
+            "queued": len(self._queue),
+            "rejected_429": self.rejected[429],
+            "rejected_503": self.rejected[503],
+        }
@@ -0,0 +1,147 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into a single shared task.
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same result instead of repeating it. Each waiter
+    is shielded, so one caller being cancelled does not cancel the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self.started += 1
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+async def bounded_gather(factories: Iterable[Callable[[], Awaitable[T]]], limit: int, return_exceptions: bool = False) -> List[T]:
+    """Run coroutine factories with at most ``limit`` in flight, returning results in input order"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(factory):
+        async with semaphore:
+            return await factory()
+
+    return await asyncio.gather(*(run(factory) for factory in factories), return_exceptions=return_exceptions)
+
+
+class MicroBatcher:
+    """Group concurrent submissions into batches for a handler that takes many items at once.
+
+    A batch is flushed when it reaches ``max_size`` items or ``max_wait``
+    seconds after its first item arrived, whichever comes first. The handler
+    receives the items and returns one result per item, in order; a result
+    that is an exception is raised to that item's caller only.
+    """
+
+    def __init__(self, handler: Callable[[List], Awaitable[List]], max_size: int, max_wait: float):
+        self.handler = handler
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._pending: List = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Future] = set()
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        task = asyncio.ensure_future(self._run(batch))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class SlowConsumer(Exception):
+    """An Outbox stayed full for longer than its timeout"""
+
+
+class Outbox:
+    """Bounded queue of messages waiting to be sent to one consumer.
+
+    ``put`` waits while the queue is full, which slows the producer down to
+    the consumer's pace, but raises SlowConsumer if it stays full for
+    ``timeout`` seconds so a stalled consumer cannot hold the producer
+    forever. ``offer`` never waits: it is for messages that may be lost,
+    such as incremental updates a later message repeats, and drops them
+    while the queue is full.
+    """
+
+    def __init__(self, maxsize: int, timeout: float):
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    async def put(self, message):
+        try:
+            await asyncio.wait_for(self._queue.put(message), self.timeout)
+        except asyncio.TimeoutError:
+            raise SlowConsumer(f"outbox full for {self.timeout:g}s") from None
+
+    def offer(self, message) -> bool:
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        return True
+
+    async def get(self):
+        return await self._queue.get()
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
@@ -0,0 +1,98 @@
+"""Local stand-in for the Gemini API, for dry runs and benchmarks.
+
+FakeGeminiServer speaks the generateContent / streamGenerateContent JSON
+shapes over real HTTP, so GeminiClient exercises its connection pool exactly
+as in production. It lives in src so `python -m src.bulk --dry-run` works
+wherever the application is deployed.
+"""
+import asyncio
+import json
+import random
+import socket
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+ANALYSIS = {
+    "urgency_level": "MEDIUM",
+    "initial_assessment": "Symptoms are consistent with a common viral illness.",
+    "recommended_actions": ["Rest", "Monitor your temperature"],
+    "lifestyle_recommendations": ["Stay hydrated", "Sleep at least 8 hours"],
+    "warning_signs": ["Difficulty breathing", "Fever above 39C for more than 3 days"],
+}
+
+FOLLOW_UP = ["How long have you had these symptoms?", "Have you taken any medication?"]
+
+
+class FakeGeminiServer:
+    """HTTP server answering Gemini requests with configurable latency, jitter and errors"""
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.05, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self._runner: Optional[web.AppRunner] = None
+        self.port: Optional[int] = None
+
+        self.app = web.Application()
+        self.app.router.add_post("/v1beta/models/{model_method}", self._handle)
+
+    @property
+    def api_base(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1beta"
+
+    async def start(self, port: int = 0):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", port))
+        self.port = sock.getsockname()[1]
+        await web.SockSite(self._runner, sock).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    @staticmethod
+    def _answer(prompt: str) -> str:
+        if "follow-up" in prompt:
+            return json.dumps(FOLLOW_UP)
+        return json.dumps(ANALYSIS)
+
+    @staticmethod
+    def _candidate(text: str) -> dict:
+        return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        method = request.match_info["model_method"].split(":")[-1]
+        self.calls[method] += 1
+        body = await request.json()
+        prompt = body["contents"][-1]["parts"][0]["text"]
+
+        if self.random.random() < self.error_rate:
+            await asyncio.sleep(self._delay() / 4)
+            status = self.random.choice([429, 500, 503])
+            return web.json_response({"error": {"code": status, "message": "injected failure"}}, status=status)
+
+        text = self._answer(prompt)
+        if method == "generateContent":
+            await asyncio.sleep(self._delay())
+            return web.json_response(self._candidate(text))
+
+        # streamGenerateContent?alt=sse: spread the generation time over the chunks
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        chunks = [text[i:i + 32] for i in range(0, len(text), 32)]
+        pause = self._delay() / max(len(chunks), 1)
+        for chunk in chunks:
+            await asyncio.sleep(pause)
+            await response.write(f"data: {json.dumps(self._candidate(chunk))}\r\n\r\n".encode())
+        await response.write_eof()
+        return response
@@ -0,0 +1,219 @@
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+Counters, gauges and fixed-bucket histograms are plain dicts keyed by label
+values, so recording a sample costs a dict lookup and an addition. Metrics are
+meant to be updated from the event loop thread only.
+
+Histogram timers also append to the current request's stage timings, which
+MetricsMiddleware can return as a ``Server-Timing`` header.
+"""
+import bisect
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_request_timings: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def record_timing(name: str, seconds: float):
+    """Add a stage duration to the current request's Server-Timing entries, if any"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, timing_prefix: Optional[str] = None):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.timing_prefix = timing_prefix
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # Per-bucket (non-cumulative) counts, then sum and count
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block and record it as a request stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_timing(time.perf_counter() - started, **labels)
+
+    def observe_timing(self, seconds: float, **labels):
+        """Observe a duration and record it as a request stage"""
+        self.observe(seconds, **labels)
+        if self.timing_prefix:
+            record_timing("_".join([self.timing_prefix, *self._key(labels)]), seconds)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            labels = _format_labels(self.labelnames, key)
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            bucket_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{bucket_labels} {count}"
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def register_collector(self, collector: Callable[[], Iterable[_Metric]]):
+        """Add a callable producing metrics computed at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        metrics = list(self._metrics.values())
+        for collector in self._collectors:
+            metrics.extend(collector())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+HTTP_DURATION = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency", ("route",))
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "HTTP requests currently being handled")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests
+
+    With ``timing_headers`` enabled, responses carry a Server-Timing header
+    listing the stages recorded while handling the request plus the total.
+    """
+
+    def __init__(self, app, timing_headers: bool = False):
+        self.app = app
+        self.timing_headers = timing_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        status = 500
+
+        async def send_with_metrics(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.timing_headers:
+                    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings]
+                    entries.append(f"total;dur={(time.perf_counter() - started) * 1000:.2f}")
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", ", ".join(entries).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # Label by route template to keep cardinality bounded
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status)
+            HTTP_DURATION.observe(time.perf_counter() - started, route=route)
+            _request_timings.reset(token)
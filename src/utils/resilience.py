@@ -0,0 +1,137 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class UpstreamError(Exception):
+    """An upstream call failed; ``retryable`` says whether trying again may help"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None, retryable: bool = True):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without calling upstream while the circuit breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f}s", status=503, retry_after=retry_after, retryable=False)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Read a Retry-After header given in seconds; HTTP dates are ignored"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    ``allow`` refuses calls for ``reset_timeout`` seconds. It then lets one
+    probe through per ``reset_timeout``: success closes it, failure keeps it
+    open.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, timer: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timer = timer
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.timer() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go upstream now"""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open":
+            # Restart the window so only this caller probes; a probe that never
+            # reports back (e.g. cancelled) just lets another through later
+            self.opened_at = self.timer()
+            return
+        remaining = self.reset_timeout - (self.timer() - self.opened_at)
+        raise CircuitOpenError(self.name, max(remaining, 1.0))
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = self.timer()
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies for picking a hedging delay"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Return the ``q``-th percentile, or None until enough samples are seen"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+async def hedged(fn: Callable[[], Awaitable[T]], delay: Optional[float]) -> T:
+    """Await ``fn()``; if it has not finished after ``delay`` seconds, race a second call
+
+    The first call to succeed wins and the other is cancelled. If one fails
+    the other is still awaited. With ``delay`` None no hedge is sent.
+    """
+    tasks = [asyncio.ensure_future(fn())]
+    try:
+        if delay is None:
+            return await tasks[0]
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return tasks[0].result()
+        tasks.append(asyncio.ensure_future(fn()))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
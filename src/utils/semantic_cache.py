@@ -0,0 +1,193 @@
+import json
+import os
+import re
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Common lay phrasings rewritten to lexicon terms before embedding, so that
+# "my head hurts a lot" and "severe headache" land next to each other.
+DEFAULT_PARAPHRASES: Sequence[Tuple[str, str]] = (
+    (r"\bmy\b|\bi have\b|\bi've got\b|\bi feel\b|\bfeeling\b", " "),
+    (r"\bhead (?:hurts|is hurting|aches|pain)\b", "headache"),
+    (r"\b(?:stomach|tummy|belly) (?:hurts|ache|aches)\b|\bstomachache\b|\btummy ache\b", "stomach pain"),
+    (r"\bback (?:hurts|aches)\b|\bbackache\b", "back pain"),
+    (r"\bthroat (?:hurts|is sore)\b", "sore throat"),
+    (r"\b(?:a lot|really bad|very bad|terrible|awful|intense|extreme)\b", "severe"),
+    (r"\b(?:a little|slight|slightly|a bit)\b", "mild"),
+    (r"\b(?:throwing up|being sick|puking)\b", "vomiting"),
+    (r"\b(?:feverish|temperature)\b", "fever"),
+    (r"\b(?:tired|exhausted|worn out)\b", "fatigue"),
+    (r"\b(?:dizzy|lightheaded|light-headed)\b", "dizziness"),
+)
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+# Filler words only; negations ("no", "not") are kept since they change meaning
+_STOPWORDS = frozenset(["a", "an", "and", "the", "with", "of", "some", "also", "am", "is", "it", "i", "me", "have", "has", "got"])
+
+
+class HashingVectorizer:
+    """Embed short texts as L2-normalized hashed bags of words and character n-grams
+
+    Word unigrams carry meaning; character n-grams within each word absorb
+    typos and inflections. Hashing with crc32 keeps vectors stable across
+    processes, so an index saved by one worker is valid in another. Word
+    order is ignored.
+    """
+
+    def __init__(self, n_features: int = 2 ** 10, ngram_range: Tuple[int, int] = (3, 4),
+                 paraphrases: Sequence[Tuple[str, str]] = DEFAULT_PARAPHRASES):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.paraphrases = [(re.compile(pattern), replacement) for pattern, replacement in paraphrases]
+
+    def normalize(self, text: str) -> List[str]:
+        text = text.lower()
+        for pattern, replacement in self.paraphrases:
+            text = pattern.sub(replacement, text)
+        return [token for token in _TOKEN.findall(text) if token not in _STOPWORDS]
+
+    def features(self, text: str) -> List[str]:
+        features = []
+        low, high = self.ngram_range
+        for word in self.normalize(text):
+            features.append(f"w:{word}")
+            padded = f" {word} "
+            for n in range(low, high + 1):
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def transform(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        features = self.features(text)
+        if not features:
+            return vector
+        indices = np.fromiter(
+            (zlib.crc32(feature.encode()) % self.n_features for feature in features),
+            dtype=np.int64, count=len(features),
+        )
+        # Words weigh as much as all the n-grams of a typical word together
+        weights = np.fromiter((4.0 if f.startswith("w:") else 1.0 for f in features), dtype=np.float32, count=len(features))
+        np.add.at(vector, indices, weights)
+        return vector / np.linalg.norm(vector)
+
+
+class SemanticCache:
+    """Nearest-neighbour cache over embedded texts, brute force with NumPy
+
+    Vectors live in one preallocated float32 matrix, so a lookup is a single
+    matrix-vector product. An entry is reused only when its cosine similarity
+    reaches ``threshold``, its ``scope`` (e.g. the request context) is equal
+    and its ``guard`` (e.g. the urgency-critical terms) is equal; both are
+    strings so entries can be saved as JSON. Entries expire after ``ttl``
+    seconds; when full the least recently used entry is replaced.
+    """
+
+    def __init__(self, maxsize: int = 2048, threshold: float = 0.9, ttl: float = 3600.0,
+                 vectorizer: Optional[HashingVectorizer] = None, timer: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.vectorizer = vectorizer or HashingVectorizer()
+        self.timer = timer
+        self.vectors = np.zeros((maxsize, self.vectorizer.n_features), dtype=np.float32)
+        self.expires_at = np.zeros(maxsize, dtype=np.float64)
+        self.last_used = np.zeros(maxsize, dtype=np.float64)
+        self.entries: List[Optional[Dict[str, Any]]] = [None] * maxsize
+        self.hits = 0
+        self.misses = 0
+        self.guard_rejections = 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.expires_at > self.timer()))
+
+    def get(self, text: str, scope: Optional[str] = None, guard: Optional[str] = None) -> Any:
+        """Return the value cached for the most similar text, or None"""
+        if self.maxsize <= 0:
+            return None
+        now = self.timer()
+        similarity = self.vectors @ self.vectorizer.transform(text)
+        similarity[self.expires_at <= now] = -1.0
+        candidates = np.flatnonzero(similarity >= self.threshold)
+        rejected = False
+        for index in candidates[np.argsort(-similarity[candidates])]:
+            entry = self.entries[index]
+            if entry["scope"] != scope:
+                continue
+            if entry["guard"] != guard:
+                rejected = True
+                continue
+            self.last_used[index] = now
+            self.hits += 1
+            return entry["value"]
+        self.misses += 1
+        self.guard_rejections += rejected
+        return None
+
+    def set(self, text: str, value: Any, scope: Optional[str] = None, guard: Optional[str] = None):
+        if self.maxsize <= 0:
+            return
+        now = self.timer()
+        vector = self.vectorizer.transform(text)
+        expired = np.flatnonzero(self.expires_at <= now)
+        index = int(expired[0]) if len(expired) else int(np.argmin(self.last_used))
+        self.vectors[index] = vector
+        self.expires_at[index] = now + self.ttl
+        self.last_used[index] = now
+        self.entries[index] = {"text": text, "scope": scope, "guard": guard, "value": value}
+
+    def clear(self):
+        self.vectors[:] = 0
+        self.expires_at[:] = 0
+        self.last_used[:] = 0
+        self.entries = [None] * self.maxsize
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "guard_rejections": self.guard_rejections,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self, path: str, encode: Callable[[Any], Any] = lambda value: value):
+        """Write live entries to ``path`` (.npz); ``encode`` makes values JSON-serializable"""
+        live = np.flatnonzero(self.expires_at > self.timer())
+        meta = [dict(self.entries[i], value=encode(self.entries[i]["value"])) for i in live]
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp,
+            vectors=self.vectors[live],
+            expires_at=self.expires_at[live],
+            last_used=self.last_used[live],
+            meta=np.array(json.dumps(meta)),
+        )
+        os.replace(tmp, path)
+
+    def load(self, path: str, decode: Callable[[Any], Any] = lambda value: value) -> int:
+        """Replace the contents with entries saved by ``save``; returns how many were still live"""
+        if not os.path.exists(path):
+            return 0
+        with np.load(path, allow_pickle=False) as data:
+            if data["vectors"].shape[1:] != self.vectors.shape[1:]:
+                return 0
+            meta = json.loads(str(data["meta"]))
+            self.clear()
+            order = np.argsort(-data["last_used"])[:self.maxsize]
+            loaded = 0
+            now = self.timer()
+            for slot, i in enumerate(order):
+                if data["expires_at"][i] <= now:
+                    continue
+                self.vectors[slot] = data["vectors"][i]
+                self.expires_at[slot] = data["expires_at"][i]
+                self.last_used[slot] = data["last_used"][i]
+                self.entries[slot] = dict(meta[i], value=decode(meta[i]["value"]))
+                loaded += 1
+        return loaded
+
@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+def connect_sqlite(path: str, busy_timeout: float = 5.0) -> sqlite3.Connection:
+    """Open a SQLite connection that several worker processes can share
+
+    WAL mode lets readers proceed while another process writes, and the busy
+    timeout makes concurrent writers wait for the lock instead of failing.
+    """
+    conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+    if path != ":memory:":
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+@contextmanager
+def file_lock(path: str):
+    """Hold an exclusive advisory lock on ``path`` across processes
+
+    Threads of one process are not excluded from each other; pair with a
+    threading.Lock where that matters. A no-op where fcntl is unavailable.
+    """
+    if fcntl is None:  # pragma: no cover - Windows
+        yield
+        return
+    with open(path, "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class SQLiteSharedCache:
+    """String values with expiry in a SQLite file, shared by the workers on one host
+
+    Expired rows are treated as missing and purged periodically on write.
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str, namespace: str = "default", timer=time.time):
+        self.namespace = namespace
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self._conn = connect_sqlite(path)
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_cache ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value FROM shared_cache WHERE namespace = ? AND key IN ({placeholders}) AND expires_at > ?",
+                [self.namespace, *keys, self.timer()],
+            ).fetchall()
+        self.hits += len(rows)
+        self.misses += len(keys) - len(rows)
+        return dict(rows)
+
+    def set(self, key: str, value: str, ttl: float):
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, values: Dict[str, str], ttl: float):
+        now = self.timer()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO shared_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                [(self.namespace, key, value, now + ttl) for key, value in values.items()],
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (now,))
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM shared_cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisSharedCache:
+    """String values with expiry in Redis, shared by workers on any number of hosts
+
+    Uses the blocking client: lookups are a single round trip to a nearby
+    server, well under the cost of the Gemini or Fit call they save.
+    """
+
+    def __init__(self, url: str, namespace: str = "default", client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("SHARED_CACHE_URL points at Redis but the redis package is not installed") from e
+            client = redis.Redis.from_url(url, socket_timeout=1.0, decode_responses=True)
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._client = client
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[str]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._client.mget([self._key(key) for key in keys])
+        found = {key: value for key, value in zip(keys, values) if value is not None}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: str, ttl: float):
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, values: Dict[str, str], ttl: float):
+        pipeline = self._client.pipeline()
+        for key, value in values.items():
+            pipeline.set(self._key(key), value, px=max(int(ttl * 1000), 1))
+        pipeline.execute()
+
+    def delete(self, key: str):
+        self._client.delete(self._key(key))
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        self._client.close()
+
+
+def create_shared_cache(namespace: str):
+    """Build the cache named by SHARED_CACHE_URL, or None if unset
+
+    ``redis://`` and ``rediss://`` URLs use Redis; anything else is a SQLite
+    file path (``sqlite:///`` prefix optional).
+    """
+    url = os.getenv("SHARED_CACHE_URL", "")
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedCache(url, namespace)
+    return SQLiteSharedCache(url[len("sqlite:///"):] if url.startswith("sqlite:///") else url, namespace)
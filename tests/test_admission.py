@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from src.utils.admission import ROUTINE, URGENT, AdmissionController, AdmissionRejected
+
+
+async def _hold(controller, tenant, priority, order, release):
+    async with controller.slot(tenant, priority):
+        order.append((tenant, priority))
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_urgent_waiters_are_admitted_first():
+    controller = AdmissionController(max_concurrent=1, per_tenant=10, max_queue=10)
+    order = []
+    release = asyncio.Event()
+    holder = asyncio.ensure_future(_hold(controller, "a", ROUTINE, order, release))
+    await asyncio.sleep(0)
+    waiters = [
+        asyncio.ensure_future(_hold(controller, "b", ROUTINE, order, release)),
+        asyncio.ensure_future(_hold(controller, "c", URGENT, order, release)),
+    ]
+    await asyncio.sleep(0)
+    assert controller.queued == 2
+    release.set()
+    await asyncio.gather(holder, *waiters)
+    assert order == [("a", ROUTINE), ("c", URGENT), ("b", ROUTINE)]
+    assert controller.active == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds_routine_but_displaces_for_urgent():
+    controller = AdmissionController(max_concurrent=1, per_tenant=10, max_queue=1)
+    await controller.acquire("a")
+    routine = asyncio.ensure_future(controller.acquire("b"))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as shed:
+        await controller.acquire("c")
+    assert shed.value.status_code == 503
+    assert shed.value.retry_after >= 1
+
+    urgent = asyncio.ensure_future(controller.acquire("d", URGENT))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected):
+        await routine
+    controller.release("a")
+    await urgent
+    assert controller.active_by_tenant == {"d": 1}
+
+
+@pytest.mark.asyncio
+async def test_queue_wait_is_bounded():
+    controller = AdmissionController(max_concurrent=1, queue_timeout=0.01)
+    await controller.acquire("a")
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire("b")
+    assert controller.queued == 0
+    controller.release("a")
+    assert controller.active == 0
+
+
+@pytest.mark.asyncio
+async def test_tenant_limit_does_not_block_other_tenants():
+    controller = AdmissionController(max_concurrent=3, per_tenant=1)
+    await controller.acquire("a")
+    waiting = asyncio.ensure_future(controller.acquire("a"))
+    await asyncio.sleep(0)
+    await controller.acquire("b")
+    assert not waiting.done()
+    controller.release("a")
+    await waiting
+    assert controller.active_by_tenant == {"a": 1, "b": 1}
+
+
+@pytest.mark.asyncio
+async def test_tenant_rate_limit_returns_429():
+    controller = AdmissionController(tenant_rate=1, tenant_burst=1)
+    await controller.acquire("a")
+    with pytest.raises(AdmissionRejected) as limited:
+        await controller.acquire("a")
+    assert limited.value.status_code == 429
@@ -1,3 +1,7 @@
+import pytest
+from src.core.analysis import perform_analysis, summarize_batch
+from src.models.symptom import Symptom, SymptomBatch
+
 def test_preliminary_analysis():
     # Sample input for testing
     symptoms = {
@@ -41,4 +45,51 @@ def test_lifestyle_suggestions():
     result = get_lifestyle_suggestions(symptoms)
     
     # Assert the expected output matches the result
-    assert result == expected_suggestions, f"Expected {expected_suggestions}, but got {result}"
\ No newline at end of file
+    assert result == expected_suggestions, f"Expected {expected_suggestions}, but got {result}"
+
+def test_summarize_batch():
+    summary = summarize_batch(["LOW", "EMERGENCY", None, "LOW"], ["rules", "rules", "gemini", "gemini"])
+    assert summary == {
+        "total": 4,
+        "by_urgency": {"EMERGENCY": 1, "LOW": 2, "UNRESOLVED": 1},
+        "by_source": {"gemini": 2, "rules": 2},
+    }
+
+
+def test_perform_analysis_accepts_objects_and_batches():
+    symptoms = [Symptom("headache", 2, 1), Symptom("fever", 7, 2), Symptom("headache", 6, 3)]
+    batch = SymptomBatch.from_columns(["headache", "fever", "headache"], [2, 7, 6], [1, 2, 3])
+
+    result = perform_analysis(symptoms)
+    assert perform_analysis(batch) == result
+    assert result["average_severity"] == 5
+    assert result["suggestions"] == "Consider rest and monitor your symptoms."
+    assert result["severity_percentiles"]["p50"] == 6
+    assert list(result["suggestion_buckets"].values()) == [1, 0, 2]
+    assert result["severity_by_symptom"] == {"headache": 4.0, "fever": 7.0}
+
+
+def test_fractional_and_large_severities_match_per_object_average():
+    for severities in ([2.5, 3.5], [1.25, 2.0, 9.75], [300, 40]):
+        symptoms = [Symptom(f"s{i}", severity, 1) for i, severity in enumerate(severities)]
+        baseline = sum(symptom.severity for symptom in symptoms) / len(symptoms)
+        assert perform_analysis(symptoms)["average_severity"] == pytest.approx(baseline)
+        batch = SymptomBatch.from_columns([symptom.name for symptom in symptoms], severities, [1] * len(symptoms))
+        assert perform_analysis(batch) == perform_analysis(symptoms)
+    assert perform_analysis([Symptom("a", 2.5, 1), Symptom("b", 3.5, 1)])["average_severity"] == 3.0
+
+
+def test_symptoms_are_hashable():
+    symptoms = {Symptom("cough", 3, 4), Symptom("cough", 3, 4), Symptom("rash", 1, 2)}
+    assert len(symptoms) == 2
+    assert {Symptom("cough", 3, 4): "seen"}[Symptom("cough", 3.0, 4)] == "seen"
+
+
+def test_symptom_batch_round_trip():
+    symptoms = [Symptom("cough", 3, 4), Symptom("rash", 1, 2)]
+    batch = SymptomBatch.from_symptoms(symptoms)
+    assert len(batch) == 2
+    assert list(batch) == symptoms
+    assert batch.severity.dtype.itemsize == 4
+    with pytest.raises(ValueError):
+        perform_analysis(SymptomBatch.from_symptoms([]))
@@ -1,6 +1,9 @@
 import pytest
 from fastapi.testclient import TestClient
 from src.app import app
+from src.api.clients import ClientProvider, get_gemini_provider
+from src.utils.resilience import CircuitOpenError
+from src.utils.admission import AdmissionController
 
 client = TestClient(app)
 
@@ -68,4 +71,52 @@ async def test_gemini_client(mocker):
     
     assert result.urgency_level == "MEDIUM"
     assert len(result.recommended_actions) == 2
-    assert len(result.lifestyle_recommendations) == 2
\ No newline at end of file
+    assert len(result.lifestyle_recommendations) == 2
+
+def test_ready_reports_cold_backends():
+    """Importing the app builds no clients; readiness reflects that"""
+    response = client.get("/api/ready")
+    assert response.status_code == 503
+    assert set(response.json()["backends"]) == {"gemini", "google_fit"}
+
+
+def test_decisive_symptoms_skip_gemini():
+    """Red-flag symptoms are answered locally without building a Gemini client"""
+    async def failing_factory():
+        raise AssertionError("Gemini should not be built")
+
+    app.dependency_overrides[get_gemini_provider] = lambda: ClientProvider("gemini", failing_factory)
+    try:
+        response = client.post("/api/analyze_symptoms", json={"symptoms": ["chest pain"]})
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    assert response.json()["urgency_level"] == "EMERGENCY"
+
+
+def test_gemini_outage_falls_back_to_local_triage():
+    """When Gemini fails, non-decisive symptoms still get a conservative local answer"""
+    class DownClient:
+        async def analyze_symptoms(self, symptoms, context=None):
+            raise CircuitOpenError("Gemini", 30)
+
+    async def factory():
+        return DownClient()
+
+    app.dependency_overrides[get_gemini_provider] = lambda: ClientProvider("gemini", factory)
+    try:
+        response = client.post("/api/analyze_symptoms", json={"symptoms": ["headache", "nausea"]})
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    assert response.json()["urgency_level"] == "MEDIUM"
+
+
+def test_overloaded_gemini_requests_are_shed(monkeypatch):
+    """With no upstream slots or queue left, routine requests get a fast 503"""
+    import src.app
+
+    monkeypatch.setattr(src.app, "admission", AdmissionController(max_concurrent=0, max_queue=0))
+    response = client.post("/api/analyze_symptoms", json={"symptoms": ["headache", "nausea"]})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
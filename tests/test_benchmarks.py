@@ -0,0 +1,34 @@
+import json
+import asyncio
+from benchmarks.run import main, parse_args, run_benchmarks
+
+
+def test_benchmark_smoke(monkeypatch, tmp_path):
+    """Every scenario runs end to end against the local fakes"""
+    monkeypatch.setenv("GOOGLE_API_KEY", "benchmark")
+    monkeypatch.setenv("GEMINI_API_BASE", "http://unused")
+    args = parse_args(["--concurrency", "1,4", "--requests", "8", "--latency", "0", "--jitter", "0", "--fit-latency", "0"])
+    results = asyncio.run(run_benchmarks(args))
+
+    assert {row["scenario"] for row in results} == {"analyze", "followup", "health", "stream"}
+    assert all(row["errors"] == 0 and row["requests"] == 8 for row in results)
+    assert sum(row["gemini_calls"] for row in results if row["scenario"] == "followup") > 0
+    assert sum(row["fit_calls"] for row in results if row["scenario"] == "health") > 0
+
+
+def test_p95_budget_fails_run(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "benchmark")
+    monkeypatch.setenv("GEMINI_API_BASE", "http://unused")
+    assert main(["--scenario", "followup", "--concurrency", "1", "--requests", "2",
+                 "--latency", "0.05", "--jitter", "0", "--fail-p95-ms", "1"]) == 1
+
+
+def test_clarifying_benchmark_smoke(tmp_path):
+    from benchmarks import clarifying
+
+    output = tmp_path / "clarifying.json"
+    assert clarifying.main(["--queries", "200", "--json", str(output)]) == 0
+    result = json.loads(output.read_text())
+    assert result["queries"] == 200
+    assert result["answered"] > 100
+    assert clarifying.main(["--queries", "50", "--fail-p99-us", "0"]) == 1
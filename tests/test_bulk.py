@@ -0,0 +1,176 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from src.api.gemini import HealthAnalysisResponse
+from src.bulk import BulkRunner, JsonlResultWriter, LatencyReservoir, load_checkpoint, main, read_records
+from src.utils.resilience import UpstreamError
+
+
+class SlowGemini:
+    """Answers after a random delay, failing for symptoms containing "fail"; records overlap"""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def analyze_symptoms(self, symptoms, context=None):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.random.uniform(0, 0.01))
+        finally:
+            self.active -= 1
+        if "fail" in symptoms[0]:
+            raise UpstreamError("Gemini API error: 503", status=503)
+        return HealthAnalysisResponse(
+            urgency_level="LOW", initial_assessment=f"Looked at {symptoms[0]}", recommended_actions=["Rest"],
+            lifestyle_recommendations=[], warning_signs=[],
+        )
+
+
+def _archive(path, count):
+    with open(path, "w") as archive:
+        for i in range(count):
+            archive.write(json.dumps({"id": f"r{i}", "symptoms": [f"back pain {i}"]}) + "\n")
+
+
+def _rows(path):
+    with open(path) as results:
+        return [json.loads(line) for line in results]
+
+
+def _run(runner, archive, output, checkpoint=None, limit=None):
+    state = load_checkpoint(checkpoint, str(archive)) if checkpoint else None
+    writer = JsonlResultWriter(str(output), state)
+    try:
+        return asyncio.run(runner.run(str(archive), writer, checkpoint, state, limit))
+    finally:
+        writer.close()
+
+
+def test_records_are_read_lazily_from_an_offset(tmp_path):
+    archive = tmp_path / "archive.jsonl"
+    archive.write_text('{"id": 1}\n\nnot json\n{"id": 2}\n')
+    records = list(read_records(str(archive)))
+    assert [line for line, _, _ in records] == [1, 3, 4]
+    assert isinstance(records[1][2], ValueError)
+    line, offset, _ = records[0]
+    assert [record for _, _, record in read_records(str(archive), offset, line)][-1] == {"id": 2}
+
+
+def test_rows_come_out_in_input_order_with_bounded_concurrency(tmp_path):
+    archive, output = tmp_path / "archive.jsonl", tmp_path / "results.jsonl"
+    _archive(archive, 60)
+    gemini = SlowGemini()
+    report = _run(BulkRunner(gemini, concurrency=4, flush_every=7, progress_every=0), archive, output)
+
+    rows = _rows(output)
+    assert [row["id"] for row in rows] == [f"r{i}" for i in range(60)]
+    assert all(row["source"] == "gemini" for row in rows)
+    assert rows[5]["analysis"]["initial_assessment"] == "Looked at back pain 5"
+    assert 1 < gemini.max_active <= 4
+    assert report["records"] == 60 and report["sources"] == {"gemini": 60}
+
+
+def test_rules_fallback_and_bad_records_do_not_stop_the_run(tmp_path):
+    archive, output = tmp_path / "archive.jsonl", tmp_path / "results.jsonl"
+    archive.write_text("\n".join([
+        json.dumps({"request_id": "chest", "message": "crushing chest pain"}),
+        json.dumps({"symptoms": "fail with back pain"}),
+        "{broken",
+        json.dumps({"context": {}}),
+        json.dumps({"symptoms": ["runny nose", "sneezing"]}),
+    ]) + "\n")
+    gemini = SlowGemini()
+    _run(BulkRunner(gemini, progress_every=0), archive, output)
+
+    rows = _rows(output)
+    assert [(row["id"], row["source"], row["urgency_level"]) for row in rows] == [
+        ("chest", "rules", "EMERGENCY"),
+        ("2", "fallback", "MEDIUM"),
+        ("3", "error", None),
+        ("4", "error", None),
+        ("5", "rules", "LOW"),
+    ]
+    assert rows[2]["error"].startswith("invalid JSON")
+    assert gemini.calls == 1
+
+
+def test_gemini_calls_are_rate_limited(tmp_path):
+    archive, output = tmp_path / "archive.jsonl", tmp_path / "results.jsonl"
+    _archive(archive, 5)
+    report = _run(BulkRunner(SlowGemini(), concurrency=5, rate=50, progress_every=0), archive, output)
+    # A burst of one, then one call every 20 ms
+    assert report["elapsed_s"] >= 0.07
+
+
+def test_interrupted_run_resumes_without_duplicates(tmp_path):
+    archive, output = tmp_path / "archive.jsonl", tmp_path / "results.jsonl"
+    checkpoint = str(tmp_path / "results.checkpoint")
+    _archive(archive, 25)
+
+    first = _run(BulkRunner(SlowGemini(), concurrency=3, flush_every=4, progress_every=0), archive, output, checkpoint, limit=10)
+    assert first["records"] == 10
+    # Rows written after the last checkpoint, e.g. by a crashed run, are discarded
+    with open(output, "a") as results:
+        results.write('{"id": "partial"')
+
+    second = _run(BulkRunner(SlowGemini(), concurrency=3, flush_every=4, progress_every=0), archive, output, checkpoint)
+    assert second["records"] == 15 and second["total_processed"] == 25
+    assert [row["id"] for row in _rows(output)] == [f"r{i}" for i in range(25)]
+
+
+def test_latency_reservoir_stays_bounded():
+    reservoir = LatencyReservoir(size=100, seed=0)
+    assert reservoir.percentiles([50]) == [0.0]
+    for value in range(10):
+        reservoir.add(float(value))
+    assert reservoir.percentiles([0, 100]) == [0.0, 9.0]
+    for value in range(10, 100_000):
+        reservoir.add(float(value))
+    assert reservoir.samples.shape == (100,) and reservoir.seen == 100_000
+    # A uniform sample keeps the median near the true one
+    assert 35_000 < reservoir.percentiles([50])[0] < 65_000
+
+
+def test_checkpoint_for_another_input_is_refused(tmp_path):
+    archive, output = tmp_path / "archive.jsonl", tmp_path / "results.jsonl"
+    _archive(archive, 3)
+    _run(BulkRunner(SlowGemini(), progress_every=0), archive, output, str(tmp_path / "cp"))
+    with pytest.raises(ValueError):
+        load_checkpoint(str(tmp_path / "cp"), str(tmp_path / "other.jsonl"))
+
+
+def test_dry_run_against_local_stand_in(tmp_path, capsys, monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "dry-run")
+    monkeypatch.setenv("GEMINI_API_BASE", "http://unused")
+    archive, output = tmp_path / "archive.jsonl", tmp_path / "results.jsonl"
+    _archive(archive, 6)
+    report = tmp_path / "report.json"
+    assert main([str(archive), str(output), "--dry-run", "--dry-run-latency", "0", "--concurrency", "3",
+                 "--rate", "1000", "--json", str(report)]) == 0
+    assert [row["source"] for row in _rows(output)] == ["gemini"] * 6
+    assert json.loads(report.read_text())["records"] == 6
+    assert "6 records" in capsys.readouterr().out
+
+    # Running again resumes at the end and processes nothing new
+    assert main([str(archive), str(output), "--rules-only"]) == 0
+    assert len(_rows(output)) == 6
+
+
+def test_parquet_output(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    archive = tmp_path / "archive.jsonl"
+    _archive(archive, 5)
+    assert main([str(archive), str(tmp_path / "results.parquet"), "--rules-only", "--flush-every", "2"]) == 0
+    parts = sorted(tmp_path.glob("results-*.parquet"))
+    assert len(parts) == 3
+    assert sum(pyarrow.parquet.read_table(part).num_rows for part in parts) == 5
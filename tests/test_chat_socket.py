@@ -0,0 +1,253 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from src.app import app
+from src.api.clients import ClientProvider, get_gemini_provider, get_google_fit_provider
+from src.api.session_store import MemorySessionStore, get_session_store
+from src.utils.admission import AdmissionController
+from src.utils.concurrency import Outbox, SlowConsumer
+
+ANALYSIS = {
+    "urgency_level": "MEDIUM",
+    "initial_assessment": "Likely a strain",
+    "recommended_actions": ["Rest"],
+    "lifestyle_recommendations": ["Stretch"],
+    "warning_signs": ["Numbness"],
+}
+
+
+class StreamingGemini:
+    def __init__(self):
+        self.analyses = 0
+        self.follow_ups = 0
+
+    async def stream_analysis(self, symptoms, context=None):
+        self.analyses += 1
+        text = json.dumps(ANALYSIS)
+        for start in range(0, len(text), 40):
+            yield {"event": "delta", "text": text[start:start + 40]}
+        for name, value in ANALYSIS.items():
+            yield {"event": "field", "name": name, "value": value}
+        yield {"event": "result", "data": ANALYSIS}
+
+    async def generate_follow_up(self, conversation_history, summary=None):
+        self.follow_ups += 1
+        return ["When did it start?"]
+
+
+class ChangingFit:
+    """Returns each summary in turn, then repeats the last one"""
+
+    def __init__(self, summaries):
+        self.summaries = summaries
+        self.calls = 0
+
+    async def get_health_summary(self, days):
+        self.calls += 1
+        return self.summaries[min(self.calls, len(self.summaries)) - 1]
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    gemini, fit, store = StreamingGemini(), ChangingFit([{"steps": 4000.0}]), MemorySessionStore()
+
+    async def gemini_factory():
+        return gemini
+
+    async def fit_factory():
+        return fit
+
+    monkeypatch.setattr("src.app.CHAT_HEALTH_REFRESH", 0.01)
+    app.dependency_overrides[get_gemini_provider] = lambda: ClientProvider("gemini", gemini_factory)
+    app.dependency_overrides[get_google_fit_provider] = lambda: ClientProvider("google_fit", fit_factory)
+    app.dependency_overrides[get_session_store] = lambda: store
+    try:
+        yield TestClient(app), gemini, fit, store
+    finally:
+        app.dependency_overrides.clear()
+
+
+def _until(websocket, event):
+    events = []
+    while not events or events[-1]["event"] != event:
+        events.append(websocket.receive_json())
+    return events
+
+
+def test_turn_streams_analysis_and_questions(chat):
+    client, gemini, _, store = chat
+    with client.websocket_connect("/api/chat") as websocket:
+        session_id = websocket.receive_json()["session_id"]
+        assert websocket.receive_json() == {"event": "health", "summary": {"steps": 4000.0}}
+
+        websocket.send_json({"type": "turn", "id": "t1", "message": "strange feeling after dinner", "input": "voice"})
+        events = _until(websocket, "turn_end")
+
+    kinds = [event["event"] for event in events]
+    assert kinds[0] == "turn_start" and events[0]["id"] == "t1"
+    assert "delta" in kinds and kinds.index("result") > kinds.index("field")
+    assert {"event": "questions", "questions": ["When did it start?"], "source": "gemini"} in events
+    assert events[-1] == {"event": "turn_end", "id": "t1", "sources": {"analysis": "gemini", "questions": "gemini"}}
+    assert gemini.analyses == 1 and gemini.follow_ups == 1
+
+    session = store.get(session_id)
+    assert session.history[0]["user"] == "strange feeling after dinner"
+    assert session.context == {"fitness": {"steps": 4000.0}}
+
+
+def test_rules_answer_without_gemini(chat):
+    client, gemini, _, _ = chat
+    with client.websocket_connect("/api/chat") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "turn", "message": "runny nose and sneezing"})
+        events = [event for event in _until(websocket, "turn_end") if event["event"] != "health"]
+
+    assert events[-1]["sources"] == {"analysis": "rules", "questions": "rules"}
+    assert next(event for event in events if event["event"] == "result")["data"]["urgency_level"] == "LOW"
+    assert gemini.analyses == 0 and gemini.follow_ups == 0
+
+
+def test_mixed_free_text_goes_to_gemini(chat):
+    client, gemini, _, _ = chat
+    with client.websocket_connect("/api/chat") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "turn", "message": "mild pain in my chest and left arm"})
+        events = _until(websocket, "turn_end")
+
+    assert events[-1]["sources"] == {"analysis": "gemini", "questions": "gemini"}
+    assert gemini.analyses == 1 and gemini.follow_ups == 1
+
+
+def test_rules_answer_is_sent_when_gemini_is_shed(chat, monkeypatch):
+    client, gemini, _, _ = chat
+    monkeypatch.setattr("src.app.admission", AdmissionController(max_concurrent=0, max_queue=0))
+    with client.websocket_connect("/api/chat") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "turn", "message": "crushing chest pain and my left hand feels weird"})
+        events = [event for event in _until(websocket, "turn_end") if event["event"] != "health"]
+
+    assert next(event for event in events if event["event"] == "result")["data"]["urgency_level"] == "EMERGENCY"
+    assert next(event for event in events if event["event"] == "questions")["source"] == "fallback"
+    assert events[-1]["sources"] == {"analysis": "rules", "questions": "fallback"}
+    assert gemini.follow_ups == 0
+
+
+def test_health_is_pushed_only_when_it_changes(chat):
+    client, _, fit, _ = chat
+    fit.summaries = [{"steps": 1.0}, {"steps": 1.0}, {"steps": 1.0}, {"steps": 2.0}]
+    with client.websocket_connect("/api/chat") as websocket:
+        websocket.receive_json()
+        assert websocket.receive_json()["summary"] == {"steps": 1.0}
+        assert websocket.receive_json()["summary"] == {"steps": 2.0}
+        while fit.calls < 6:
+            websocket.send_json({"type": "ping"})
+            assert websocket.receive_json() == {"event": "pong"}
+
+
+def test_existing_session_and_unknown_session(chat):
+    client, _, _, store = chat
+    session_id = client.post("/api/sessions").json()["session_id"]
+    with client.websocket_connect(f"/api/chat?session_id={session_id}") as websocket:
+        assert websocket.receive_json() == {"event": "session", "session_id": session_id}
+
+    with client.websocket_connect("/api/chat?session_id=missing") as websocket:
+        assert websocket.receive_json()["event"] == "error"
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 4404
+
+
+def test_bad_messages_get_errors(chat):
+    client, _, _, _ = chat
+    with client.websocket_connect("/api/chat") as websocket:
+        websocket.receive_json()
+        websocket.send_text("not json")
+        websocket.send_json({"type": "turn", "message": "  "})
+        errors = [event for event in (websocket.receive_json() for _ in range(3)) if event["event"] == "error"]
+    assert len(errors) == 2
+
+
+def test_idle_connections_are_closed(chat, monkeypatch):
+    client, _, _, _ = chat
+    monkeypatch.setattr("src.app.CHAT_IDLE_TIMEOUT", 0.05)
+    monkeypatch.setattr("src.app.CHAT_HEALTH_REFRESH", 0)
+    with client.websocket_connect("/api/chat") as websocket:
+        websocket.receive_json()
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 1000
+
+
+def test_pings_do_not_keep_an_idle_chat_open(chat, monkeypatch):
+    client, _, _, _ = chat
+    monkeypatch.setattr("src.app.CHAT_IDLE_TIMEOUT", 0.2)
+    monkeypatch.setattr("src.app.CHAT_HEALTH_REFRESH", 0)
+    with client.websocket_connect("/api/chat") as websocket:
+        websocket.receive_json()
+        with pytest.raises(WebSocketDisconnect) as closed:
+            for _ in range(50):
+                websocket.send_json({"type": "ping"})
+                assert websocket.receive_json() == {"event": "pong"}
+                time.sleep(0.02)
+    assert closed.value.code == 1000
+
+
+class FailingStreamGemini(StreamingGemini):
+    """Fails part-way through the analysis while the follow-up is still pending"""
+
+    async def stream_analysis(self, symptoms, context=None):
+        yield {"event": "field", "name": "urgency_level", "value": "MEDIUM"}
+        raise RuntimeError("stream broke")
+
+    async def generate_follow_up(self, conversation_history, summary=None):
+        self.follow_ups += 1
+        await asyncio.sleep(0.05)
+        return ["When did it start?"]
+
+
+def test_failed_analysis_cancels_its_questions(chat):
+    client, _, _, _ = chat
+    gemini = FailingStreamGemini()
+
+    async def factory():
+        return gemini
+
+    app.dependency_overrides[get_gemini_provider] = lambda: ClientProvider("gemini", factory)
+    with client.websocket_connect("/api/chat") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "turn", "id": "t1", "message": "strange feeling after dinner"})
+        events = _until(websocket, "error")
+        time.sleep(0.1)
+        websocket.send_json({"type": "ping"})
+        events += _until(websocket, "pong")
+
+    assert gemini.follow_ups == 1
+    assert [event["event"] for event in events if event["event"] in ("questions", "turn_end")] == []
+
+
+def test_outbox_drops_optional_messages_and_gives_up_on_stalled_consumers():
+    async def scenario():
+        outbox = Outbox(maxsize=2, timeout=0.02)
+        await outbox.put("field")
+        assert outbox.offer("delta")
+        assert not outbox.offer("delta")
+        assert outbox.dropped == 1
+        with pytest.raises(SlowConsumer):
+            await outbox.put("result")
+
+        # A consumer that keeps up lets put through
+        async def consume():
+            await asyncio.sleep(0.005)
+            return await outbox.get()
+
+        consumer = asyncio.ensure_future(consume())
+        await outbox.put("result")
+        assert await consumer == "field"
+        assert len(outbox) == 2
+
+    asyncio.run(scenario())
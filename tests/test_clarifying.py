@@ -0,0 +1,114 @@
+import json
+import os
+from src.core.clarifying import ClarifyingQuestionIndex, DEFAULT_KNOWLEDGE_BASE, ReloadingIndex, expand_knowledge_base
+from src.core.triage import ask_clarifying_questions, local_clarifying_questions
+
+KNOWLEDGE_BASE = {
+    "symptoms": [
+        {"symptom": "headache", "synonyms": ["head hurts"], "questions": ["How long have you had the headache?"]},
+        {"symptom": "fever", "synonyms": ["high temperature"], "questions": ["What is your temperature?"]},
+    ],
+    "sites": {"knee": ["knees"], "ankle": []},
+    "templates": [
+        {"symptom": "{site} pain", "synonyms": ["sore {site}"], "questions": ["Where in your {site} does it hurt?"]},
+    ],
+}
+
+
+def _index():
+    return ClarifyingQuestionIndex(expand_knowledge_base(KNOWLEDGE_BASE))
+
+
+def test_templates_expand_per_site_and_alias():
+    entries = expand_knowledge_base(KNOWLEDGE_BASE)
+    knee = next(entry for entry in entries if entry["symptom"] == "knee pain")
+    assert "sore knees" in knee["synonyms"]
+    assert knee["questions"] == ["Where in your knee does it hurt?"]
+    assert len(entries) == 4
+
+
+def test_lookup_matches_phrases_inside_free_text():
+    index = _index()
+    assert index.questions("bad headache since morning") == ["How long have you had the headache?"]
+    assert index.questions("my knees are sore") == ["Where in your knee does it hurt?"]
+
+
+def test_misspellings_match_fuzzily():
+    [(entry, score)] = _index().lookup("hedache")
+    assert entry["symptom"] == "headache"
+    assert 0.6 <= score < 1.0
+
+
+def test_negated_and_unknown_symptoms_do_not_match():
+    index = _index()
+    assert index.lookup("no fever") == []
+    assert index.lookup("strange feeling") == []
+    assert index.lookup("pain") == []
+
+
+def test_synonyms_that_start_with_a_negation_match():
+    index = ClarifyingQuestionIndex.from_file(DEFAULT_KNOWLEDGE_BASE)
+    for text, symptom in [
+        ("no appetite", "loss of appetite"),
+        ("I'm not eating", "loss of appetite"),
+        ("not hungry at all", "loss of appetite"),
+        ("no bowel movement since monday", "constipation"),
+    ]:
+        assert index.lookup(text)[0][0]["symptom"] == symptom
+    assert local_clarifying_questions(["no appetite"])[0] == "How long have you had a reduced appetite?"
+    assert local_clarifying_questions(["not eating"])
+    # Other negated symptoms are still skipped
+    assert [entry["symptom"] for entry, _ in index.lookup("no fever but a cough")] == ["cough"]
+
+
+def test_bundled_knowledge_base_is_large_and_keeps_original_questions():
+    index = ClarifyingQuestionIndex.from_file(DEFAULT_KNOWLEDGE_BASE)
+    assert index.phrase_count > 5000
+    assert ask_clarifying_questions("Headache") == "How long have you been experiencing the headache?"
+    assert ask_clarifying_questions("fever") == "What is your current temperature?"
+    assert ask_clarifying_questions("cough") == "Is the cough dry or productive?"
+    assert ask_clarifying_questions("zzz") == "Can you provide more details about your symptom?"
+
+
+def test_local_questions_need_every_symptom_recognized():
+    assert local_clarifying_questions(["sore throat", "fever"])[:2] == [
+        "Does it hurt to swallow?", "What is your current temperature?"
+    ]
+    assert local_clarifying_questions(["sore throat", "strange feeling"]) is None
+    # Every word must be accounted for, not just one recognized symptom
+    assert local_clarifying_questions(["mild pain in my chest and left arm"]) is None
+    assert local_clarifying_questions(["bad headache since morning"])[0].endswith("headache?")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_index_reloads_when_file_changes(tmp_path):
+    path = tmp_path / "questions.json"
+    path.write_text(json.dumps(KNOWLEDGE_BASE))
+    clock = Clock()
+    reloading = ReloadingIndex(str(path), interval=5, timer=clock)
+    assert reloading.get().questions("cough") == []
+
+    updated = dict(KNOWLEDGE_BASE, symptoms=[{"symptom": "cough", "questions": ["Dry or wet?"]}])
+    path.write_text(json.dumps(updated))
+    os.utime(path, ns=(1, 1))
+    assert reloading.get().questions("cough") == []  # not checked yet
+    clock.now = 5
+    reloading.get()
+    reloading.wait(5)
+    assert reloading.get().questions("cough") == ["Dry or wet?"]
+
+    # A broken edit keeps the last good index
+    path.write_text("{not json")
+    os.utime(path, ns=(2, 2))
+    clock.now = 10
+    reloading.get()
+    reloading.wait(5)
+    assert reloading.get().questions("cough") == ["Dry or wet?"]
+    assert reloading.reloads == 2
@@ -0,0 +1,41 @@
+import asyncio
+import pytest
+from src.api.clients import ClientProvider
+
+
+@pytest.mark.asyncio
+async def test_provider_builds_once_for_concurrent_callers():
+    builds = 0
+
+    async def factory():
+        nonlocal builds
+        builds += 1
+        await asyncio.sleep(0.01)
+        return object()
+
+    provider = ClientProvider("test", factory)
+    assert provider.status() == "cold"
+    provider.warm()
+    assert provider.status() == "warming"
+    first, second = await asyncio.gather(provider.get(), provider.get())
+    assert first is second
+    assert builds == 1
+    assert provider.status() == "ready"
+
+
+@pytest.mark.asyncio
+async def test_failed_build_is_retried():
+    attempts = 0
+
+    async def factory():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RuntimeError("token refresh failed")
+        return "client"
+
+    provider = ClientProvider("test", factory)
+    with pytest.raises(RuntimeError):
+        await provider.get()
+    assert provider.status() == "failed"
+    assert await provider.get() == "client"
@@ -0,0 +1,51 @@
+from src.core.conversation import ConversationSummary, compact_history, estimate_tokens, format_turn
+
+
+def _turn(index):
+    return {"user": f"Day {index}: I still have a headache and some fever", "assistant": f"Question {index}?"}
+
+
+def test_short_history_is_kept_verbatim():
+    history = [_turn(1), _turn(2)]
+    summary, recent = compact_history(history, token_budget=1000, recent_turns=6)
+    assert recent == history
+    assert summary.turns == 0
+    assert summary.render() == ""
+
+
+def test_long_history_is_bounded_by_budget():
+    history = [_turn(i) for i in range(500)]
+    summary, recent = compact_history(history, token_budget=200, recent_turns=6)
+    prompt = summary.render() + "\n".join(format_turn(turn) for turn in recent)
+    assert estimate_tokens(prompt) <= 200
+    assert recent[-1] == history[-1]
+    assert summary.turns + len(recent) == 500
+    assert list(summary.symptoms) == ["headache", "fever"]
+    assert summary.highest_urgency == "MEDIUM"
+    assert len(summary.asked) == 5
+
+
+def test_recent_turn_limit():
+    history = [_turn(i) for i in range(10)]
+    summary, recent = compact_history(history, token_budget=10000, recent_turns=3)
+    assert recent == history[-3:]
+    assert summary.turns == 7
+
+
+def test_oversized_newest_turn_is_truncated():
+    history = [{"user": "chest pain " * 500, "assistant": ""}]
+    summary, recent = compact_history(history, token_budget=50, recent_turns=6)
+    assert estimate_tokens(format_turn(recent[0])) <= 51
+    assert recent[0]["user"].endswith("...")
+
+
+def test_summary_folds_turns_incrementally():
+    summary = ConversationSummary()
+    summary.add_turn({"user": "mild cough", "assistant": "Any fever?"})
+    summary.add_turn({"user": "now chest pain", "assistant": ""})
+    assert summary.highest_urgency == "EMERGENCY"
+    assert summary.asked == ["Any fever?"]
+
+    # Turns that store an analysis as the assistant message carry their questions
+    summary.add_turn({"user": "still coughing", "assistant": "Urgency Level: MEDIUM", "questions": ["Any phlegm?", " "]})
+    assert summary.asked == ["Any fever?", "Any phlegm?"]
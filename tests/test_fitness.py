@@ -0,0 +1,101 @@
+import numpy as np
+from src.core.fitness import (
+    IntradayWindow,
+    MinuteSeries,
+    SleepSegments,
+    heart_rate_features,
+    points_to_arrays,
+    rolling_baseline,
+    sleep_features,
+    summarize_features,
+)
+
+DAY = 86400
+START = 1_700_006_400  # a UTC midnight
+
+
+def _point(seconds, value, end=None, field="fpVal"):
+    return {
+        "startTimeNanos": str(seconds * 10 ** 9),
+        "endTimeNanos": str((end or seconds) * 10 ** 9),
+        "value": [{field: value}],
+    }
+
+
+def test_points_become_compact_arrays():
+    starts, ends, values = points_to_arrays([_point(START, 61.5), _point(START + 60, 7, START + 120, "intVal")])
+    assert starts.tolist() == [START, START + 60]
+    assert ends.tolist() == [START, START + 120]
+    assert values.dtype == np.float32 and values.tolist() == [61.5, 7.0]
+
+
+def test_minute_series_memory_is_fixed_by_window():
+    series = MinuteSeries(START, days=2)
+    before = series.nbytes
+    times = START + np.arange(0, 5 * DAY, 5)  # every 5 s, mostly outside the window
+    series.add(times, np.full(len(times), 60.0, dtype=np.float32))
+    assert series.nbytes == before
+    assert series.coverage().tolist() == [1440, 1440]
+    assert np.allclose(series.means(), 60.0)
+
+
+def test_heart_rate_features_per_day():
+    series = MinuteSeries(START, days=2)
+    minutes = np.arange(1440)
+    # Day 0: 50 bpm at night, 80 bpm by day; day 1 has no data
+    bpm = np.where(minutes < 480, 50.0, 80.0).astype(np.float32)
+    series.add(START + minutes * 60, bpm)
+    features = heart_rate_features(series)
+    assert features["resting_hr"][0] == 50.0
+    assert features["max_hr"][0] == 80.0
+    assert 0 < features["hr_variability"][0] < 2
+    assert np.isnan(features["resting_hr"][1])
+
+
+def test_sleep_is_credited_to_the_wake_day_by_stage():
+    segments = SleepSegments(capacity=8)
+    night = START + DAY  # midnight into day 1
+    starts = np.array([night, night + 3600, night + 5 * 3600, night + 7 * 3600])
+    ends = np.array([night + 3600, night + 5 * 3600, night + 7 * 3600, night + 8 * 3600])
+    stages = np.array([4, 5, 6, 1], dtype=np.int8)  # light, deep, rem, awake
+    segments.add(starts, ends, stages)
+    features = sleep_features(segments, START, days=2)
+    assert np.isnan(features["sleep_hours"][0])
+    assert features["sleep_hours"][1] == 7.0
+    assert round(features["deep_sleep_percentage"][1], 1) == round(400 / 7, 1)
+    assert features["awake_hours"][1] == 1.0
+
+
+def test_sleep_segments_ring_is_bounded():
+    segments = SleepSegments(capacity=4)
+    starts = np.arange(10, dtype=np.int64)
+    segments.add(starts, starts + 1, np.full(10, 4, dtype=np.int8))
+    assert segments.size == 4
+    assert sorted(segments.arrays()[0].tolist()) == [6, 7, 8, 9]
+
+
+def test_rolling_baseline_skips_missing_days():
+    baseline = rolling_baseline(np.array([60.0, np.nan, 64.0, 70.0]), window=2)
+    assert np.isnan(baseline[0])
+    assert baseline[1] == 60.0
+    assert baseline[2] == 60.0
+    assert baseline[3] == 64.0
+
+
+def test_summary_reports_latest_day_against_baseline():
+    summary = summarize_features({
+        "resting_hr": np.array([60.0, 62.0, 70.04]),
+        "steps": np.array([8000.0, 9000.0, np.nan]),
+    }, baseline_days=2)
+    assert summary == {"resting_hr": 70.0, "resting_hr_vs_baseline": 9.0}
+
+
+def test_window_ingests_pages_by_kind():
+    window = IntradayWindow(START, days=1)
+    window.add_points("heart_rate", [_point(START + 60 * i, 55.0) for i in range(3)])
+    window.add_points("steps", [_point(START + 600, 120, field="intVal")])
+    window.add_points("sleep", [_point(START, 5, START + 3600, "intVal")])
+    features = window.features()
+    assert features["resting_hr"][0] == 55.0
+    assert features["steps"][0] == 120 and features["active_minutes"][0] == 1
+    assert features["sleep_hours"][0] == 1.0
@@ -0,0 +1,327 @@
+import asyncio
+import json
+import pytest
+from src.api.gemini import GeminiClient
+from src.utils.resilience import CircuitOpenError, UpstreamError
+
+
+class FakeResponse:
+    def __init__(self, payload, status=200, headers=None):
+        self.payload = payload
+        self.status = status
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def json(self):
+        return self.payload
+
+    async def text(self):
+        return str(self.payload)
+
+
+class FakeSession:
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+        self.closed = False
+
+    def post(self, url, headers=None, json=None, **kwargs):
+        self.calls += 1
+        return FakeResponse({"candidates": [{"content": {"parts": [{"text": self.text}]}}]})
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    return GeminiClient()
+
+
+@pytest.mark.asyncio
+async def test_session_is_shared_between_calls(client):
+    """The client reuses one pooled session instead of opening one per call"""
+    await client.start()
+    session = client._session
+    assert await client._get_session() is session
+    assert session.connector.limit_per_host == client.pool_limit_per_host
+    await client.close()
+    assert session.closed
+    assert client._session is None
+
+
+@pytest.mark.asyncio
+async def test_call_gemini_api_uses_shared_session(client):
+    """Every upstream call goes through the same session object"""
+    fake = FakeSession("hello")
+    client._session = fake
+    assert await client._call_gemini_api("a") == "hello"
+    assert await client._call_gemini_api("b") == "hello"
+    assert fake.calls == 2
+
+
+ANALYSIS_JSON = (
+    '{"urgency_level": "LOW", "initial_assessment": "Mild", '
+    '"recommended_actions": ["Rest"], "lifestyle_recommendations": ["Hydrate"], '
+    '"warning_signs": ["High fever"]}'
+)
+
+
+@pytest.mark.asyncio
+async def test_equivalent_symptoms_hit_analysis_cache(client):
+    """Case, whitespace and ordering differences share one cached analysis"""
+    fake = FakeSession(ANALYSIS_JSON)
+    client._session = fake
+    first = await client.analyze_symptoms(["Fever ", "cough"], {"age": 30, "sex": "f"})
+    second = await client.analyze_symptoms(["cough,  fever"], {"sex": "f", "age": 30})
+    assert first == second
+    assert fake.calls == 1
+    assert client.analysis_cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_prompts_share_one_request(client):
+    """A burst of identical follow-up prompts results in one upstream call"""
+    calls = 0
+
+    async def slow_request(prompt, generation_config):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return '["How long?"]'
+
+    client._request = slow_request
+    history = [{"user": "I have a headache", "assistant": "Since when?"}]
+    results = await asyncio.gather(*(client.generate_follow_up(history) for _ in range(5)))
+    assert results == [["How long?"]] * 5
+    assert calls == 1
+    assert len(client._inflight) == 0
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __aiter__(self):
+        return self._lines()
+
+    async def _lines(self):
+        for chunk in self.chunks:
+            event = {"candidates": [{"content": {"parts": [{"text": chunk}]}}]}
+            yield f"data: {json.dumps(event)}\r\n".encode()
+            yield b"\r\n"
+
+
+class FakeStreamingSession(FakeSession):
+    def post(self, url, headers=None, json=None, **kwargs):
+        self.calls += 1
+        response = FakeResponse({})
+        response.content = FakeStream([self.text[i:i + 20] for i in range(0, len(self.text), 20)])
+        return response
+
+
+@pytest.mark.asyncio
+async def test_stream_analysis_emits_fields_before_result(client):
+    """urgency_level is emitted as soon as it is complete, before the final result"""
+    client._session = FakeStreamingSession(ANALYSIS_JSON)
+    events = [event async for event in client.stream_analysis(["fever"])]
+    kinds = [event["event"] for event in events]
+    urgency = kinds.index("field")
+    assert events[urgency] == {"event": "field", "name": "urgency_level", "value": "LOW"}
+    assert urgency < len(events) - 2
+    assert events[-1]["event"] == "result"
+    assert events[-1]["data"]["warning_signs"] == ["High fever"]
+    assert "".join(e["text"] for e in events if e["event"] == "delta") == ANALYSIS_JSON
+
+    # The completed stream populates the regular analysis cache
+    assert (await client.analyze_symptoms(["fever"])).urgency_level == "LOW"
+    assert client._session.calls == 1
+
+
+class FlakySession(FakeSession):
+    """Answers with the given error statuses first, then succeeds"""
+
+    def __init__(self, text, statuses, retry_after=None):
+        super().__init__(text)
+        self.statuses = list(statuses)
+        self.retry_after = retry_after
+
+    def post(self, url, headers=None, json=None, **kwargs):
+        if self.statuses:
+            self.calls += 1
+            headers = {"Retry-After": self.retry_after} if self.retry_after else None
+            return FakeResponse({"error": "unavailable"}, status=self.statuses.pop(0), headers=headers)
+        return super().post(url, headers, json)
+
+
+@pytest.fixture
+def fast_retries(client):
+    client.backoff_base = 0.001
+    client.backoff_max = 0.001
+    return client
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried(fast_retries):
+    fake = FlakySession("hello", [503, 429])
+    fast_retries._session = fake
+    assert await fast_retries._call_gemini_api("a") == "hello"
+    assert fake.calls == 3
+    assert fast_retries.breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried(fast_retries):
+    fake = FlakySession("hello", [400])
+    fast_retries._session = fake
+    with pytest.raises(UpstreamError) as error:
+        await fast_retries._call_gemini_api("a")
+    assert error.value.status == 400
+    assert fake.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_beyond_deadline_gives_up(fast_retries):
+    """A Retry-After longer than the remaining deadline fails now instead of sleeping"""
+    fast_retries.deadline = 1
+    fake = FlakySession("hello", [429], retry_after="60")
+    fast_retries._session = fake
+    with pytest.raises(UpstreamError) as error:
+        await fast_retries._call_gemini_api("a")
+    assert error.value.retry_after == 60
+    assert fake.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_fails_fast(fast_retries):
+    fast_retries.max_attempts = 1
+    fast_retries.breaker.failure_threshold = 2
+    fake = FlakySession("hello", [500, 500, 500])
+    fast_retries._session = fake
+    for prompt in ("a", "b"):
+        with pytest.raises(UpstreamError):
+            await fast_retries._call_gemini_api(prompt)
+    with pytest.raises(CircuitOpenError):
+        await fast_retries._call_gemini_api("c")
+    assert fake.calls == 2
+
+
+class ScriptedSession(FakeSession):
+    """Returns the given texts in order, recording each prompt"""
+
+    def __init__(self, texts):
+        super().__init__(None)
+        self.texts = list(texts)
+        self.prompts = []
+
+    def post(self, url, headers=None, json=None, **kwargs):
+        self.prompts.append(json["contents"][0]["parts"][0]["text"])
+        self.text = self.texts.pop(0)
+        return super().post(url, headers, json)
+
+
+@pytest.mark.asyncio
+async def test_fenced_analysis_parses_without_repair(client):
+    fake = ScriptedSession([f"Here is the triage:\n```json\n{ANALYSIS_JSON}\n```"])
+    client._session = fake
+    assert (await client.analyze_symptoms(["fever"])).urgency_level == "LOW"
+    assert fake.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_malformed_output_is_repaired_once(client):
+    fake = ScriptedSession(['{"urgency_level": "LOW"}', ANALYSIS_JSON])
+    client._session = fake
+    assert (await client.analyze_symptoms(["fever"])).warning_signs == ["High fever"]
+    assert fake.calls == 2
+    assert "could not be used" in fake.prompts[1]
+
+
+@pytest.mark.asyncio
+async def test_unrepairable_output_raises_upstream_error(client):
+    client._session = ScriptedSession(["I cannot help", "Still no JSON"])
+    with pytest.raises(UpstreamError) as error:
+        await client.generate_follow_up([{"user": "I have a headache", "assistant": "Since when?"}])
+    assert not error.value.retryable
+
+
+def test_json_mode_adds_response_schema(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setenv("GEMINI_MODEL", "gemini-1.5-flash")
+    client = GeminiClient()
+    assert client.analysis_config["responseMimeType"] == "application/json"
+    assert client.follow_up_config["responseSchema"]["type"] == "ARRAY"
+    monkeypatch.setenv("GEMINI_MODEL", "gemini-pro")
+    assert "responseMimeType" not in GeminiClient().analysis_config
+
+
+@pytest.mark.asyncio
+async def test_paraphrased_symptoms_reuse_analysis(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setenv("GEMINI_SEMANTIC_CACHE_SIZE", "64")
+    client = GeminiClient()
+    fake = FakeSession(ANALYSIS_JSON)
+    client._session = fake
+    await client.analyze_symptoms(["my head hurts a lot"])
+    assert (await client.analyze_symptoms(["severe headache"])).urgency_level == "LOW"
+    assert fake.calls == 1
+    # Different red flags never share an answer
+    await client.analyze_symptoms(["severe headache", "chest pain"])
+    assert fake.calls == 2
+    # Nor do different ages
+    await client.analyze_symptoms(["3 year old with a fever"])
+    await client.analyze_symptoms(["3 month old with a fever"])
+    assert fake.calls == 4
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_is_off_by_default(client):
+    fake = FakeSession(ANALYSIS_JSON)
+    client._session = fake
+    await client.analyze_symptoms(["my head hurts a lot"])
+    await client.analyze_symptoms(["severe headache"])
+    assert fake.calls == 2
+
+
+@pytest.fixture
+def batching(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setenv("GEMINI_MICROBATCH_MAX_SIZE", "3")
+    monkeypatch.setenv("GEMINI_MICROBATCH_MAX_WAIT_MS", "50")
+    return GeminiClient()
+
+
+def batch_json(*patients):
+    analysis = json.loads(ANALYSIS_JSON)
+    return json.dumps([dict(analysis, patient=number) for number in patients])
+
+
+@pytest.mark.asyncio
+async def test_concurrent_analyses_share_one_batched_call(batching):
+    fake = ScriptedSession([batch_json(1, 2, 3)])
+    batching._session = fake
+    results = await asyncio.gather(*(batching.analyze_symptoms([s]) for s in ("fever", "rash", "cough")))
+    assert [r.urgency_level for r in results] == ["LOW"] * 3
+    assert fake.calls == 1
+    assert "Patient 3:" in fake.prompts[0]
+
+
+@pytest.mark.asyncio
+async def test_items_missing_from_batch_are_retried_alone(batching):
+    fake = ScriptedSession([batch_json(1), ANALYSIS_JSON])
+    batching._session = fake
+    results = await asyncio.gather(*(batching.analyze_symptoms([s]) for s in ("fever", "rash")))
+    assert all(r.urgency_level == "LOW" for r in results)
+    assert fake.calls == 2
+    assert "Patient" not in fake.prompts[1]
+    assert "Symptoms: rash" in fake.prompts[1]
+
+
+def test_single_patient_prompt_is_unchanged_by_batching(client, batching):
+    assert client._build_analysis_prompt(["fever"], {"age": 30}) == batching._build_analysis_prompt(["fever"], {"age": 30})
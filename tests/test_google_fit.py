@@ -0,0 +1,240 @@
+import time
+import asyncio
+import pytest
+from src.api.fit_store import FitDayStore
+from src.api.google_fit import GoogleFitClient
+
+DAY_MILLIS = 86400000
+
+
+def bucket(day, points):
+    return {
+        "startTimeMillis": str(day * DAY_MILLIS + DAY_MILLIS // 2),
+        "dataset": [{"point": points}],
+    }
+
+
+class FakeRequest:
+    def __init__(self, response, delay):
+        self.response = response
+        self.delay = delay
+
+    def execute(self, http=None):
+        time.sleep(self.delay)
+        return self.response
+
+
+class FakeService:
+    """Mimics service.users().dataset().aggregate(...).execute() with blocking calls"""
+
+    def __init__(self, response=None, delay=0.0):
+        self.response = response
+        self.delay = delay
+        self.calls = 0
+        self.bodies = []
+
+    def users(self):
+        return self
+
+    def dataset(self):
+        return self
+
+    def aggregate(self, userId, body):
+        self.calls += 1
+        self.bodies.append(body)
+        if self.response is not None:
+            return FakeRequest(self.response, self.delay)
+        # Synthesize one bucket per day in the requested range
+        days = range(int(body["startTimeMillis"]) // DAY_MILLIS, (int(body["endTimeMillis"]) - 1) // DAY_MILLIS + 1)
+        response = {"bucket": [
+            bucket(day, [{"dataTypeName": "com.google.step_count.delta", "value": [{"intVal": day % 1000}]}])
+            for day in days
+        ]}
+        return FakeRequest(response, self.delay)
+
+
+@pytest.fixture
+def fit_client(monkeypatch, tmp_path):
+    monkeypatch.setattr(GoogleFitClient, "load_credentials", lambda self: None)
+    client = GoogleFitClient(max_workers=4, store=FitDayStore(str(tmp_path / "fit.db")))
+    client._thread_http = lambda: None
+    yield client
+    client.close()
+
+
+class ClosingStore:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_failed_credentials_release_the_pool_and_store(monkeypatch):
+    import src.api.google_fit as google_fit
+
+    def fail(self):
+        raise FileNotFoundError("credentials.json")
+
+    executors, store = [], ClosingStore()
+
+    class RecordingExecutor(google_fit.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            executors.append(self)
+
+    monkeypatch.setattr(GoogleFitClient, "load_credentials", fail)
+    monkeypatch.setattr(google_fit, "ThreadPoolExecutor", RecordingExecutor)
+    monkeypatch.setattr(google_fit, "create_fit_store", lambda: store)
+    with pytest.raises(FileNotFoundError):
+        GoogleFitClient()
+    assert executors[0]._shutdown and store.closed
+
+    # A store passed in belongs to the caller
+    passed = ClosingStore()
+    with pytest.raises(FileNotFoundError):
+        GoogleFitClient(store=passed)
+    assert executors[1]._shutdown and not passed.closed
+
+
+@pytest.mark.asyncio
+async def test_fit_requests_do_not_block_event_loop(fit_client):
+    """Blocking Fit requests run on worker threads and overlap each other"""
+    fit_client.service = FakeService({"bucket": []}, delay=0.2)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticking = asyncio.ensure_future(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(fit_client.get_activity_data(7), fit_client.get_heart_rate_data(7))
+    elapsed = time.perf_counter() - started
+    ticking.cancel()
+
+    assert elapsed < 0.35
+    assert ticks >= 10
+
+
+def test_parse_activity_response_reads_aggregated_heart_rate(fit_client):
+    response = {"bucket": [bucket(0, [
+        {"dataTypeName": "com.google.step_count.delta", "value": [{"intVal": 4200}]},
+        {"dataTypeName": "com.google.heart_rate.summary", "value": [{"fpVal": 71.6}, {"fpVal": 120}, {"fpVal": 55}]},
+    ])]}
+    [day] = fit_client._parse_activity_response(response)
+    assert day.steps == 4200
+    assert day.heart_rate_avg == 71
+    assert day.sleep_hours is None
+
+
+@pytest.mark.asyncio
+async def test_completed_days_are_served_from_store(fit_client):
+    """Repeat requests cost no upstream calls; only a stale today is refetched"""
+    fit_client.service = FakeService()
+    first = await fit_client.get_activity_data(7)
+    assert len(first) == 7
+    assert fit_client.service.calls == 1
+
+    assert await fit_client.get_activity_data(7) == first
+    assert await fit_client.get_activity_data(3) == first[-3:]
+    assert fit_client.service.calls == 1
+
+    fit_client.stale_after = 0
+    await fit_client.get_activity_data(7)
+    assert fit_client.service.calls == 2
+    refresh = fit_client.service.bodies[-1]
+    assert int(refresh["endTimeMillis"]) - int(refresh["startTimeMillis"]) <= DAY_MILLIS
+
+
+class FakeDatasetService:
+    """Mimics service.users().dataSources().datasets().get(...) with paginated responses"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def users(self):
+        return self
+
+    def dataSources(self):
+        return self
+
+    def datasets(self):
+        return self
+
+    def get(self, userId, dataSourceId, datasetId, limit=None, pageToken=None):
+        self.requests.append((dataSourceId, pageToken))
+        kind = next(kind for kind in self.pages if kind in dataSourceId)
+        pages = self.pages[kind]
+        index = int(pageToken or 0)
+        response = {"point": pages[index] if index < len(pages) else []}
+        if index + 1 < len(pages):
+            response["nextPageToken"] = str(index + 1)
+        return FakeRequest(response, 0)
+
+
+def _fit_point(seconds, value, end=None, field="fpVal"):
+    return {
+        "startTimeNanos": str(int(seconds) * 10 ** 9),
+        "endTimeNanos": str(int(end or seconds) * 10 ** 9),
+        "value": [{field: value}],
+    }
+
+
+@pytest.mark.asyncio
+async def test_intraday_pages_stream_into_summary_and_sleep(fit_client):
+    today = int(time.time()) // 86400 * 86400
+    fit_client.service = FakeDatasetService({
+        "heart_rate": [
+            [_fit_point(today - 86400 + 60 * i, 60.0) for i in range(30)],
+            [_fit_point(today + 60 * i, 66.0) for i in range(30)],
+        ],
+        "step_count": [[_fit_point(today + 60, 150, field="intVal")]],
+        "sleep": [[
+            _fit_point(today, 4, today + 2 * 3600, "intVal"),
+            _fit_point(today + 2 * 3600, 5, today + 3 * 3600, "intVal"),
+        ]],
+    })
+    summary = await fit_client.get_health_summary(2)
+    assert summary["resting_hr"] == 66.0
+    assert summary["resting_hr_vs_baseline"] == 6.0
+    assert summary["steps"] == 150.0
+    assert [token for source, token in fit_client.service.requests if "heart_rate" in source] == [None, "1"]
+
+    # Summaries are cached until they go stale
+    calls = fit_client.upstream_calls
+    assert await fit_client.get_health_summary(2) == summary
+    assert fit_client.upstream_calls == calls
+
+    [night] = await fit_client.get_sleep_data(2)
+    assert night.sleep_hours == 3.0
+    assert night.deep_sleep_percentage == round(100 / 3, 1)
+
+
+@pytest.mark.asyncio
+async def test_completed_nights_are_served_from_store(fit_client):
+    today = int(time.time()) // 86400 * 86400
+    # A night that started the evening before yesterday and ended yesterday morning
+    fit_client.service = FakeDatasetService({"sleep": [[
+        _fit_point(today - 86400 - 2 * 3600, 4, today - 86400 + 3600, "intVal"),
+        _fit_point(today - 86400 + 3600, 5, today - 86400 + 5 * 3600, "intVal"),
+    ]]})
+    [night] = await fit_client.get_sleep_data(3)
+    assert night.sleep_hours == 7.0
+    assert night.deep_sleep_percentage == round(400 / 7, 1)
+    assert len(fit_client.service.requests) == 1
+
+    # Within stale_after nothing is fetched again
+    assert await fit_client.get_sleep_data(3) == [night]
+    assert len(fit_client.service.requests) == 1
+
+    # Once stale, only today's night is fetched live; yesterday comes from the store
+    fit_client.stale_after = 0
+    datasets = []
+    get = fit_client.service.get
+    fit_client.service.get = lambda **kwargs: datasets.append(kwargs["datasetId"]) or get(**kwargs)
+    assert await fit_client.get_sleep_data(3) == [night]
+    assert [int(dataset.split("-")[0]) // 10 ** 9 for dataset in datasets] == [today - 12 * 3600]
@@ -0,0 +1,45 @@
+from fastapi.testclient import TestClient
+
+from src.app import app
+from src.utils.metrics import MetricsMiddleware, MetricsRegistry, record_timing
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("stage_seconds", "Stage latency", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="parse")
+    histogram.observe(0.5, stage="parse")
+    histogram.observe(5, stage="parse")
+
+    text = registry.render()
+    assert 'stage_seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="parse",le="1.0"} 2' in text
+    assert 'stage_seconds_bucket{stage="parse",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{stage="parse"} 3' in text
+
+
+def test_registry_returns_existing_metric_for_same_name():
+    registry = MetricsRegistry()
+    first = registry.counter("calls_total", "Calls", ("status",))
+    first.inc(status="ok")
+    assert registry.counter("calls_total", "Calls", ("status",)) is first
+    assert first.value(status="ok") == 1
+
+
+def test_metrics_endpoint_counts_requests_by_route():
+    client = TestClient(app)
+    client.post("/api/analyze_symptoms", json={"symptoms": ["chest pain"]})
+    text = client.get("/metrics").text
+    assert 'http_requests_total{method="POST",route="/api/analyze_symptoms",status="200"}' in text
+    assert 'triage_decisions_total{source="rules"}' in text
+
+
+def test_middleware_adds_server_timing_header():
+    async def endpoint(scope, receive, send):
+        record_timing("gemini_parse", 0.002)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    client = TestClient(MetricsMiddleware(endpoint, timing_headers=True))
+    header = client.get("/").headers["server-timing"]
+    assert header.startswith("gemini_parse;dur=2.00, total;dur=")
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from src.utils.resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, backoff_delay, hedged
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_lets_one_probe_through_after_reset_timeout():
+    timer = FakeTimer()
+    breaker = CircuitBreaker("upstream", failure_threshold=2, reset_timeout=10, timer=timer)
+    breaker.record_failure()
+    breaker.allow()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.allow()
+    assert error.value.retry_after == 10
+
+    timer.now = 11
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_reopens_breaker():
+    timer = FakeTimer()
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_timeout=10, timer=timer)
+    breaker.record_failure()
+    timer.now = 10
+    breaker.allow()
+    breaker.record_failure()
+    timer.now = 15
+    assert breaker.state == "open"
+
+
+def test_backoff_honours_retry_after():
+    assert backoff_delay(0, base=0.1, cap=1) <= 0.1
+    assert backoff_delay(10, base=0.1, cap=1) <= 1
+    assert backoff_delay(0, base=0.1, cap=1, retry_after=3) == 3
+
+
+def test_latency_tracker_needs_min_samples():
+    tracker = LatencyTracker(min_samples=3)
+    tracker.observe(0.1)
+    assert tracker.percentile(95) is None
+    tracker.observe(0.2)
+    tracker.observe(0.9)
+    assert tracker.percentile(95) == 0.9
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_returns_faster_copy():
+    delays = [1.0, 0.01]
+    calls = []
+
+    async def call():
+        delay = delays[len(calls)]
+        calls.append(delay)
+        await asyncio.sleep(delay)
+        return delay
+
+    assert await hedged(call, delay=0.02) == 0.01
+    assert calls == [1.0, 0.01]
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_when_first_call_is_fast():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return "ok"
+
+    assert await hedged(call, delay=0.5) == "ok"
+    assert len(calls) == 1
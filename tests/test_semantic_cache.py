@@ -0,0 +1,68 @@
+from src.utils.semantic_cache import HashingVectorizer, SemanticCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_paraphrase_is_a_hit():
+    cache = SemanticCache(maxsize=8)
+    cache.set("severe headache", "answer")
+    assert cache.get("my head hurts a lot") == "answer"
+    assert cache.get("stomach pain") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_scope_and_guard_must_match():
+    cache = SemanticCache(maxsize=8)
+    cache.set("fever, cough", "adult", scope="age=30", guard="MEDIUM")
+    assert cache.get("cough and fever", scope="age=80", guard="MEDIUM") is None
+    assert cache.get("cough and fever", scope="age=30", guard="HIGH") is None
+    assert cache.get("cough and fever", scope="age=30", guard="MEDIUM") == "adult"
+    assert cache.stats()["guard_rejections"] == 1
+
+
+def test_least_recently_used_entry_is_replaced_when_full():
+    timer = FakeTimer()
+    cache = SemanticCache(maxsize=2, timer=timer)
+    cache.set("fever", 1)
+    timer.now += 1
+    cache.set("rash", 2)
+    timer.now += 1
+    assert cache.get("fever") == 1
+    timer.now += 1
+    cache.set("back pain", 3)
+    assert cache.get("rash") is None
+    assert cache.get("fever") == 1
+
+
+def test_entries_expire():
+    timer = FakeTimer()
+    cache = SemanticCache(maxsize=4, ttl=10, timer=timer)
+    cache.set("fever", 1)
+    timer.now += 11
+    assert cache.get("fever") is None
+    assert len(cache) == 0
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "semantic.npz")
+    cache = SemanticCache(maxsize=4)
+    cache.set("severe headache", {"urgency_level": "HIGH"}, scope="{}", guard="HIGH|pos|")
+    cache.save(path)
+
+    restored = SemanticCache(maxsize=4)
+    assert restored.load(path) == 1
+    assert restored.get("really bad headache", scope="{}", guard="HIGH|pos|") == {"urgency_level": "HIGH"}
+
+
+def test_vectorizer_is_stable_and_normalized():
+    vectorizer = HashingVectorizer()
+    vector = vectorizer.transform("Fever and cough")
+    assert abs(float(vector @ vector) - 1.0) < 1e-5
+    assert (vector == HashingVectorizer().transform("cough, fever")).all()
@@ -0,0 +1,178 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from src.app import app
+from src.api.gemini import HealthAnalysisResponse
+from src.api.clients import ClientProvider, get_gemini_provider
+from src.api.session_store import MemorySessionStore, SQLiteSessionStore, get_session_store
+from src.models.session import Session
+from src.utils.admission import AdmissionController
+
+
+def _turn(index):
+    return {"user": f"still a headache on day {index}", "assistant": f"Question {index}?"}
+
+
+def test_session_folds_old_turns_into_summary():
+    session = Session()
+    for index in range(10):
+        session.add_turn(_turn(index), max_turns=3)
+    assert session.history == [_turn(7), _turn(8), _turn(9)]
+    assert session.summary.turns == 7
+    assert list(session.summary.symptoms) == ["headache"]
+
+
+def test_sqlite_store_round_trip_and_expiry(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl=60)
+    session = Session(context={"steps": 4000})
+    session.add_turn(_turn(1), max_turns=1)
+    session.add_turn(_turn(2), max_turns=1)
+    store.put(session)
+
+    loaded = store.get(session.id)
+    assert loaded.history == [_turn(2)]
+    assert loaded.summary.turns == 1
+    assert loaded.context == {"steps": 4000}
+
+    store.ttl = -1
+    assert store.get(session.id) is None
+    store.close()
+
+
+def test_sqlite_store_waits_for_its_lock_off_the_event_loop(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl=60)
+    session = Session(context={"steps": 4000})
+
+    async def scenario():
+        # Another thread holds the store for 100 ms; the loop keeps running meanwhile
+        store._lock.acquire()
+        asyncio.get_running_loop().call_later(0.1, store._lock.release)
+        saving = asyncio.ensure_future(store.aput(session))
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        assert time.perf_counter() - started < 0.05
+        assert not saving.done()
+        await saving
+        return await store.aget(session.id)
+
+    assert asyncio.run(scenario()).context == {"steps": 4000}
+    store.close()
+
+
+class RecordingGemini:
+    def __init__(self):
+        self.calls = []
+
+    async def generate_follow_up(self, conversation_history, summary=None):
+        self.calls.append((list(conversation_history), summary.turns if summary else 0))
+        return ["How long has it lasted?"]
+
+
+def test_followup_only_needs_the_new_turn():
+    gemini = RecordingGemini()
+
+    async def factory():
+        return gemini
+
+    store = MemorySessionStore()
+    app.dependency_overrides[get_gemini_provider] = lambda: ClientProvider("gemini", factory)
+    app.dependency_overrides[get_session_store] = lambda: store
+    try:
+        client = TestClient(app)
+        session_id = client.post("/api/sessions", json={"context": {"steps": 100}}).json()["session_id"]
+        for index in range(3):
+            response = client.post(f"/api/sessions/{session_id}/followup", json=_turn(index))
+            assert response.status_code == 200
+            assert response.json() == {"questions": ["How long has it lasted?"]}
+        assert client.post("/api/sessions/unknown/followup", json=_turn(0)).status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+    assert [len(history) for history, _ in gemini.calls] == [1, 2, 3]
+    assert gemini.calls[-1][0][-1] == _turn(2)
+    assert store.get(session_id).context == {"steps": 100}
+
+
+class ConcurrentGemini:
+    """Records how many calls overlap; each takes a little while"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.follow_ups = []
+
+    async def _work(self):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.05)
+        self.active -= 1
+
+    async def analyze_symptoms(self, symptoms, context=None):
+        await self._work()
+        return HealthAnalysisResponse(
+            urgency_level="LOW", initial_assessment="Mild", recommended_actions=["Rest"],
+            lifestyle_recommendations=[], warning_signs=[],
+        )
+
+    async def generate_follow_up(self, conversation_history, summary=None):
+        self.follow_ups.append(list(conversation_history))
+        await self._work()
+        return ["Since when?"]
+
+
+def _post_turns(gemini, messages):
+    async def factory():
+        return gemini
+
+    store = MemorySessionStore()
+    app.dependency_overrides[get_gemini_provider] = lambda: ClientProvider("gemini", factory)
+    app.dependency_overrides[get_session_store] = lambda: store
+    try:
+        client = TestClient(app)
+        session_id = client.post("/api/sessions").json()["session_id"]
+        responses = [client.post(f"/api/sessions/{session_id}/turn", json={"message": m}).json() for m in messages]
+    finally:
+        app.dependency_overrides.clear()
+    return responses, store.get(session_id)
+
+
+def test_turn_runs_analysis_and_follow_up_concurrently():
+    gemini = ConcurrentGemini()
+    responses, session = _post_turns(gemini, ["strange feeling after dinner"])
+    assert responses[0]["questions"] == ["Since when?"]
+    assert responses[0]["sources"] == {"analysis": "gemini", "questions": "gemini"}
+    assert gemini.max_active == 2
+    assert gemini.follow_ups[0] == [{"user": "strange feeling after dinner", "assistant": ""}]
+    assert session.history[0]["assistant"].startswith("Urgency Level: LOW")
+    assert session.history[0]["questions"] == ["Since when?"]
+
+
+def test_turn_asks_known_clarifying_questions_locally():
+    gemini = ConcurrentGemini()
+    responses, session = _post_turns(gemini, ["cough"])
+    assert responses[0]["questions"][0] == "Is the cough dry or productive?"
+    assert responses[0]["sources"]["questions"] == "rules"
+    assert gemini.follow_ups == []
+    assert len(session.history) == 1
+
+
+def test_turn_sends_mixed_free_text_to_gemini():
+    gemini = ConcurrentGemini()
+    responses, _ = _post_turns(gemini, ["mild pain in my chest and left arm"])
+    assert responses[0]["sources"] == {"analysis": "gemini", "questions": "gemini"}
+    assert len(gemini.follow_ups) == 1
+
+
+def test_rules_answer_survives_a_full_admission_controller(monkeypatch):
+    import src.app
+
+    monkeypatch.setattr(src.app, "admission", AdmissionController(max_concurrent=0, max_queue=0))
+    gemini = ConcurrentGemini()
+    responses, session = _post_turns(gemini, ["crushing chest pain and my left hand feels weird"])
+    assert responses[0]["analysis"]["urgency_level"] == "EMERGENCY"
+    assert responses[0]["sources"] == {"analysis": "rules", "questions": "fallback"}
+    assert responses[0]["questions"]
+    assert gemini.follow_ups == []
+    assert session.history[0]["questions"] == responses[0]["questions"]
@@ -0,0 +1,155 @@
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import queue
+import pytest
+from src.api.clients import configure_workers
+from src.api.fit_store import SharedFitDayStore
+from src.api.gemini import GeminiClient
+from src.api.google_fit import GoogleFitClient
+from src.utils.shared_cache import RedisSharedCache, SQLiteSharedCache, create_shared_cache, file_lock
+from tests.test_gemini import ANALYSIS_JSON, FakeSession
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sqlite_cache_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "shared.db")
+    clock = Clock()
+    writer = SQLiteSharedCache(path, "analysis", timer=clock)
+    reader = SQLiteSharedCache(path, "analysis", timer=clock)
+    other = SQLiteSharedCache(path, "fit", timer=clock)
+    writer.set("k", "v", ttl=10)
+    assert reader.get("k") == "v"
+    assert other.get("k") is None
+    clock.now += 11
+    assert reader.get("k") is None
+    assert reader.stats()["hits"] == 1
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self):
+        return self
+
+    def set(self, key, value, px=None):
+        self.data[key] = value
+
+    def execute(self):
+        pass
+
+
+def test_redis_cache_namespaces_keys():
+    redis = FakeRedis()
+    cache = RedisSharedCache("redis://localhost", "analysis", client=redis)
+    cache.set_many({"a": "1", "b": "2"}, ttl=60)
+    assert redis.data == {"analysis:a": "1", "analysis:b": "2"}
+    assert cache.get_many(["a", "c"]) == {"a": "1"}
+
+
+def test_create_shared_cache_from_env(monkeypatch, tmp_path):
+    monkeypatch.delenv("SHARED_CACHE_URL", raising=False)
+    assert create_shared_cache("analysis") is None
+    monkeypatch.setenv("SHARED_CACHE_URL", f"sqlite:///{tmp_path / 'shared.db'}")
+    assert isinstance(create_shared_cache("analysis"), SQLiteSharedCache)
+
+
+def test_shared_fit_store_round_trips_days(tmp_path):
+    store = SharedFitDayStore(SQLiteSharedCache(str(tmp_path / "shared.db"), "fit"))
+    store.put("activity", {"2024-01-01": {"date": "2024-01-01", "steps": 10}, "2024-01-02": None}, 123.0)
+    assert store.get("activity", ["2024-01-01", "2024-01-02", "2024-01-03"]) == {
+        "2024-01-01": ({"date": "2024-01-01", "steps": 10}, 123.0),
+        "2024-01-02": (None, 123.0),
+    }
+
+
+@pytest.mark.asyncio
+async def test_workers_reuse_each_others_analyses(monkeypatch, tmp_path):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setenv("SHARED_CACHE_URL", str(tmp_path / "shared.db"))
+    first, second = GeminiClient(), GeminiClient()
+    first._session = FakeSession(ANALYSIS_JSON)
+    second._session = FakeSession(ANALYSIS_JSON)
+    await first.analyze_symptoms(["fever"])
+    assert (await second.analyze_symptoms(["fever"])).urgency_level == "LOW"
+    assert second._session.calls == 0
+
+
+
+@pytest.mark.asyncio
+async def test_shared_cache_lock_waits_do_not_block_the_loop(monkeypatch, tmp_path):
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setenv("SHARED_CACHE_URL", str(tmp_path / "shared.db"))
+    client = GeminiClient()
+    client._session = FakeSession(ANALYSIS_JSON)
+    client.shared_cache._lock.acquire()
+    asyncio.get_running_loop().call_later(0.1, client.shared_cache._lock.release)
+    analysis = asyncio.ensure_future(client.analyze_symptoms(["fever"]))
+    await asyncio.sleep(0.01)
+    assert not analysis.done()
+    assert (await analysis).urgency_level == "LOW"
+
+
+def test_worker_stores_default_outside_the_working_directory(monkeypatch):
+    monkeypatch.delenv("SESSION_STORE_PATH", raising=False)
+    monkeypatch.delenv("SHARED_CACHE_URL", raising=False)
+    configure_workers(1)
+    assert "SESSION_STORE_PATH" not in os.environ
+    configure_workers(2)
+    paths = os.environ["SESSION_STORE_PATH"], os.environ["SHARED_CACHE_URL"]
+    assert os.path.dirname(paths[0]) == os.path.dirname(paths[1]) != os.getcwd()
+    assert os.path.isdir(os.path.dirname(paths[0]))
+
+
+def _hold_lock(path, events):
+    with file_lock(path):
+        events.put("locked")
+        events.get()
+
+
+def test_file_lock_excludes_other_processes(tmp_path):
+    path = str(tmp_path / "token.json.lock")
+    ctx = multiprocessing.get_context("fork")
+    events = ctx.Queue()
+    with file_lock(path):
+        process = ctx.Process(target=_hold_lock, args=(path, events))
+        process.start()
+        with pytest.raises(queue.Empty):
+            events.get(timeout=0.3)
+    assert events.get(timeout=5) == "locked"
+    events.put("done")
+    process.join(5)
+
+
+def test_expired_token_is_adopted_from_another_worker(monkeypatch, tmp_path):
+    from google.oauth2.credentials import Credentials
+
+    monkeypatch.setattr(GoogleFitClient, "load_credentials", lambda self: None)
+    monkeypatch.setenv("GOOGLE_FIT_TOKEN_PATH", str(tmp_path / "token.json"))
+    monkeypatch.setenv("GOOGLE_FIT_CACHE_PATH", "")
+    client = GoogleFitClient(max_workers=1)
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    (tmp_path / "token.json").write_text(json.dumps({
+        "token": "fresh", "refresh_token": "r", "client_id": "c", "client_secret": "s",
+        "expiry": expiry.isoformat() + "Z",
+    }))
+    client.creds = Credentials("stale", refresh_token="r", client_id="c", client_secret="s",
+                               expiry=datetime.datetime.utcnow() - datetime.timedelta(minutes=1))
+    monkeypatch.setattr(client, "_refresh_token", lambda creds: pytest.fail("refreshed instead of reusing"))
+    client.ensure_fresh_credentials()
+    assert client.creds.token == "fresh"
+    assert client.creds.valid
+    client.close()
@@ -0,0 +1,22 @@
+import pytest
+
+from src.utils.structured import StructuredOutputError, extract_json
+
+
+def test_bare_json():
+    assert extract_json('{"a": 1}') == {"a": 1}
+
+
+def test_fenced_json_with_preamble():
+    text = 'Sure! Here you go:\n```json\n["How long?", "Any fever?"]\n```\nLet me know.'
+    assert extract_json(text, list) == ["How long?", "Any fever?"]
+
+
+def test_embedded_json_skips_non_matching_brackets():
+    text = 'Answer [see below]: {"urgency_level": "LOW"} -- thanks'
+    assert extract_json(text) == {"urgency_level": "LOW"}
+
+
+def test_wrong_type_is_rejected():
+    with pytest.raises(StructuredOutputError):
+        extract_json('{"question": "How long?"}', list)
@@ -1,5 +1,6 @@
 import unittest
-from src.core.triage import process_symptoms, determine_urgency
+from src.core.triage import process_symptoms, determine_urgency, TriageRuleEngine, build_local_analysis, critical_signature
+from src.utils.semantic_cache import SemanticCache
 
 class TestTriageLogic(unittest.TestCase):
 
@@ -20,5 +21,88 @@ class TestTriageLogic(unittest.TestCase):
         urgency = determine_urgency(severity)
         self.assertEqual(urgency, "Monitor and consult if symptoms persist")
 
+class TestTriageRuleEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = TriageRuleEngine()
+
+    def test_red_flag_is_decisive_emergency(self):
+        result = self.engine.evaluate(["Sudden CHEST   pain", "sweating"])
+        self.assertEqual(result["urgency_level"], "EMERGENCY")
+        self.assertTrue(result["decisive"])
+        self.assertEqual(build_local_analysis(result)["urgency_level"], "EMERGENCY")
+
+    def test_all_mild_symptoms_are_decisive_low(self):
+        result = self.engine.evaluate(["runny nose", "mild headache"])
+        self.assertEqual(result["urgency_level"], "LOW")
+        self.assertTrue(result["decisive"])
+
+    def test_ambiguous_symptoms_fall_through(self):
+        self.assertFalse(self.engine.evaluate(["severe headache"])["decisive"])
+        self.assertFalse(self.engine.evaluate(["runny nose", "strange rash on arm"])["decisive"])
+        self.assertIsNone(build_local_analysis(self.engine.evaluate(["no chest pain"])))
+
+    def test_low_phrase_inside_unknown_text_is_not_decisive(self):
+        for text in [
+            "mild pain radiating to my left arm and jaw",
+            "fatigue and yellow skin",
+            "sore throat, drooling and unable to swallow",
+        ]:
+            with self.subTest(text=text):
+                self.assertFalse(self.engine.evaluate([text])["decisive"])
+                self.assertFalse(self.engine.evaluate_batch([[text]])[0]["decisive"])
+        self.assertTrue(self.engine.evaluate(["a runny nose and sneezing since yesterday"])["decisive"])
+
+    def test_negation_inside_red_flag_phrase_stays_decisive(self):
+        result = self.engine.evaluate(["baby is not breathing"])
+        self.assertEqual(result["urgency_level"], "EMERGENCY")
+        self.assertTrue(result["decisive"])
+        self.assertEqual(self.engine.evaluate_batch([["baby is not breathing"]]), [result])
+        self.assertFalse(self.engine.evaluate(["not breathing fast, no chest pain"])["decisive"])
+
+    def test_signature_separates_ages_durations_and_sides(self):
+        normalize = SemanticCache(maxsize=1).vectorizer.normalize
+        for first, second in [
+            ("3 year old with a fever", "3 month old with a fever"),
+            ("stomach pain lower right", "stomach pain lower left"),
+            ("cough for 2 days", "cough for 20 days"),
+            ("cough for two days", "cough for two weeks"),
+            ("3yo with a rash", "3mo with a rash"),
+        ]:
+            with self.subTest(first=first, second=second):
+                first_text, second_text = " ".join(normalize(first)), " ".join(normalize(second))
+                self.assertNotEqual(critical_signature(first_text), critical_signature(second_text))
+                cache = SemanticCache(maxsize=8)
+                cache.set(first_text, "answer", guard=critical_signature(first_text))
+                self.assertIsNone(cache.get(second_text, guard=critical_signature(second_text)))
+        self.assertEqual(critical_signature("cough for 2 days"), critical_signature("a cough for 2 days"))
+
+    def test_longest_phrase_wins_and_words_are_whole(self):
+        self.assertEqual(self.engine.match("mild headache"), [("mild headache", "LOW")])
+        self.assertEqual(self.engine.match("heartburn"), [])
+
+    def test_batch_matches_single_evaluation(self):
+        patients = [
+            ["chest pain"],
+            ["Runny nose", "sneezing"],
+            [],
+            ["no fever", "runny nose"],
+            ["severe headache", "mild cough"],
+            ["something unusual", "hiccups"],
+            ["fatigue and yellow skin", "sneezing"],
+            ["baby is not breathing"],
+            ["I have a stuffy nose"],
+        ]
+        self.assertEqual(
+            self.engine.evaluate_batch(patients),
+            [self.engine.evaluate(symptoms) for symptoms in patients],
+        )
+        self.assertEqual(self.engine.evaluate_batch([]), [])
+
+    def test_custom_lexicon(self):
+        engine = TriageRuleEngine({"EMERGENCY": ["snake bite"], "LOW": ["freckle"]})
+        self.assertTrue(engine.evaluate(["Snake bite on ankle"])["decisive"])
+        self.assertEqual(engine.evaluate(["fever"])["urgency_level"], None)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file